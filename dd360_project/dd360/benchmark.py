@@ -0,0 +1,229 @@
+from datetime import datetime, timezone
+import json
+from pathlib import Path
+import platform
+import subprocess
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional
+
+from loguru import logger
+import numpy as np
+import pandas as pd
+import typer
+
+import dd360.compare as compare
+from dd360.config import BENCHMARKS_DIR, FEATURE_SETS, PROJ_ROOT
+from dd360.features import engineer_features
+from dd360.index import clear_index_cache
+from dd360.synthetic import generate_properties
+from dd360.transform import clean_property_data
+
+app = typer.Typer()
+
+SINGLE_METHODS = {
+    "euclidean_standard": compare.get_similars_euclidean_standard,
+    "euclidean_minmax": compare.get_similars_euclidean_minmax,
+    "hierarchical": compare.get_similars_hierarchical,
+    "combined_geo": compare.get_similars_combined_geo,
+}
+
+
+def measure(fn: Callable[[], Any], repeat: int = 5, warmup: int = 1) -> Dict[str, float]:
+    """
+    Time fn() and record its peak Python/numpy allocation.
+
+    Timings come from `repeat` plain calls after `warmup` calls; the peak memory comes from one
+    extra call under tracemalloc, so tracing overhead does not leak into the timings.
+
+    Parameters:
+        fn (Callable): Zero-argument callable to benchmark.
+        repeat (int): Timed calls.
+        warmup (int): Untimed calls before timing (caches, lazy indexes).
+
+    Returns:
+        Dict[str, float]: min_s, median_s, mean_s and peak_mb.
+    """
+    for _ in range(warmup):
+        fn()
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "min_s": float(np.min(timings)),
+        "median_s": float(np.median(timings)),
+        "mean_s": float(np.mean(timings)),
+        "peak_mb": peak / 2**20,
+    }
+
+
+def git_revision() -> str:
+    """Short sha of HEAD, with a -dirty suffix if the worktree has uncommitted changes."""
+    try:
+        sha = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=PROJ_ROOT, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            cwd=PROJ_ROOT, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return f"{sha}-dirty" if dirty else sha
+
+
+def benchmark_pipeline(raw: pd.DataFrame, repeat: int) -> List[Dict[str, Any]]:
+    """Benchmark clean_property_data and engineer_features on a raw DataFrame."""
+    cleaned = clean_property_data(raw)
+    return [
+        {"name": "pipeline/clean", **measure(lambda: clean_property_data(raw), repeat)},
+        {"name": "pipeline/features", **measure(lambda: engineer_features(cleaned), repeat)},
+    ]
+
+
+def benchmark_compare(
+    df: pd.DataFrame, features: List[str], n: int, queries: int, batch_size: int, seed: int
+) -> List[Dict[str, Any]]:
+    """
+    Benchmark every compare method on a processed DataFrame.
+
+    For each method three cases are recorded: build (first query on a cold index cache),
+    single (one get_similars_* call, cycling over `queries` random subjects) and batch
+    (one compare.search_batch call for `batch_size` subjects).
+    """
+    rng = np.random.default_rng(seed)
+    keys = features + ["neighborhood", "property_type", "latitude", "longitude"]
+    subjects = df.iloc[rng.choice(len(df), size=min(queries, len(df)), replace=False)]
+    inputs = [dict(row) for row in subjects[keys].to_dict("records")]
+    batch = df.iloc[rng.choice(len(df), size=min(batch_size, len(df)), replace=False)]
+
+    results = []
+    for method_name, compare_fn in SINGLE_METHODS.items():
+        numeric = features + ([] if method_name == "combined_geo" else ["latitude", "longitude"])
+
+        def build() -> None:
+            clear_index_cache()
+            compare_fn(df, dict(inputs[0]), n)
+
+        def single() -> None:
+            for input_dict in inputs:
+                compare_fn(df, dict(input_dict), n)
+
+        results.append(
+            {"name": f"compare/{method_name}/build", **measure(build, repeat=3, warmup=0)}
+        )
+        single_stats = measure(single, repeat=3)
+        results.append(
+            {
+                "name": f"compare/{method_name}/single",
+                **{k: v / len(inputs) if k.endswith("_s") else v for k, v in single_stats.items()},
+            }
+        )
+        results.append(
+            {
+                "name": f"compare/{method_name}/batch",
+                "subjects": len(batch),
+                **measure(lambda: compare.search_batch(df, batch, numeric, method_name, n), 3),
+            }
+        )
+    return results
+
+
+@app.command()
+def run(
+    sizes: str = "1000,10000,100000",
+    feature_set: str = "surface_improved",
+    n: int = 5,
+    queries: int = 50,
+    batch_size: int = 1000,
+    repeat: int = 3,
+    seed: int = 0,
+    output_dir: Path = BENCHMARKS_DIR,
+) -> Path:
+    """
+    Run the benchmark suite on synthetic data of each size and save the results as JSON
+    (reports/benchmarks/<git sha>.json) so runs on different commits can be compared.
+    """
+    revision = git_revision()
+    features = FEATURE_SETS[feature_set]
+    results: List[Dict[str, Any]] = []
+
+    for n_rows in (int(s) for s in sizes.split(",")):
+        logger.info(f"Benchmarking {n_rows} rows...")
+        raw = generate_properties(n_rows, seed=seed)
+        for result in benchmark_pipeline(raw, repeat):
+            results.append({"rows": n_rows, **result})
+
+        df = engineer_features(clean_property_data(raw)).reset_index()
+        for result in benchmark_compare(df, features, n, queries, batch_size, seed):
+            results.append({"rows": n_rows, **result})
+        clear_index_cache()
+
+    report = {
+        "revision": revision,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "machine": platform.machine(),
+        "params": {"feature_set": feature_set, "n": n, "queries": queries, "seed": seed},
+        "results": results,
+    }
+    output_dir.mkdir(parents=True, exist_ok=True)
+    output_path = output_dir / f"{revision}.json"
+    output_path.write_text(json.dumps(report, indent=2))
+
+    table = pd.DataFrame(results)[["rows", "name", "median_s", "peak_mb"]]
+    logger.info(f"\n{table.to_string(index=False)}")
+    logger.success(f"Benchmark results saved to {output_path}")
+    return output_path
+
+
+@app.command()
+def diff(
+    baseline: Path,
+    candidate: Optional[Path] = None,
+    threshold: float = 0.1,
+) -> None:
+    """
+    Compare two benchmark result files and flag cases whose median time or peak memory grew
+    more than `threshold` (relative). Without a candidate the latest run in the baseline's
+    directory is used.
+    """
+    if candidate is None:
+        runs = baseline.parent.glob("*.json")
+        candidate = max(runs, key=lambda p: json.loads(p.read_text())["timestamp"])
+
+    def load(path: Path) -> pd.DataFrame:
+        return pd.DataFrame(json.loads(path.read_text())["results"]).set_index(["rows", "name"])
+
+    base, cand = load(baseline), load(candidate)
+    table = base[["median_s", "peak_mb"]].join(
+        cand[["median_s", "peak_mb"]], lsuffix="_base", rsuffix="_new", how="inner"
+    )
+    table["time_ratio"] = table["median_s_new"] / table["median_s_base"]
+    table["mem_ratio"] = table["peak_mb_new"] / table["peak_mb_base"]
+    table["regression"] = table[["time_ratio", "mem_ratio"]].max(axis=1) > 1 + threshold
+
+    logger.info(f"{baseline.name} -> {candidate.name}\n{table.round(4).to_string()}")
+    regressions = int(table["regression"].sum())
+    if regressions:
+        logger.warning(f"{regressions} benchmark(s) regressed by more than {threshold:.0%}")
+    else:
+        logger.success("No regressions")
+
+
+if __name__ == "__main__":
+    app()
@@ -1,12 +1,21 @@
-import pandas as pd
+from typing import List, Optional, Tuple
+
 import numpy as np
-from sklearn.preprocessing import StandardScaler, MinMaxScaler
-from geopy.distance import geodesic
+import pandas as pd
+from dd360.index import (  # noqa: F401
+    HierarchicalIndex,
+    SimilarityIndex,
+    get_hierarchical_index,
+    get_similarity_index,
+    numeric_features,
+)
 
 def get_similars_euclidean_standard(
     df: pd.DataFrame,
     input_dict: dict,
-    n: int = 5
+    n: int = 5,
+    algorithm: str = "brute",
+    max_radius_km: Optional[float] = None
 ) -> pd.DataFrame:
     """
     Encuentra las propiedades más similares usando la distancia Euclidiana
@@ -16,31 +25,25 @@ def get_similars_euclidean_standard(
         df (pd.DataFrame): DataFrame con datos de propiedades incluyendo 'property_id' y características numéricas.
         input_dict (dict): Diccionario con las características de la propiedad de entrada.
         n (int): Número de propiedades similares a devolver (default=5).
+        algorithm (str): Backend de búsqueda de vecinos: "brute", "kd_tree", "ball_tree" o
+            "approximate" (default="brute").
+        max_radius_km (Optional[float]): Si se indica, sólo se consideran propiedades a lo más a esa
+            distancia en km de 'latitude'/'longitude' de input_dict (o del centroide de su colonia).
 
     Retorna:
         pd.DataFrame: Subconjunto de propiedades ordenado por similitud (distancia Euclidiana más pequeña).
     """
-    non_numeric_keys = {"neighborhood", "property_type"}
-    features = [k for k in input_dict.keys() if k not in non_numeric_keys]
-
-    df_sub = df[['property_id'] + features].dropna().copy()
-
-    scaler = StandardScaler()
-    X_scaled = scaler.fit_transform(df_sub[features])
-
-    input_vec = np.array([input_dict[f] for f in features]).reshape(1, -1)
-    input_vec_scaled = scaler.transform(input_vec)[0]
-
-    distances = np.linalg.norm(X_scaled - input_vec_scaled, axis=1)
-    df_sub['similarity_score'] = distances
-
-    return df_sub.sort_values('similarity_score').head(n)
+    features = numeric_features(input_dict, {"neighborhood", "property_type"})
+    index = get_similarity_index(df, features, scaling="standard")
+    return index.query(input_dict, n, algorithm, max_radius_km)
 
 
 def get_similars_euclidean_minmax(
     df: pd.DataFrame,
     input_dict: dict,
-    n: int = 5
+    n: int = 5,
+    algorithm: str = "brute",
+    max_radius_km: Optional[float] = None
 ) -> pd.DataFrame:
     """
     Encuentra las propiedades más similares usando la distancia Euclidiana
@@ -50,31 +53,24 @@ def get_similars_euclidean_minmax(
         df (pd.DataFrame): DataFrame con datos de propiedades incluyendo 'property_id' y características numéricas.
         input_dict (dict): Diccionario con las características de la propiedad de entrada.
         n (int): Número de propiedades similares a devolver (default=5).
+        algorithm (str): Backend de búsqueda de vecinos: "brute", "kd_tree", "ball_tree" o
+            "approximate" (default="brute").
+        max_radius_km (Optional[float]): Si se indica, sólo se consideran propiedades a lo más a esa
+            distancia en km de 'latitude'/'longitude' de input_dict (o del centroide de su colonia).
 
     Retorna:
         pd.DataFrame: Subconjunto de propiedades ordenado por similitud (distancia Euclidiana más pequeña).
     """
-    non_numeric_keys = {"neighborhood", "property_type"}
-    features = [k for k in input_dict.keys() if k not in non_numeric_keys]
-
-    df_sub = df[['property_id'] + features].dropna().copy()
-
-    scaler = MinMaxScaler()
-    X_scaled = scaler.fit_transform(df_sub[features])
-
-    input_vec = np.array([input_dict[f] for f in features]).reshape(1, -1)
-    input_vec_scaled = scaler.transform(input_vec)[0]
-
-    distances = np.linalg.norm(X_scaled - input_vec_scaled, axis=1)
-    df_sub['similarity_score'] = distances
-
-    return df_sub.sort_values('similarity_score').head(n)
+    features = numeric_features(input_dict, {"neighborhood", "property_type"})
+    index = get_similarity_index(df, features, scaling="minmax")
+    return index.query(input_dict, n, algorithm, max_radius_km)
 
 
 def get_similars_hierarchical(
     df: pd.DataFrame,
     input_dict: dict,
-    n: int = 5
+    n: int = 5,
+    max_radius_km: Optional[float] = None
 ) -> pd.DataFrame:
     """
     Encuentra propiedades similares aplicando un filtro jerárquico por barrio y tipo de propiedad,
@@ -89,49 +85,22 @@ def get_similars_hierarchical(
         df (pd.DataFrame): DataFrame con datos de propiedades.
         input_dict (dict): Diccionario con características de la propiedad de entrada.
         n (int): Número de propiedades similares a devolver (default=5).
+        max_radius_km (Optional[float]): Si se indica, sólo se consideran propiedades a lo más a esa
+            distancia en km de 'latitude'/'longitude' de input_dict (o del centroide de su colonia).
 
     Retorna:
         pd.DataFrame: Propiedades ordenadas por similitud considerando el filtro jerárquico.
     """
-    df = df.copy()
-
-    neighborhood = input_dict.get("neighborhood")
-    prop_type = input_dict.get("property_type")
-
-    non_numeric_keys = {"neighborhood", "property_type"}
-    features = [k for k in input_dict.keys() if k not in non_numeric_keys]
-
-    filters = [
-        (df["neighborhood"] == neighborhood) & (df["property_type"] == prop_type),
-        (df["neighborhood"] != neighborhood) & (df["property_type"] == prop_type),
-        (df["property_type"] != prop_type)
-    ]
-
-    selected = pd.DataFrame()
-
-    for condition in filters:
-        candidates = df[condition].copy()
-        if candidates.empty:
-            continue
-
-        scaler = MinMaxScaler()
-        scaled_data = scaler.fit_transform(candidates[features])
-        target_scaled = scaler.transform(np.array([input_dict[f] for f in features]).reshape(1, -1))
-        distances = np.linalg.norm(scaled_data - target_scaled, axis=1)
-
-        candidates["similarity_score"] = distances
-        selected = pd.concat([selected, candidates])
-
-        if len(selected) >= n:
-            break
-
-    return selected.sort_values("similarity_score").head(n)
+    features = numeric_features(input_dict, {"neighborhood", "property_type"})
+    return get_hierarchical_index(df, features).query(input_dict, n, max_radius_km=max_radius_km)
 
 
 def get_similars_combined_geo(
     df: pd.DataFrame,
     input_dict: dict,
-    n: int = 5
+    n: int = 5,
+    geo_method: str = "haversine",
+    max_radius_km: Optional[float] = None
 ) -> pd.DataFrame:
     """
     Encuentra propiedades similares combinando distancia numérica (MinMaxScaler + Euclidiana)
@@ -146,6 +115,14 @@ def get_similars_combined_geo(
         df (pd.DataFrame): DataFrame con propiedades y coordenadas geográficas.
         input_dict (dict): Diccionario con características de la propiedad, debe contener 'neighborhood', 'property_type', opcionalmente 'latitude' y 'longitude'.
         n (int): Número de propiedades similares a devolver (default=5).
+        geo_method (str): Cálculo de la distancia geográfica: "haversine" (vectorizado en NumPy,
+            error relativo < 0.5% a escala CDMX) o "geodesic" (geopy, exacto pero fila por fila).
+            El default pasó de la geodésica a "haversine", así que los resultados cambian para
+            quien no lo indique: 'similarity_score' difiere hasta ~1e-3 (medido en final_df) y
+            puede cambiar el orden de candidatos casi empatados; usar geo_method="geodesic"
+            para reproducir los resultados anteriores.
+        max_radius_km (Optional[float]): Si se indica, sólo se consideran propiedades a lo más a esa
+            distancia en km de 'latitude'/'longitude' de input_dict (o del centroide de su colonia).
 
     Retorna:
         pd.DataFrame: Propiedades ordenadas por puntaje combinado de similitud.
@@ -153,53 +130,163 @@ def get_similars_combined_geo(
     Excepciones:
         ValueError: Si faltan 'neighborhood' o 'property_type' en input_dict.
     """
-    df = df.copy()
-
     if "neighborhood" not in input_dict or "property_type" not in input_dict:
         raise ValueError("input_dict debe contener 'neighborhood' y 'property_type'")
 
+    non_numeric_keys = {"neighborhood", "property_type", "latitude", "longitude"}
+    features = numeric_features(input_dict, non_numeric_keys)
+    index = get_hierarchical_index(df, features)
+
     if "latitude" not in input_dict or "longitude" not in input_dict:
-        neigh_df = df[df["neighborhood"] == input_dict["neighborhood"]]
-        input_dict["latitude"] = neigh_df["latitude"].mean()
-        input_dict["longitude"] = neigh_df["longitude"].mean()
+        input_dict["latitude"], input_dict["longitude"] = index.centroid(input_dict["neighborhood"])
 
-    non_numeric_keys = {"neighborhood", "property_type", "latitude", "longitude"}
-    features = [k for k in input_dict.keys() if k not in non_numeric_keys]
+    return index.query(
+        input_dict, n, geo=True, geo_method=geo_method, max_radius_km=max_radius_km
+    )
 
-    filters = [
-        (df["neighborhood"] == input_dict["neighborhood"]) & (df["property_type"] == input_dict["property_type"]),
-        (df["property_type"] == input_dict["property_type"]),
-        (df["property_type"] != input_dict["property_type"])
-    ]
 
-    selected = pd.DataFrame()
+BATCH_METHODS = ("euclidean_standard", "euclidean_minmax", "hierarchical", "combined_geo")
 
-    for condition in filters:
-        candidates = df[condition].copy()
-        if candidates.empty:
-            continue
 
-        scaler = MinMaxScaler()
-        X_scaled = scaler.fit_transform(candidates[features])
-        target_scaled = scaler.transform(np.array([input_dict[f] for f in features]).reshape(1, -1))
+def search(
+    df: pd.DataFrame,
+    input_dict: dict,
+    method: str = "hierarchical",
+    n: int = 5,
+    geo_method: str = "haversine",
+    max_radius_km: Optional[float] = None,
+    features: Optional[List[str]] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Busca los comparables de una propiedad con el mismo criterio que la función get_similars_*
+    del método, pero devuelve posiciones en lugar de filas (sin construir un DataFrame).
 
-        num_distances = np.linalg.norm(X_scaled - target_scaled, axis=1)
+    Parámetros:
+        df (pd.DataFrame): DataFrame con las propiedades candidatas.
+        input_dict (dict): Características de la propiedad de entrada (no se modifica).
+        method (str): Uno de BATCH_METHODS (default="hierarchical").
+        n (int): Número de comparables (default=5).
+        geo_method (str): Distancia geográfica para combined_geo: "haversine" o "geodesic".
+        max_radius_km (Optional[float]): Radio máximo (km) para considerar candidatos.
+        features (Optional[List[str]]): Features numéricas a comparar; por defecto las llaves
+            numéricas de input_dict, como en get_similars_*. Las llaves de input_dict que no
+            están en features (p. ej. 'latitude'/'longitude') sólo sirven para ubicar el radio.
 
-        geo_distances = candidates.apply(
-            lambda row: geodesic(
-                (input_dict["latitude"], input_dict["longitude"]),
-                (row["latitude"], row["longitude"])
-            ).kilometers,
-            axis=1
+    Retorna:
+        Tuple[np.ndarray, np.ndarray]: Posiciones de los comparables en df y su
+        'similarity_score', de más a menos similar.
+    """
+    if features is None and method != "combined_geo":
+        features = numeric_features(input_dict, {"neighborhood", "property_type"})
+
+    if method in ("euclidean_standard", "euclidean_minmax"):
+        index = get_similarity_index(df, features, scaling=method.split("_")[1])
+        local, scores = index.search(input_dict, n, max_radius_km=max_radius_km)
+        return index.rows[local], scores
+
+    if method == "hierarchical":
+        index = get_hierarchical_index(df, features)
+        return index.search(input_dict, n, max_radius_km=max_radius_km)
+
+    if method == "combined_geo":
+        if "neighborhood" not in input_dict or "property_type" not in input_dict:
+            raise ValueError("input_dict debe contener 'neighborhood' y 'property_type'")
+        if features is None:
+            non_numeric_keys = {"neighborhood", "property_type", "latitude", "longitude"}
+            features = numeric_features(input_dict, non_numeric_keys)
+        index = get_hierarchical_index(df, features)
+        input_dict = dict(input_dict)
+        if "latitude" not in input_dict or "longitude" not in input_dict:
+            input_dict["latitude"], input_dict["longitude"] = index.centroid(input_dict["neighborhood"])
+        return index.search(
+            input_dict, n, geo=True, geo_method=geo_method, max_radius_km=max_radius_km
         )
-        geo_distances_norm = geo_distances / geo_distances.max()
 
-        total_score = 0.5 * num_distances + 0.5 * geo_distances_norm
+    raise ValueError(f"Método no soportado: {method}. Usa uno de {BATCH_METHODS}.")
 
-        candidates["similarity_score"] = total_score
-        selected = pd.concat([selected, candidates])
 
-        if len(selected) >= n:
-            break
+def search_batch(
+    df: pd.DataFrame,
+    subjects: pd.DataFrame,
+    features: List[str],
+    method: str = "hierarchical",
+    n: int = 5,
+    geo_method: str = "haversine",
+    block_size: Optional[int] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Calcula la matriz de vecinos (top-n) de muchas propiedades a la vez con el mismo criterio que
+    las funciones get_similars_*, usando operaciones matriciales por bloques.
+
+    Parámetros:
+        df (pd.DataFrame): DataFrame con las propiedades candidatas.
+        subjects (pd.DataFrame): Propiedades a consultar; deben tener las columnas de features y,
+            según el método, 'neighborhood', 'property_type', 'latitude' y 'longitude'.
+        features (List[str]): Features numéricas a comparar (para combined_geo, sin latitud/longitud).
+        method (str): Uno de BATCH_METHODS (default="hierarchical").
+        n (int): Número de vecinos por propiedad (default=5).
+        geo_method (str): Distancia geográfica para combined_geo: "haversine" o "geodesic".
+        block_size (Optional[int]): Propiedades por bloque; por defecto se acota la memoria del bloque.
 
-    return selected.sort_values("similarity_score").head(n)
+    Retorna:
+        Tuple[np.ndarray, np.ndarray]: Posiciones de los vecinos en df y sus 'similarity_score',
+        ambas de tamaño (len(subjects) x n); -1 / NaN donde no hay vecino.
+    """
+    if method in ("euclidean_standard", "euclidean_minmax"):
+        index = get_similarity_index(df, features, scaling=method.split("_")[1])
+        local, scores = index.search_batch(subjects[features].to_numpy(dtype=np.float64), n, block_size)
+        positions = np.where(local >= 0, index.rows[local], -1)
+        pad = max(n, 0) - positions.shape[1]
+        if pad > 0:
+            positions = np.pad(positions, ((0, 0), (0, pad)), constant_values=-1)
+            scores = np.pad(scores, ((0, 0), (0, pad)), constant_values=np.nan)
+        return positions, scores
+
+    if method in ("hierarchical", "combined_geo"):
+        index = get_hierarchical_index(df, features)
+        return index.search_batch(
+            subjects, n, geo=method == "combined_geo", geo_method=geo_method, block_size=block_size
+        )
+
+    raise ValueError(f"Método no soportado: {method}. Usa uno de {BATCH_METHODS}.")
+
+
+def get_similars_batch(
+    df: pd.DataFrame,
+    subjects: pd.DataFrame,
+    features: List[str],
+    method: str = "hierarchical",
+    n: int = 5,
+    id_col: str = "property_id",
+    geo_method: str = "haversine",
+    block_size: Optional[int] = None
+) -> pd.DataFrame:
+    """
+    Encuentra las propiedades comparables de muchas propiedades a la vez (por ejemplo, todo un
+    feed de nuevos anuncios) y devuelve el resultado en formato largo.
+
+    Parámetros:
+        df (pd.DataFrame): DataFrame con las propiedades candidatas.
+        subjects (pd.DataFrame): Propiedades a consultar (ver search_batch).
+        features (List[str]): Features numéricas a comparar.
+        method (str): Uno de BATCH_METHODS (default="hierarchical").
+        n (int): Número de comparables por propiedad (default=5).
+        id_col (str): Columna de subjects con su identificador; si no existe se usa su índice.
+        geo_method (str): Distancia geográfica para combined_geo.
+        block_size (Optional[int]): Propiedades por bloque.
+
+    Retorna:
+        pd.DataFrame: Columnas 'subject_id', 'property_id', 'rank' (1 = más similar) y
+        'similarity_score'.
+    """
+    positions, scores = search_batch(df, subjects, features, method, n, geo_method, block_size)
+    subject_ids = subjects[id_col].to_numpy() if id_col in subjects.columns else subjects.index.to_numpy()
+
+    found = positions >= 0
+    rows, ranks = np.nonzero(found)
+    return pd.DataFrame({
+        "subject_id": subject_ids[rows],
+        "property_id": df["property_id"].to_numpy()[positions[found]],
+        "rank": ranks + 1,
+        "similarity_score": scores[found],
+    })
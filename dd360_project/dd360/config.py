@@ -1,3 +1,23 @@
+from pathlib import Path
+
+# Paths
+PROJ_ROOT = Path(__file__).resolve().parents[1]
+
+DATA_DIR = PROJ_ROOT / "data"
+RAW_DATA_DIR = DATA_DIR / "raw"
+INTERIM_DATA_DIR = DATA_DIR / "interim"
+PROCESSED_DATA_DIR = DATA_DIR / "processed"
+EXTERNAL_DATA_DIR = DATA_DIR / "external"
+
+# Dataset procesado particionado (Hive) por neighborhood / property_type
+PROCESSED_DATASET_DIR = PROCESSED_DATA_DIR / "final_df"
+
+MODELS_DIR = PROJ_ROOT / "models"
+
+REPORTS_DIR = PROJ_ROOT / "reports"
+FIGURES_DIR = REPORTS_DIR / "figures"
+BENCHMARKS_DIR = REPORTS_DIR / "benchmarks"
+
 FEATURE_SETS = {
     "surface": ["price", "num_bedrooms", "num_bathrooms", "age", "construction_surface"],
     "surface_improved": ["price_per_m2", "num_bedrooms", "num_bathrooms", "age", "has_amenities"],
@@ -6,3 +26,27 @@ FEATURE_SETS = {
     "improved": ["construction_surface", "age", "num_bathrooms", "num_bedrooms", "type_house", "price_per_m2", "has_amenities"],
     "no_categorial": ["construction_surface", "age", "num_bathrooms", "num_bedrooms", "num_parking_lots", "price_per_m2", "has_amenities"]
 }
+
+# Año de referencia para la edad del inmueble (age = FEATURE_REFERENCE_YEAR - built_year)
+FEATURE_REFERENCE_YEAR = 2025
+
+# Vocabulario y orden de columnas de FeatureEncoder
+FEATURE_ENCODER_PATH = MODELS_DIR / "feature_encoder.json"
+
+# Caché en disco de los resultados de ExperimentScorer
+EXPERIMENTS_CACHE_PATH = INTERIM_DATA_DIR / "experiments_cache.sqlite"
+
+# Caché en disco de la imagen principal (og:image) de cada anuncio
+IMAGES_CACHE_PATH = INTERIM_DATA_DIR / "images_cache.sqlite"
+
+# Snapshots del dataset procesado (Arrow IPC + índice .npy) que carga la webapp
+SNAPSHOTS_DIR = INTERIM_DATA_DIR / "snapshots"
+
+# Modelo de precio entrenado por dd360.modeling.train (joblib)
+PRICE_MODEL_PATH = MODELS_DIR / "price_model.joblib"
+
+# Tablas precalculadas de vecinos (top-k por FEATURE_SETS x método) de dd360.neighbors
+NEIGHBORS_DIR = INTERIM_DATA_DIR / "neighbors"
+
+# Snapshot del almacén actualizable de comparables (dd360.store) que usa la API en vivo
+LIVE_STORE_PATH = INTERIM_DATA_DIR / "live_store.npz"
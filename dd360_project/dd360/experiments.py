@@ -1,8 +1,142 @@
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+import hashlib
+import json
+import os
+from pathlib import Path
+import sqlite3
 import pandas as pd
 import numpy as np
-from typing import Callable, Dict, List, Optional, Any
+from typing import Callable, Dict, List, Optional, Any, Tuple, Union
 from dd360.config import FEATURE_SETS
 import dd360.compare as compare  # Importa los métodos de comparación
+from dd360.fingerprint import dataframe_fingerprint
+import dd360.metrics as metrics
+import dd360.neighbors as neighbors
+
+# Scorer de cada proceso del pool (se crea una sola vez por proceso en _init_worker).
+_WORKER_SCORER: Optional["ExperimentScorer"] = None
+
+
+def _init_worker(df: pd.DataFrame, n: int) -> None:
+    """
+    Inicializa un proceso del pool con su propia copia del DataFrame.
+    """
+    global _WORKER_SCORER
+    _WORKER_SCORER = ExperimentScorer(df, n)
+
+
+def _run_work_unit(
+    method_name: str,
+    compare_fn: Callable,
+    features: List[str],
+    start: int,
+    stop: int,
+    vectorized: bool,
+) -> List[Optional[float]]:
+    """
+    Evalúa una unidad de trabajo (método, conjunto de features, bloque de filas) en un proceso del pool.
+    """
+    return _WORKER_SCORER._score_rows(method_name, compare_fn, features, start, stop, vectorized)
+
+
+class ExperimentCache:
+    """
+    Caché en disco (SQLite) de los resultados de ExperimentScorer.
+
+    Cada resultado se guarda con una llave que combina la huella del DataFrame, el método,
+    la lista de features y n, de modo que sólo se recalculan las combinaciones nuevas o
+    modificadas y una corrida interrumpida se puede retomar.
+    """
+
+    def __init__(self, path: Union[str, Path]) -> None:
+        """
+        Abre (o crea) la caché.
+
+        Args:
+            path (Union[str, Path]): Ruta del archivo SQLite.
+        """
+        self.path: Path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with sqlite3.connect(self.path) as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS experiment_results (
+                    key TEXT PRIMARY KEY,
+                    data_hash TEXT,
+                    method TEXT,
+                    feature_set TEXT,
+                    features TEXT,
+                    n INTEGER,
+                    avg_score REAL,
+                    created_at TEXT
+                )
+                """
+            )
+
+    @staticmethod
+    def data_fingerprint(df: pd.DataFrame) -> str:
+        """
+        Calcula una huella (sha256) del contenido, columnas, tipos e índice del DataFrame
+        (dd360.fingerprint.dataframe_fingerprint).
+
+        Args:
+            df (pd.DataFrame): DataFrame de entrada.
+
+        Returns:
+            str: Huella hexadecimal.
+        """
+        return dataframe_fingerprint(df)
+
+    @staticmethod
+    def make_key(data_hash: str, method: str, features: List[str], n: int) -> str:
+        """
+        Construye la llave de una combinación (datos, método, features, n).
+        """
+        payload = json.dumps({"data": data_hash, "method": method, "features": features, "n": n})
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Obtiene un resultado guardado.
+
+        Args:
+            key (str): Llave de la combinación.
+
+        Returns:
+            Optional[Dict[str, Any]]: Registro con 'avg_score' (NaN si se guardó vacío) o None.
+        """
+        with sqlite3.connect(self.path) as conn:
+            row = conn.execute(
+                "SELECT avg_score FROM experiment_results WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"avg_score": np.nan if row[0] is None else row[0]}
+
+    def put(
+        self,
+        key: str,
+        data_hash: str,
+        method: str,
+        feature_set: str,
+        features: List[str],
+        n: int,
+        avg_score: float,
+    ) -> None:
+        """
+        Guarda (o reemplaza) el resultado de una combinación.
+        """
+        with sqlite3.connect(self.path) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO experiment_results VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    key, data_hash, method, feature_set, json.dumps(features), n,
+                    None if pd.isna(avg_score) else float(avg_score),
+                    datetime.now(timezone.utc).isoformat(),
+                ),
+            )
+
 
 class ExperimentScorer:
     """
@@ -10,17 +144,32 @@ class ExperimentScorer:
     sobre un DataFrame dado usando varios conjuntos de características.
     """
 
-    def __init__(self, df: pd.DataFrame, n: int = 5) -> None:
+    def __init__(
+        self,
+        df: pd.DataFrame,
+        n: int = 5,
+        cache_path: Optional[Union[str, Path]] = None,
+        neighbors_dir: Optional[Union[str, Path]] = None,
+    ) -> None:
         """
         Inicializa el experimentador con el DataFrame y número de similares a obtener.
 
         Args:
             df (pd.DataFrame): DataFrame con los datos de inmuebles.
             n (int, opcional): Número de resultados similares a considerar. Por defecto es 5.
+            cache_path (Optional[Union[str, Path]]): Archivo SQLite donde guardar los resultados
+                (por ejemplo config.EXPERIMENTS_CACHE_PATH). Si se indica, run() sólo evalúa las
+                combinaciones que no estén en la caché.
+            neighbors_dir (Optional[Union[str, Path]]): Carpeta con tablas de vecinos de
+                dd360.neighbors (por ejemplo config.NEIGHBORS_DIR). run() toma los puntajes de
+                las tablas construidas con los mismos datos y el mismo n.
         """
         self.df: pd.DataFrame = df.copy()
         self.n: int = n
         self.results: List[Dict[str, Any]] = []
+        self.cache: Optional[ExperimentCache] = ExperimentCache(cache_path) if cache_path else None
+        self.neighbors_dir: Optional[Path] = Path(neighbors_dir) if neighbors_dir else None
+        self._data_hash: Optional[str] = None
 
         self.compare_methods: Dict[str, Callable] = {
             "euclidean_standard": compare.get_similars_euclidean_standard,
@@ -29,6 +178,23 @@ class ExperimentScorer:
             "combined_geo": compare.get_similars_combined_geo,
         }
 
+    @staticmethod
+    def required_columns(feature_sets: Optional[List[str]] = None) -> List[str]:
+        """
+        Columnas que necesitan run() y evaluate() para los conjuntos de features indicados, para
+        cargar sólo esas (por ejemplo extract_data(path, columns=...)).
+
+        Args:
+            feature_sets (Optional[List[str]]): Nombres de FEATURE_SETS (por defecto todos).
+
+        Returns:
+            List[str]: Columnas sin duplicados.
+        """
+        columns = ["property_id", "neighborhood", "property_type", "latitude", "longitude", "price_per_m2"]
+        for feature_set_name in feature_sets or list(FEATURE_SETS):
+            columns.extend(FEATURE_SETS[feature_set_name])
+        return list(dict.fromkeys(columns))
+
     def _build_input_dict(self, row: pd.Series, features: List[str]) -> Dict[str, Any]:
         """
         Construye un diccionario de entrada con las características relevantes de una fila.
@@ -60,35 +226,199 @@ class ExperimentScorer:
         scores = [s["similarity_score"] for s in similars if pd.notnull(s.get("similarity_score"))]
         return np.mean(scores) if scores else None
 
-    def run(self) -> None:
+    def _score_rows(
+        self,
+        method_name: str,
+        compare_fn: Callable,
+        features: List[str],
+        start: int,
+        stop: int,
+        vectorized: bool = False,
+    ) -> List[Optional[float]]:
+        """
+        Calcula el puntaje de cada fila en [start, stop) usando cada fila como propiedad de entrada.
+
+        Args:
+            method_name (str): Nombre del método de comparación.
+            compare_fn (Callable): Función de comparación (get_similars_*).
+            features (List[str]): Conjunto de características a usar.
+            start (int): Primera fila (posición) a evaluar.
+            stop (int): Fila (posición) donde termina el bloque, sin incluirla.
+            vectorized (bool): Si es True usa la búsqueda por lotes de dd360.compare
+                (sólo para los métodos de compare.BATCH_METHODS).
+
+        Returns:
+            List[Optional[float]]: Puntaje por fila (None si la comparación falló).
+        """
+        if vectorized and method_name in compare.BATCH_METHODS:
+            return self._score_rows_vectorized(method_name, features, start, stop)
+
+        scores: List[Optional[float]] = []
+        for _, row in self.df.iloc[start:stop].iterrows():
+            try:
+                input_dict = self._build_input_dict(row, features)
+                similars_df = compare_fn(self.df, input_dict, self.n)
+                similars = similars_df.to_dict("records")
+                score = self._scoring_fn(input_dict, similars)
+                scores.append(score)
+            except Exception:
+                scores.append(None)
+        return scores
+
+    def _score_rows_vectorized(
+        self, method_name: str, features: List[str], start: int, stop: int
+    ) -> List[Optional[float]]:
+        """
+        Versión vectorizada de _score_rows: agrupa las filas por las columnas no nulas (que definen
+        su input_dict) y resuelve cada grupo con compare.search_batch (ver
+        neighbors.row_neighbours). La fila consultada sigue siendo candidata de sí misma, igual
+        que en la versión fila por fila.
+
+        Args:
+            method_name (str): Nombre del método (uno de compare.BATCH_METHODS).
+            features (List[str]): Conjunto de características a usar.
+            start (int): Primera fila (posición) a evaluar.
+            stop (int): Fila (posición) donde termina el bloque, sin incluirla.
+
+        Returns:
+            List[Optional[float]]: Puntaje por fila (None si la comparación falló).
+        """
+        _, similar_scores = neighbors.row_neighbours(
+            self.df, features, method_name, self.n, start, stop
+        )
+        return self._mean_scores(similar_scores)
+
+    @staticmethod
+    def _mean_scores(similar_scores: np.ndarray) -> List[Optional[float]]:
+        """
+        Promedio por fila de una matriz de 'similarity_score' (None si la fila no tiene vecinos).
+        """
+        valid = ~np.isnan(similar_scores)
+        with np.errstate(invalid="ignore"):
+            scores = np.where(valid, similar_scores, 0).sum(axis=1) / valid.sum(axis=1)
+        return [None if np.isnan(s) else float(s) for s in scores]
+
+    def run(self, n_jobs: int = 1, vectorized: bool = False, chunk_size: Optional[int] = None) -> None:
         """
         Ejecuta los experimentos para cada método de comparación y conjunto de características,
         calcula los puntajes promedio y almacena los resultados ordenados.
+
+        Args:
+            n_jobs (int): Número de procesos. Con n_jobs > 1 (o -1 para todos los núcleos) las
+                unidades de trabajo (método, conjunto de features, bloque de filas) se reparten en
+                un pool de procesos.
+            vectorized (bool): Si es True cada bloque se resuelve con la búsqueda por lotes
+                (compare.search_batch) en lugar de consultar fila por fila; el resultado es el mismo.
+            chunk_size (Optional[int]): Filas por unidad de trabajo en modo paralelo. Por defecto
+                se reparten ~4 bloques por proceso.
+
+        Si el experimentador tiene caché, las combinaciones ya evaluadas con los mismos datos,
+        features y n se leen de disco y cada combinación nueva se guarda al terminar.
         """
-        for method_name, compare_fn in self.compare_methods.items():
-            for feature_set_name, features in FEATURE_SETS.items():
+        combinations: List[Tuple[str, Callable, str, List[str]]] = [
+            (method_name, compare_fn, feature_set_name, features)
+            for method_name, compare_fn in self.compare_methods.items()
+            for feature_set_name, features in FEATURE_SETS.items()
+        ]
+        avg_scores: Dict[int, float] = {}
+
+        pending: List[int] = []
+        for i, (method_name, _, feature_set_name, features) in enumerate(combinations):
+            cached = self.cache.get(self._cache_key(method_name, features)) if self.cache else None
+            if cached is not None:
+                print(f"♻️ En caché: {method_name} con features: {feature_set_name}")
+                avg_scores[i] = cached["avg_score"]
+                continue
+            table_scores = self._table_scores(method_name, feature_set_name, features)
+            if table_scores is not None:
+                print(f"📦 Tabla de vecinos: {method_name} con features: {feature_set_name}")
+                avg_scores[i] = self._store_result(combinations[i], table_scores)
+            else:
+                pending.append(i)
+
+        n_rows = len(self.df)
+        n_jobs = (os.cpu_count() or 1) if n_jobs == -1 else n_jobs
+
+        if n_jobs <= 1:
+            for i in pending:
+                method_name, compare_fn, feature_set_name, features = combinations[i]
                 print(f"🚀 Evaluando: {method_name} con features: {feature_set_name}")
-                scores: List[Optional[float]] = []
-
-                for _, row in self.df.iterrows():
-                    try:
-                        input_dict = self._build_input_dict(row, features)
-                        similars_df = compare_fn(self.df, input_dict, self.n)
-                        similars = similars_df.to_dict("records")
-                        score = self._scoring_fn(input_dict, similars)
-                        scores.append(score)
-                    except Exception:
-                        scores.append(None)
-
-                avg_score = np.nanmean([s for s in scores if s is not None])
-                self.results.append({
-                    "method": method_name,
-                    "features": feature_set_name,
-                    "avg_score": avg_score
-                })
+                scores = self._score_rows(method_name, compare_fn, features, 0, n_rows, vectorized)
+                avg_scores[i] = self._store_result(combinations[i], scores)
+        elif pending:
+            chunk_size = chunk_size or max(1, -(-n_rows // (n_jobs * 4)))
+            with ProcessPoolExecutor(
+                max_workers=n_jobs, initializer=_init_worker, initargs=(self.df, self.n)
+            ) as executor:
+                futures = {}
+                for i in pending:
+                    method_name, compare_fn, feature_set_name, features = combinations[i]
+                    print(f"🚀 Evaluando: {method_name} con features: {feature_set_name}")
+                    futures[i] = [
+                        executor.submit(
+                            _run_work_unit, method_name, compare_fn, features,
+                            start, min(start + chunk_size, n_rows), vectorized,
+                        )
+                        for start in range(0, n_rows, chunk_size)
+                    ]
+                for i, chunk_futures in futures.items():
+                    scores = [s for future in chunk_futures for s in future.result()]
+                    avg_scores[i] = self._store_result(combinations[i], scores)
+
+        for i, (method_name, _, feature_set_name, _) in enumerate(combinations):
+            self.results.append({
+                "method": method_name,
+                "features": feature_set_name,
+                "avg_score": avg_scores[i]
+            })
 
         self.results_df = pd.DataFrame(self.results).sort_values("avg_score", ascending=True)  # Menor es mejor
 
+    def _table_scores(
+        self, method_name: str, feature_set_name: str, features: List[str]
+    ) -> Optional[List[Optional[float]]]:
+        """
+        Puntajes por fila leídos de la tabla de vecinos de la combinación, o None si no hay
+        tabla para estos datos, features y n.
+        """
+        if self.neighbors_dir is None:
+            return None
+        table = neighbors.get_neighbor_table(
+            feature_set_name, method_name, self.n, self.neighbors_dir
+        )
+        if (
+            table is None
+            or not table.exact_for(self.n)
+            or table.meta["features"] != features
+            or table.meta["data_hash"] != neighbors.data_fingerprint(self.df, features)
+        ):
+            return None
+        return self._mean_scores(table.scores[:, : self.n].astype(np.float64))
+
+    def _cache_key(self, method_name: str, features: List[str]) -> str:
+        """
+        Llave de caché de una combinación para el DataFrame actual (la huella se calcula una vez).
+        """
+        if self._data_hash is None:
+            self._data_hash = ExperimentCache.data_fingerprint(self.df)
+        return ExperimentCache.make_key(self._data_hash, method_name, features, self.n)
+
+    def _store_result(
+        self, combination: Tuple[str, Callable, str, List[str]], scores: List[Optional[float]]
+    ) -> float:
+        """
+        Promedia los puntajes de una combinación y, si hay caché, guarda el resultado de inmediato
+        para poder retomar una corrida interrumpida.
+        """
+        method_name, _, feature_set_name, features = combination
+        avg_score = np.nanmean([s for s in scores if s is not None])
+        if self.cache is not None:
+            self.cache.put(
+                self._cache_key(method_name, features), self._data_hash,
+                method_name, feature_set_name, features, self.n, avg_score,
+            )
+        return avg_score
+
     def get_results(self) -> pd.DataFrame:
         """
         Obtiene el DataFrame con los resultados de los experimentos.
@@ -97,3 +427,40 @@ class ExperimentScorer:
             pd.DataFrame: DataFrame con columnas ["method", "features", "avg_score"] ordenado por avg_score ascendente.
         """
         return self.results_df
+
+    def evaluate(
+        self, feature_sets: Optional[List[str]] = None, methods: Optional[List[str]] = None
+    ) -> pd.DataFrame:
+        """
+        Evalúa los métodos con métricas de negocio además del similarity_score: error del precio
+        por m² estimado con la mediana de los comparables (MAE / MAPE, leave-one-out, buscando
+        los comparables sin 'price' ni 'price_per_m2'), proporción de comparables en cada nivel
+        de la jerarquía y traslape de vecinos entre métodos.
+
+        Cada par (método, conjunto de features) hace una búsqueda por lotes de n + 1 vecinos
+        (dd360.metrics) y, si el conjunto incluye precios, otra sin ellos para el error de
+        precio. Se evalúan las filas con todas las features presentes.
+
+        Args:
+            feature_sets (Optional[List[str]]): Nombres de FEATURE_SETS a evaluar (por defecto todos).
+            methods (Optional[List[str]]): Métodos a evaluar (por defecto compare.BATCH_METHODS).
+
+        Returns:
+            pd.DataFrame: Una fila por (method, features) con mae, mape, coverage, tier_1, tier_2,
+            tier_3 y mean_similarity, ordenado por mae ascendente. El traslape entre métodos queda
+            en self.overlap, un DataFrame método x método por conjunto de features.
+        """
+        frames = []
+        self.overlap: Dict[str, pd.DataFrame] = {}
+        for feature_set_name in feature_sets or list(FEATURE_SETS):
+            features = FEATURE_SETS[feature_set_name]
+            print(f"📏 Métricas con features: {feature_set_name}")
+            df = self.df.dropna(subset=[f for f in features if f in self.df.columns])
+            evaluation = metrics.evaluate_methods(df.reset_index(drop=True), features, methods, self.n)
+            frames.append(evaluation["metrics"].assign(features=feature_set_name))
+            self.overlap[feature_set_name] = evaluation["overlap"]
+
+        metrics_df = pd.concat(frames, ignore_index=True)
+        columns = ["method", "features"] + [c for c in metrics_df.columns if c not in ("method", "features")]
+        self.metrics_df = metrics_df[columns].sort_values("mae", ascending=True)
+        return self.metrics_df
@@ -1,39 +1,304 @@
+import json
+import operator
 from pathlib import Path
-from typing import Union
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, Union
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
 
+# Filters in pyarrow's DNF form: [(col, op, value), ...] (AND) or [[...], [...]] (OR of ANDs)
+Filter = Tuple[str, str, Any]
+Filters = Union[List[Filter], List[List[Filter]]]
 
-def extract_data(file_path: Union[str, Path]) -> pd.DataFrame:
+RETURN_TYPES = ("pandas", "arrow_dtype", "arrow")
+
+# Column types of data/raw/cuahutemoc_properties.csv, usable as extract_data(..., dtype=RAW_DTYPES)
+RAW_DTYPES: Dict[str, Any] = {
+    "property_id": "string",
+    "listing_type": "category",
+    "property_type": "category",
+    "url_ad": "string",
+    "price": np.float64,
+    "terrain_surface": np.float32,
+    "construction_surface": np.float32,
+    "num_bathrooms": np.float32,
+    "num_parking_lots": np.float32,
+    "num_bedrooms": np.float32,
+    "built_year": np.float32,
+    "conservation_status": np.float64,
+    "latitude": np.float64,
+    "longitude": np.float64,
+    "id_neighborhood": np.int32,
+    "neighborhood": "category",
+    "has_garden": np.float32,
+    "has_gym": np.float32,
+}
+
+_OPERATORS = {
+    "=": operator.eq,
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+}
+
+
+def extract_data(
+    file_path: Union[str, Path],
+    columns: Optional[Sequence[str]] = None,
+    filters: Optional[Filters] = None,
+    dtype: Optional[Dict[str, Any]] = None,
+    return_type: str = "pandas",
+    memory_map: bool = False,
+    chunksize: int = 100_000,
+) -> Union[pd.DataFrame, pa.Table]:
     """
-    Extract data from a CSV or Parquet file.
+    Extract data from a CSV, Parquet or Arrow IPC (Feather) file.
+
+    Only the requested columns and rows are materialized: Parquet and Feather files are read
+    through pyarrow with column projection; Parquet filters are pushed down (row groups are
+    skipped by their statistics) and applied batch by batch, so memory follows the selected
+    rows. CSV files are read in chunks, filtered chunk by chunk.
 
     Parameters
     ----------
     file_path : str or Path
-        Path to the input data file (.csv or .parquet).
+        Path to the input data file (.csv, .parquet, .feather or .arrow) or to a
+        Hive-partitioned Parquet directory written by dd360.load (filters on the partition
+        columns only open the matching partitions).
+    columns : sequence of str, optional
+        Columns to read (all by default). Columns used in `filters` do not need to be included.
+    filters : list of tuples or list of lists of tuples, optional
+        Row filters in pyarrow's DNF form, e.g. ``[("neighborhood", "=", "CONDESA")]`` or
+        ``[[("property_type", "=", "house")], [("price", "<", 5e6)]]`` (OR of ANDs).
+        Operators: =, ==, !=, <, <=, >, >=, in, not in.
+    dtype : dict, optional
+        Column types for the CSV path (e.g. RAW_DTYPES); ignored for Parquet / Feather,
+        whose types are stored in the file.
+    return_type : str
+        "pandas" (NumPy-backed DataFrame, default), "arrow_dtype" (DataFrame backed by
+        pd.ArrowDtype columns, no conversion copy) or "arrow" (pyarrow.Table).
+    memory_map : bool
+        Memory-map Parquet / Feather files instead of reading them into memory. For
+        uncompressed Feather files the returned Arrow data points into the mapping (zero-copy).
+    chunksize : int
+        Rows per chunk when filtering a CSV file.
 
     Returns
     -------
-    pd.DataFrame
-        Data loaded into a pandas DataFrame.
+    pd.DataFrame or pa.Table
+        Data loaded as requested by `return_type`.
 
     Raises
     ------
     ValueError
-        If file extension is not supported.
+        If file extension or return type is not supported.
     """
     file_path = Path(file_path)
     if not file_path.exists():
         raise FileNotFoundError(f"File not found: {file_path}")
+    if return_type not in RETURN_TYPES:
+        raise ValueError(f"Unsupported return_type: {return_type}. Use one of {RETURN_TYPES}.")
 
     ext = file_path.suffix.lower()
+    columns = list(columns) if columns is not None else None
 
-    if ext == ".csv":
-        df = pd.read_csv(file_path)
+    if file_path.is_dir():
+        table = _read_dataset(file_path, columns, filters)
+    elif ext == ".csv":
+        df = _read_csv(file_path, columns, filters, dtype, chunksize)
+        if return_type == "pandas":
+            return df
+        table = pa.Table.from_pandas(df, preserve_index=False)
+    elif ext == ".parquet" and filters:
+        table = _read_dataset(file_path, columns, filters)
     elif ext == ".parquet":
-        df = pd.read_parquet(file_path)
+        table = pq.read_table(file_path, columns=columns, memory_map=memory_map)
+    elif ext in (".feather", ".arrow"):
+        read_columns = columns
+        if filters and columns is not None:
+            read_columns = list(dict.fromkeys(columns + _filter_columns(filters)))
+        table = feather.read_table(file_path, columns=read_columns, memory_map=memory_map)
+        if filters:
+            table = table.filter(pq.filters_to_expression(filters))
+            table = table.select(columns) if columns is not None else table
+    else:
+        raise ValueError(
+            f"Unsupported file extension: {ext}. Only .csv, .parquet and .feather supported."
+        )
+
+    if return_type == "arrow":
+        return table
+    if return_type == "arrow_dtype":
+        return table.to_pandas(types_mapper=pd.ArrowDtype)
+    return table.to_pandas()
+
+
+def read_columns(file_path: Union[str, Path]) -> List[str]:
+    """
+    Column names of a CSV, Parquet, Arrow IPC (Feather) file or partitioned Parquet directory,
+    read from the schema / header only.
+    """
+    file_path = Path(file_path)
+    ext = file_path.suffix.lower()
+    if file_path.is_dir() or ext == ".parquet":
+        partitioning = "hive" if file_path.is_dir() else None
+        return ds.dataset(file_path, format="parquet", partitioning=partitioning).schema.names
+    if ext in (".feather", ".arrow"):
+        return feather.read_table(file_path, memory_map=True).schema.names
+    if ext == ".csv":
+        return list(pd.read_csv(file_path, nrows=0).columns)
+    raise ValueError(
+        f"Unsupported file extension: {ext}. Only .csv, .parquet and .feather supported."
+    )
+
+
+def iter_batches(
+    file_path: Union[str, Path],
+    columns: Optional[Sequence[str]] = None,
+    chunksize: int = 100_000,
+) -> Iterator[pd.DataFrame]:
+    """
+    Stream a CSV, Parquet, Arrow IPC (Feather) file or partitioned Parquet directory as
+    DataFrames of at most `chunksize` rows, so memory follows the chunk and not the file.
+
+    Parameters
+    ----------
+    file_path : str or Path
+        Path to the input file or Hive-partitioned Parquet directory.
+    columns : sequence of str, optional
+        Columns to read (all by default).
+    chunksize : int
+        Maximum rows per chunk (Parquet chunks also end at row-group boundaries).
+
+    Yields
+    ------
+    pd.DataFrame
+        Consecutive chunks of the file.
+
+    Raises
+    ------
+    ValueError
+        If file extension is not supported or a requested column is missing.
+    """
+    file_path = Path(file_path)
+    if not file_path.exists():
+        raise FileNotFoundError(f"File not found: {file_path}")
+    ext = file_path.suffix.lower()
+    columns = list(columns) if columns is not None else None
+    missing = [c for c in columns or () if c not in set(read_columns(file_path))]
+    if missing:
+        raise ValueError(f"Columns not found in {file_path.name}: {missing}")
+
+    if file_path.is_dir() or ext == ".parquet":
+        dataset = ds.dataset(
+            file_path, format="parquet", partitioning="hive" if file_path.is_dir() else None
+        )
+        for batch in dataset.to_batches(columns=columns, batch_size=chunksize):
+            yield batch.to_pandas()
+    elif ext in (".feather", ".arrow"):
+        table = feather.read_table(file_path, columns=columns, memory_map=True)
+        for batch in table.to_batches(max_chunksize=chunksize):
+            yield batch.to_pandas()
     else:
-        raise ValueError(f"Unsupported file extension: {ext}. Only .csv and .parquet supported.")
+        yield from pd.read_csv(file_path, usecols=columns, chunksize=chunksize)
+
+
+def _read_dataset(
+    path: Path, columns: Optional[List[str]], filters: Optional[Filters]
+) -> pa.Table:
+    """
+    Scan a Parquet file or a Hive-partitioned directory (see dd360.load) batch by batch.
+
+    Filters on partition columns skip whole directories, the rest skip row groups by their
+    statistics, and only the rows that pass are kept in memory. For a dataset with a
+    _manifest.json the columns come back in the original order.
+    """
+    dataset = ds.dataset(path, format="parquet", partitioning="hive" if path.is_dir() else None)
+    if columns is None:
+        columns = dataset.schema.names
+        manifest_path = path / "_manifest.json"
+        if path.is_dir() and manifest_path.exists():
+            order = json.loads(manifest_path.read_text())["columns"]
+            columns = [c for c in order if c in columns] + [c for c in columns if c not in order]
+
+    expression = pq.filters_to_expression(filters) if filters else None
+    batches = dataset.to_batches(columns=columns, filter=expression, batch_readahead=2)
+    schema = dataset.schema
+    schema = pa.schema([schema.field(c) for c in columns], metadata=schema.metadata)
+    return pa.Table.from_batches(batches, schema=schema)
+
+
+def _read_csv(
+    file_path: Path,
+    columns: Optional[List[str]],
+    filters: Optional[Filters],
+    dtype: Optional[Dict[str, Any]],
+    chunksize: int,
+) -> pd.DataFrame:
+    """
+    Read a CSV with projection / dtypes; with filters only the matching rows of each chunk
+    are kept, so memory follows the result and the chunk size.
+    """
+    if dtype is not None:
+        dtype = {k: v for k, v in dtype.items() if columns is None or k in columns}
+    if not filters:
+        return pd.read_csv(file_path, usecols=columns, dtype=dtype)
+
+    usecols = None if columns is None else list(dict.fromkeys(columns + _filter_columns(filters)))
+    chunks = [
+        chunk.loc[filter_mask(chunk, filters)]
+        for chunk in pd.read_csv(file_path, usecols=usecols, dtype=dtype, chunksize=chunksize)
+    ]
+    df = pd.concat(chunks, ignore_index=True)
+    return df[columns] if columns is not None else df
+
+
+def _dnf(filters: Filters) -> List[List[Filter]]:
+    if filters and isinstance(filters[0], tuple):
+        return [list(filters)]
+    return [list(conjunction) for conjunction in filters]
 
-    return df
+
+def _filter_columns(filters: Filters) -> List[str]:
+    return list(dict.fromkeys(col for conjunction in _dnf(filters) for col, _, _ in conjunction))
+
+
+def filter_mask(df: pd.DataFrame, filters: Filters) -> np.ndarray:
+    """
+    Evaluate pyarrow-style DNF filters on a DataFrame.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Data to filter.
+    filters : list of tuples or list of lists of tuples
+        Filters as in extract_data.
+
+    Returns
+    -------
+    np.ndarray
+        Boolean mask of the rows that satisfy the filters.
+    """
+    mask = np.zeros(len(df), dtype=bool)
+    for conjunction in _dnf(filters):
+        conjunction_mask = np.ones(len(df), dtype=bool)
+        for col, op, value in conjunction:
+            values = df[col]
+            if op == "in":
+                result = values.isin(list(value))
+            elif op == "not in":
+                result = ~values.isin(list(value))
+            elif op in _OPERATORS:
+                result = _OPERATORS[op](values, value)
+            else:
+                raise ValueError(f"Unsupported filter operator: {op}")
+            conjunction_mask &= np.asarray(result.fillna(False), dtype=bool)
+        mask |= conjunction_mask
+    return mask
@@ -3,99 +3,257 @@ import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
 from sklearn.preprocessing import StandardScaler
-from sklearn.decomposition import PCA
-from sklearn.cluster import KMeans
+from sklearn.decomposition import PCA, IncrementalPCA
+from sklearn.cluster import KMeans, MiniBatchKMeans
 from sklearn.metrics import silhouette_score
 import statsmodels.api as sm
-from typing import Optional
+from joblib import Parallel, delayed
+from loguru import logger
+from pathlib import Path
+import typer
+from typing import Any, Dict, Optional, Union
+from dd360.config import FIGURES_DIR, PROCESSED_DATA_DIR, REPORTS_DIR
+from dd360.extract import extract_data
+
+PCA_SOLVERS = ("auto", "randomized", "incremental")
+CLUSTERING_ALGORITHMS = ("kmeans", "minibatch")
+
+# Columnas que no son features numéricas en final_df
+NON_FEATURE_COLUMNS = [
+    'price', 'property_id', 'listing_type', 'property_type', 'url_ad', 'neighborhood'
+]
+
+app = typer.Typer()
+
+
+def _fit_clustering(
+    X: np.ndarray,
+    k: int,
+    algorithm: str,
+    silhouette_sample_size: Optional[int],
+    batch_size: int,
+    random_state: int,
+) -> Dict[str, float]:
+    """
+    Ajusta un clustering con k grupos y calcula su inercia y Silhouette Score (exacto o sobre
+    una muestra de silhouette_sample_size filas).
+    """
+    if algorithm == "minibatch":
+        model = MiniBatchKMeans(
+            n_clusters=k, batch_size=batch_size, n_init=3, random_state=random_state
+        )
+    else:
+        model = KMeans(n_clusters=k, random_state=random_state)
+    labels = model.fit_predict(X)
+    sample_size = None
+    if silhouette_sample_size and silhouette_sample_size < len(X):
+        sample_size = silhouette_sample_size
+    score = silhouette_score(X, labels, sample_size=sample_size, random_state=random_state)
+    return {"k": k, "silhouette": float(score), "inertia": float(model.inertia_)}
+
 
 class FeatureSelectionPipeline:
     """
     Pipeline para selección de características que incluye análisis de correlaciones,
     reducción dimensional (PCA), clustering y regresión lineal.
+
+    Cada método devuelve sus resultados como datos. En modo interactivo (default) además
+    muestra las gráficas e imprime los resultados; en modo headless las gráficas se guardan en
+    figures_dir y no se imprime nada, para correrlo como un job programado.
     """
 
-    def __init__(self, df_features: pd.DataFrame, target: Optional[pd.Series] = None) -> None:
+    def __init__(
+        self,
+        df_features: pd.DataFrame,
+        target: Optional[pd.Series] = None,
+        headless: bool = False,
+        figures_dir: Union[str, Path] = FIGURES_DIR,
+        random_state: int = 42,
+    ) -> None:
         """
         Inicializa el pipeline con el DataFrame de features y el target opcional.
 
         Args:
             df_features (pd.DataFrame): DataFrame con las variables predictoras.
             target (Optional[pd.Series]): Serie con la variable objetivo (opcional).
+            headless (bool): Si es True guarda las gráficas en figures_dir en lugar de
+                mostrarlas y no imprime resultados.
+            figures_dir (Union[str, Path]): Directorio de las gráficas en modo headless.
+            random_state (int): Semilla de clustering, PCA aleatorizado y muestreo.
         """
         self.df_features: pd.DataFrame = df_features.copy()
         self.target: Optional[pd.Series] = target
+        self.headless: bool = headless
+        self.figures_dir: Path = Path(figures_dir)
+        self.random_state: int = random_state
         self.scaler: StandardScaler = StandardScaler()
         self.X_scaled: Optional[np.ndarray] = None
-        self.pca: Optional[PCA] = None
+        self.pca: Optional[Union[PCA, IncrementalPCA]] = None
         self.features: Optional[pd.DataFrame] = None
 
-    def plot_correlations(self) -> None:
+    def _scaled(self) -> np.ndarray:
+        if self.X_scaled is None:
+            self.X_scaled = self.scaler.fit_transform(self.df_features)
+        return self.X_scaled
+
+    def _finish_figure(self, fig: plt.Figure, name: str) -> Optional[Path]:
+        """
+        Muestra la figura o, en modo headless, la guarda como figures_dir/name.png y la cierra.
+        """
+        if not self.headless:
+            plt.show()
+            return None
+        self.figures_dir.mkdir(parents=True, exist_ok=True)
+        path = self.figures_dir / f"{name}.png"
+        fig.savefig(path, bbox_inches="tight")
+        plt.close(fig)
+        return path
+
+    def _warn(self, message: str) -> None:
+        """
+        Avisa que un paso no se pudo ejecutar: con print en modo interactivo y con
+        logger.warning en modo headless (que no imprime en la salida estándar).
+        """
+        if self.headless:
+            logger.warning(message)
+        else:
+            print(message)
+
+    def plot_correlations(self) -> Dict[str, Any]:
         """
         Grafica la matriz de correlaciones entre las features y muestra
         la correlación de cada feature con el target (si está definido).
+
+        Returns:
+            Dict[str, Any]: 'corr_matrix' (pd.DataFrame) y 'corr_target' (pd.Series o None).
         """
         corr_matrix = self.df_features.corr()
-        plt.figure(figsize=(10,8))
-        sns.heatmap(corr_matrix, annot=True, cmap='coolwarm')
+        fig = plt.figure(figsize=(10,8))
+        # En modo headless sólo se anotan matrices legibles (anotar 50x50 tarda varios segundos)
+        annot = not self.headless or len(corr_matrix) <= 20
+        sns.heatmap(corr_matrix, annot=annot, cmap='coolwarm')
         plt.title('Matriz de Correlación entre Features')
-        plt.show()
+        self._finish_figure(fig, "feature_correlations")
 
+        corr_target = None
         if self.target is not None:
-            corr_target = self.df_features.corrwith(self.target)
-            print("\nCorrelación de cada feature con el target:")
-            print(corr_target.sort_values(ascending=False))
+            corr_target = self.df_features.corrwith(self.target).sort_values(ascending=False)
+            if not self.headless:
+                print("\nCorrelación de cada feature con el target:")
+                print(corr_target)
+        return {"corr_matrix": corr_matrix, "corr_target": corr_target}
 
-    def run_pca(self) -> None:
+    def run_pca(
+        self,
+        n_components: Optional[int] = None,
+        solver: str = "auto",
+        batch_size: Optional[int] = None,
+    ) -> Dict[str, pd.DataFrame]:
         """
         Ejecuta PCA sobre las features escaladas, muestra la varianza explicada acumulada
         y presenta los loadings de cada componente principal.
+
+        Args:
+            n_components (Optional[int]): Componentes a calcular (todas por defecto).
+            solver (str): "auto" (PCA exacto; sklearn usa la descomposición de la matriz de
+                covarianza cuando hay muchas más filas que features, una sola pasada sobre los
+                datos), "randomized" (SVD aleatorizada, conviene con muchas features y pocas
+                componentes) o "incremental" (IncrementalPCA por lotes de batch_size filas,
+                memoria acotada).
+            batch_size (Optional[int]): Filas por lote del modo incremental.
+
+        Returns:
+            Dict[str, pd.DataFrame]: 'explained_variance' (varianza explicada y acumulada por
+                componente) y 'loadings' (features x componentes).
         """
-        self.X_scaled = self.scaler.fit_transform(self.df_features)
-        self.pca = PCA()
-        self.pca.fit(self.X_scaled)
+        X = self._scaled()
+        if solver == "auto":
+            self.pca = PCA(n_components=n_components)
+        elif solver == "randomized":
+            self.pca = PCA(
+                n_components=n_components or min(X.shape),
+                svd_solver="randomized",
+                random_state=self.random_state,
+            )
+        elif solver == "incremental":
+            self.pca = IncrementalPCA(n_components=n_components, batch_size=batch_size)
+        else:
+            raise ValueError(f"Solver no soportado: {solver}. Usa uno de {PCA_SOLVERS}.")
+        self.pca.fit(X)
+
+        components = [f'PC{i+1}' for i in range(len(self.pca.components_))]
+        ratios = self.pca.explained_variance_ratio_
+        explained = pd.DataFrame(
+            {"explained_variance_ratio": ratios, "cumulative": ratios.cumsum()}, index=components
+        )
 
-        plt.figure(figsize=(8,5))
-        plt.plot(range(1, len(self.pca.explained_variance_ratio_) + 1),
-                 self.pca.explained_variance_ratio_.cumsum(), marker='o')
+        fig = plt.figure(figsize=(8,5))
+        plt.plot(range(1, len(ratios) + 1), ratios.cumsum(), marker='o')
         plt.xlabel('Número de componentes')
         plt.ylabel('Varianza explicada acumulada')
         plt.title('PCA - Varianza explicada')
         plt.grid(True)
-        plt.show()
+        self._finish_figure(fig, "pca_explained_variance")
 
         loadings = pd.DataFrame(self.pca.components_.T,
-                                columns=[f'PC{i+1}' for i in range(len(self.pca.components_))],
+                                columns=components,
                                 index=self.df_features.columns)
-        print("\nLoadings (importancia de features en cada componente):")
-        print(loadings)
+        if not self.headless:
+            print("\nLoadings (importancia de features en cada componente):")
+            print(loadings)
+        return {"explained_variance": explained, "loadings": loadings}
 
-    def run_clustering(self, max_clusters: int = 10) -> None:
+    def run_clustering(
+        self,
+        max_clusters: int = 10,
+        algorithm: str = "kmeans",
+        silhouette_sample_size: Optional[int] = None,
+        n_jobs: Optional[int] = None,
+        batch_size: int = 4096,
+    ) -> pd.DataFrame:
         """
         Ejecuta clustering KMeans para distintos valores de k y muestra el Silhouette Score
         para evaluar la calidad de cada partición.
 
         Args:
             max_clusters (int): Número máximo de clusters a probar (mínimo 2).
+            algorithm (str): "kmeans" (KMeans completo) o "minibatch" (MiniBatchKMeans, lineal
+                en el número de filas).
+            silhouette_sample_size (Optional[int]): Si se indica, el Silhouette Score se estima
+                sobre una muestra de ese tamaño en lugar del cálculo exacto O(n²).
+            n_jobs (Optional[int]): Valores de k que se ajustan en paralelo (joblib; -1 usa
+                todos los núcleos, None uno a la vez).
+            batch_size (int): Tamaño de lote de MiniBatchKMeans.
+
+        Returns:
+            pd.DataFrame: Columnas 'k', 'silhouette' e 'inertia'.
         """
-        if self.X_scaled is None:
-            self.X_scaled = self.scaler.fit_transform(self.df_features)
+        if algorithm not in CLUSTERING_ALGORITHMS:
+            raise ValueError(
+                f"Algoritmo no soportado: {algorithm}. Usa uno de {CLUSTERING_ALGORITHMS}."
+            )
+        X = self._scaled()
 
-        silhouette_scores = []
-        for k in range(2, max_clusters+1):
-            kmeans = KMeans(n_clusters=k, random_state=42)
-            labels = kmeans.fit_predict(self.X_scaled)
-            score = silhouette_score(self.X_scaled, labels)
-            silhouette_scores.append(score)
-            print(f"Silhouette Score para {k} clusters: {score:.4f}")
+        ks = range(2, max_clusters+1)
+        scores = Parallel(n_jobs=n_jobs)(
+            delayed(_fit_clustering)(
+                X, k, algorithm, silhouette_sample_size, batch_size, self.random_state
+            )
+            for k in ks
+        )
+        results = pd.DataFrame(scores)
+        if not self.headless:
+            for row in results.itertuples():
+                print(f"Silhouette Score para {row.k} clusters: {row.silhouette:.4f}")
 
-        plt.figure(figsize=(8,5))
-        plt.plot(range(2, max_clusters+1), silhouette_scores, marker='o')
+        fig = plt.figure(figsize=(8,5))
+        plt.plot(results["k"], results["silhouette"], marker='o')
         plt.xlabel('Número de clusters')
         plt.ylabel('Silhouette Score')
         plt.title('Evaluación de clustering con diferentes k')
         plt.grid(True)
-        plt.show()
+        self._finish_figure(fig, "clustering_silhouette")
+        return results
 
     def select_features(self, df: pd.DataFrame) -> None:
         """
@@ -114,14 +272,17 @@ class FeatureSelectionPipeline:
         self.features = df.drop(columns=['price'], errors='ignore')  # o la variable objetivo que no quieras usar
         self.target = df['price'] if 'price' in df.columns else None
 
-    def run_linear_regression(self) -> None:
+    def run_linear_regression(self) -> Optional[Any]:
         """
         Ejecuta regresión lineal OLS usando las features y target seleccionados,
         e imprime el resumen del modelo.
+
+        Returns:
+            Optional[Any]: Resultado de statsmodels OLS (None si faltan features o target).
         """
         if self.features is None or self.target is None:
-            print("Debe ejecutar select_features y asegurar que target y features estén definidos.")
-            return
+            self._warn("Debe ejecutar select_features y asegurar que target y features estén definidos.")
+            return None
 
         X = self.features
         y = self.target
@@ -130,25 +291,28 @@ class FeatureSelectionPipeline:
         X = X.astype(float)
 
         model = sm.OLS(y, X).fit()
-        print(model.summary())
+        if not self.headless:
+            print(model.summary())
+        return model
 
-    def run_regression_with_pca_components(self, n_components: int = 5) -> None:
+    def run_regression_with_pca_components(self, n_components: int = 5) -> Optional[Any]:
         """
         Ejecuta regresión lineal usando los primeros n componentes principales
         obtenidos del PCA.
 
         Args:
             n_components (int): Número de componentes principales a usar en la regresión.
+
+        Returns:
+            Optional[Any]: Resultado de statsmodels OLS (None si no hay target).
         """
         if self.target is None:
-            print("No hay target para regresión lineal.")
-            return
+            self._warn("No hay target para regresión lineal.")
+            return None
 
         if self.pca is None:
-            if self.X_scaled is None:
-                self.X_scaled = self.scaler.fit_transform(self.df_features)
             self.pca = PCA(n_components=n_components)
-            X_pca = self.pca.fit_transform(self.X_scaled)
+            X_pca = self.pca.fit_transform(self._scaled())
         else:
             X_pca = self.pca.transform(self.X_scaled)[:, :n_components]
 
@@ -157,5 +321,87 @@ class FeatureSelectionPipeline:
 
         X = sm.add_constant(X)
         model = sm.OLS(y, X).fit()
-        print(f"\nRegresión con {n_components} componentes principales:")
-        print(model.summary())
+        if not self.headless:
+            print(f"\nRegresión con {n_components} componentes principales:")
+            print(model.summary())
+        return model
+
+    def run_report(
+        self,
+        max_clusters: int = 10,
+        n_components: Optional[int] = None,
+        pca_solver: str = "auto",
+        clustering_algorithm: str = "minibatch",
+        silhouette_sample_size: Optional[int] = 10_000,
+        n_jobs: Optional[int] = -1,
+    ) -> Dict[str, Any]:
+        """
+        Corre correlaciones, PCA y clustering con las opciones escalables (MiniBatchKMeans con
+        los k en paralelo y Silhouette muestreado; pca_solver permite PCA aleatorizado o
+        incremental).
+
+        Args:
+            max_clusters (int): Número máximo de clusters a probar.
+            n_components (Optional[int]): Componentes del PCA (todas por defecto).
+            pca_solver (str): Uno de PCA_SOLVERS.
+            clustering_algorithm (str): Uno de CLUSTERING_ALGORITHMS.
+            silhouette_sample_size (Optional[int]): Muestra del Silhouette Score (None: exacto).
+            n_jobs (Optional[int]): Valores de k en paralelo.
+
+        Returns:
+            Dict[str, Any]: Resultados de plot_correlations, run_pca ('explained_variance',
+                'loadings') y run_clustering ('clustering').
+        """
+        report = self.plot_correlations()
+        report.update(self.run_pca(n_components, solver=pca_solver))
+        report["clustering"] = self.run_clustering(
+            max_clusters,
+            algorithm=clustering_algorithm,
+            silhouette_sample_size=silhouette_sample_size,
+            n_jobs=n_jobs,
+        )
+        return report
+
+
+@app.command()
+def main(
+    input_path: Path = PROCESSED_DATA_DIR / "final_df.parquet",
+    output_dir: Path = REPORTS_DIR / "feature_selection",
+    figures_dir: Path = FIGURES_DIR,
+    max_clusters: int = 10,
+    n_components: Optional[int] = None,
+    silhouette_sample_size: int = 10_000,
+    n_jobs: int = -1,
+):
+    """
+    Run the feature analysis headless: figures go to figures_dir, tables to output_dir as CSV.
+    """
+    df = extract_data(input_path)
+    features = df.drop(columns=NON_FEATURE_COLUMNS, errors="ignore")
+    features = features.select_dtypes(include=[np.number, "bool"])
+    target = df["price"] if "price" in df.columns else None
+
+    pipeline = FeatureSelectionPipeline(
+        features, target=target, headless=True, figures_dir=figures_dir
+    )
+    report = pipeline.run_report(
+        max_clusters, n_components, silhouette_sample_size=silhouette_sample_size, n_jobs=n_jobs
+    )
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    report["corr_matrix"].to_csv(output_dir / "corr_matrix.csv")
+    if report["corr_target"] is not None:
+        report["corr_target"].rename("corr_target").to_csv(output_dir / "corr_target.csv")
+    report["explained_variance"].to_csv(output_dir / "pca_explained_variance.csv")
+    report["loadings"].to_csv(output_dir / "pca_loadings.csv")
+    report["clustering"].to_csv(output_dir / "clustering.csv", index=False)
+
+    best = report["clustering"].loc[report["clustering"]["silhouette"].idxmax()]
+    logger.success(
+        f"{len(features)} rows, {features.shape[1]} features; best k={int(best['k'])} "
+        f"(silhouette {best['silhouette']:.4f}). Tables in {output_dir}, figures in {figures_dir}"
+    )
+
+
+if __name__ == "__main__":
+    app()
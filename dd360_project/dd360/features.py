@@ -1,17 +1,59 @@
-import pandas as pd
+from io import BytesIO
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+import uuid
+
 import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from scipy import sparse
 
+from dd360.config import FEATURE_REFERENCE_YEAR, PROCESSED_DATA_DIR, PROCESSED_DATASET_DIR
+from dd360.load import MANIFEST_NAME, build_manifest, read_manifest, write_partitioned_dataset
 
-def engineer_features(df: pd.DataFrame) -> pd.DataFrame:
+CATEGORICAL_COLS = {"property_type": "type", "neighborhood": "neigh"}
+ONE_HOT_MODES = ("float", "uint8", "sparse", None)
+DOWNCAST_MODES = ("lossless", "float32", None)
+
+
+def engineer_features(
+    df: pd.DataFrame,
+    categorical: bool = False,
+    one_hot: Optional[str] = "float",
+    downcast: Optional[str] = None,
+    reference_year: int = FEATURE_REFERENCE_YEAR,
+) -> pd.DataFrame:
     """
     Perform feature engineering on the cleaned property dataset.
 
+    The defaults reproduce the original output (dense float64 one-hot columns). For large
+    datasets the compact options avoid materializing one float64 column per colonia.
+
     Parameters:
         df (pd.DataFrame): Cleaned DataFrame with raw features.
+        categorical (bool): Store neighborhood / property_type as pandas 'category' dtype.
+        one_hot (str or None): Encoding of the type_* / neigh_* columns: "float" (float64,
+            default), "uint8", "sparse" (pandas SparseDtype uint8 columns; see one_hot_matrix
+            for a SciPy matrix) or None to skip them.
+        downcast (str or None): "lossless" downcasts integers to the smallest type that holds
+            them and floats to float32 only when no value changes; "float32" casts every float
+            column (~7 significant digits). None keeps 64-bit types.
+        reference_year (int): Year the property age is measured from
+            (config.FEATURE_REFERENCE_YEAR by default).
 
     Returns:
         pd.DataFrame: DataFrame with new engineered features.
     """
+    if one_hot not in ONE_HOT_MODES:
+        raise ValueError(f"Unsupported one_hot: {one_hot}. Use one of {ONE_HOT_MODES}.")
+    if downcast not in DOWNCAST_MODES:
+        raise ValueError(f"Unsupported downcast: {downcast}. Use one of {DOWNCAST_MODES}.")
+
     df = df.copy()
 
     # --- Price per m2 (construction only) ---
@@ -22,7 +64,7 @@ def engineer_features(df: pd.DataFrame) -> pd.DataFrame:
     df["total_surface"] = df["terrain_surface"].fillna(0) + df["construction_surface"].fillna(0)
 
     # --- Property age ---
-    df["age"] = 2025 - df["built_year"]
+    df["age"] = reference_year - df["built_year"]
     df["age"] = df["age"].clip(lower=0)  # evitar valores negativos por errores
 
     # --- Has amenities (either garden or gym) ---
@@ -32,20 +74,435 @@ def engineer_features(df: pd.DataFrame) -> pd.DataFrame:
     for col in ["terrain_surface", "num_bathrooms", "num_bedrooms", "num_parking_lots"]:
         df[col] = df[col].fillna(0)
 
+    # --- Compact numeric types (before the one-hots, which already get their own dtype) ---
+    if downcast is not None:
+        df = downcast_numeric(df, floats=downcast)
+
     # --- One-hot encoding for categorical variables ---
-    if "property_type" in df.columns:
-        # Crear dummies aparte
-        dummies = pd.get_dummies(df["property_type"], prefix="type").astype(float)
+    if one_hot is not None:
+        dummies = []
+        for col, prefix in CATEGORICAL_COLS.items():
+            if col in df.columns:
+                dummies.append(_one_hot_frame(df[col], prefix, one_hot, downcast))
+        if dummies:
+            df = pd.concat([df, *dummies], axis=1)
 
-        # Concatenar con el DataFrame original
-        df = pd.concat([df, dummies], axis=1)
+    if categorical:
+        for col in CATEGORICAL_COLS:
+            if col in df.columns:
+                df[col] = df[col].astype("category")
+
+    return df
+
+
+def _one_hot_frame(
+    values: pd.Series, prefix: str, mode: str, downcast: Optional[str]
+) -> pd.DataFrame:
+    """
+    One-hot columns of a categorical Series in the requested encoding.
+    """
+    if mode == "sparse":
+        return pd.get_dummies(values, prefix=prefix, sparse=True, dtype=np.uint8)
+    if mode == "uint8":
+        return pd.get_dummies(values, prefix=prefix, dtype=np.uint8)
+    # 0 / 1 are exact in float32, so a lossless downcast also applies to float one-hots
+    dtype = np.float32 if downcast is not None else np.float64
+    return pd.get_dummies(values, prefix=prefix).astype(dtype)
+
+
+def one_hot_matrix(
+    df: pd.DataFrame, columns: Sequence[str] = tuple(CATEGORICAL_COLS)
+) -> Tuple[sparse.csr_matrix, List[str]]:
+    """
+    One-hot encode categorical columns directly as a SciPy CSR matrix (one non-zero per row
+    and column), without building dense dummy columns.
+
+    Parameters:
+        df (pd.DataFrame): DataFrame with the categorical columns.
+        columns (Sequence[str]): Columns to encode (default: property_type and neighborhood).
+
+    Returns:
+        Tuple[sparse.csr_matrix, List[str]]: uint8 matrix of shape (rows, n_categories) and the
+        column names (type_* / neigh_* as in engineer_features).
+    """
+    blocks, names = [], []
+    for col in columns:
+        codes, uniques = pd.factorize(df[col], sort=True)
+        present = codes >= 0
+        rows = np.flatnonzero(present)
+        blocks.append(
+            sparse.csr_matrix(
+                (np.ones(len(rows), dtype=np.uint8), (rows, codes[present])),
+                shape=(len(df), len(uniques)),
+            )
+        )
+        prefix = CATEGORICAL_COLS.get(col, col)
+        names.extend(f"{prefix}_{value}" for value in uniques)
+    return sparse.hstack(blocks, format="csr"), names
 
-    # --- One-hot encoding for categorical variables ---
-    if "neighborhood" in df.columns:
-        # Crear dummies aparte
-        neigh_ohe = pd.get_dummies(df['neighborhood'], prefix='neigh').astype(float)
 
-        # Concatenar con el DataFrame original
-        df = pd.concat([df, neigh_ohe], axis=1)
+def downcast_numeric(df: pd.DataFrame, floats: str = "lossless") -> pd.DataFrame:
+    """
+    Downcast numeric columns without overflow.
+
+    Integer columns go to the smallest integer type that holds their range (exact). Float
+    columns go to float32 when floats="float32", or with floats="lossless" only when every
+    value survives the round trip (counts, surfaces, 0 / 1 flags...).
+
+    Parameters:
+        df (pd.DataFrame): DataFrame to downcast (not modified).
+        floats (str): "lossless" or "float32".
 
+    Returns:
+        pd.DataFrame: DataFrame with compact numeric dtypes.
+    """
+    df = df.copy()
+    for col in df.columns:
+        dtype = df[col].dtype
+        if pd.api.types.is_bool_dtype(dtype) or not pd.api.types.is_numeric_dtype(dtype):
+            continue
+        if isinstance(dtype, pd.SparseDtype):
+            continue
+        if pd.api.types.is_integer_dtype(dtype):
+            unsigned = len(df) > 0 and df[col].min() >= 0
+            df[col] = pd.to_numeric(df[col], downcast="unsigned" if unsigned else "integer")
+        elif pd.api.types.is_float_dtype(dtype) and dtype != np.float32:
+            values = df[col].to_numpy(dtype=np.float64)
+            as_float32 = values.astype(np.float32)
+            if floats == "float32" or np.array_equal(
+                as_float32.astype(np.float64), values, equal_nan=True
+            ):
+                df[col] = as_float32
     return df
+
+
+def memory_report(frames: Dict[str, pd.DataFrame], parquet: bool = True) -> pd.DataFrame:
+    """
+    Compare the in-memory (deep) and Parquet size of several versions of a DataFrame.
+
+    Parameters:
+        frames (Dict[str, pd.DataFrame]): DataFrames by label, e.g. {"default": ..., "compact":
+            ...}.
+        parquet (bool): Also measure the Parquet size (NaN for frames with sparse columns,
+            which Parquet cannot store).
+
+    Returns:
+        pd.DataFrame: One row per label with columns, memory_mb, parquet_mb and the memory
+        ratio against the first frame.
+    """
+    rows = []
+    for label, frame in frames.items():
+        row = {
+            "frame": label,
+            "columns": frame.shape[1],
+            "memory_mb": frame.memory_usage(deep=True).sum() / 2**20,
+        }
+        if parquet:
+            has_sparse = any(isinstance(t, pd.SparseDtype) for t in frame.dtypes)
+            if has_sparse:
+                row["parquet_mb"] = np.nan
+            else:
+                buffer = BytesIO()
+                frame.to_parquet(buffer)
+                row["parquet_mb"] = buffer.tell() / 2**20
+        rows.append(row)
+
+    report = pd.DataFrame(rows).set_index("frame")
+    report["memory_ratio"] = report["memory_mb"] / report["memory_mb"].iloc[0]
+    return report
+
+
+def feature_memory_report(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Memory report of engineer_features on a cleaned DataFrame: default output against the
+    compact options (uint8 / sparse one-hots, category dtype, lossless and float32 downcast).
+    """
+    return memory_report(
+        {
+            "default": engineer_features(df),
+            "uint8": engineer_features(df, one_hot="uint8"),
+            "uint8+category+lossless": engineer_features(
+                df, categorical=True, one_hot="uint8", downcast="lossless"
+            ),
+            "sparse+category+float32": engineer_features(
+                df, categorical=True, one_hot="sparse", downcast="float32"
+            ),
+            "category only (no one-hots)": engineer_features(
+                df, categorical=True, one_hot=None, downcast="float32"
+            ),
+        }
+    )
+
+
+class FeatureEncoder:
+    """
+    engineer_features with a fitted category vocabulary and a fixed column order.
+
+    fit records the property_type / neighborhood values and the output columns; transform
+    always returns those columns in that order, whatever categories the batch contains (a batch
+    without CONDESA still has neigh_CONDESA, all zeros). Unknown categories are handled with
+    `handle_unknown`: "ignore" (all-zero one-hots), "extend" (the vocabulary grows and the new
+    columns are appended at the end; save the encoder afterwards) or "error".
+    """
+
+    HANDLE_UNKNOWN = ("ignore", "extend", "error")
+
+    def __init__(
+        self,
+        reference_year: int = FEATURE_REFERENCE_YEAR,
+        handle_unknown: str = "ignore",
+        one_hot: str = "float",
+    ) -> None:
+        """
+        Parameters:
+            reference_year (int): Year the property age is measured from.
+            handle_unknown (str): "ignore", "extend" or "error".
+            one_hot (str): "float" (float64, as engineer_features) or "uint8".
+        """
+        if handle_unknown not in self.HANDLE_UNKNOWN:
+            raise ValueError(
+                f"Unsupported handle_unknown: {handle_unknown}. Use one of {self.HANDLE_UNKNOWN}."
+            )
+        if one_hot not in ("float", "uint8"):
+            raise ValueError(f"Unsupported one_hot: {one_hot}. Use 'float' or 'uint8'.")
+        self.reference_year = reference_year
+        self.handle_unknown = handle_unknown
+        self.one_hot = one_hot
+        self.vocabulary_: Dict[str, List[str]] = {}
+        self.columns_: List[str] = []
+
+    def fit(self, df: pd.DataFrame) -> "FeatureEncoder":
+        """
+        Learn the category vocabulary (sorted, as pd.get_dummies) and the output column order.
+
+        Parameters:
+            df (pd.DataFrame): Cleaned DataFrame (the history the features are built from).
+
+        Returns:
+            FeatureEncoder: The fitted encoder.
+        """
+        self.vocabulary_ = {
+            col: sorted(df[col].dropna().unique().tolist())
+            for col in CATEGORICAL_COLS
+            if col in df.columns
+        }
+        self.columns_ = list(self._encode(df.head(0)).columns)
+        return self
+
+    def transform(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Engineer features for a batch with the fitted vocabulary and column order.
+
+        Parameters:
+            df (pd.DataFrame): Cleaned DataFrame.
+
+        Returns:
+            pd.DataFrame: Engineered features with exactly self.columns_ (in order).
+        """
+        if not self.columns_:
+            raise ValueError("FeatureEncoder is not fitted. Call fit or load first.")
+
+        for col, vocabulary in self.vocabulary_.items():
+            if col not in df.columns:
+                continue
+            known = set(vocabulary)
+            unknown = [v for v in pd.unique(df[col].dropna()) if v not in known]
+            if not unknown:
+                continue
+            if self.handle_unknown == "error":
+                raise ValueError(f"Unknown {col} values: {unknown}")
+            if self.handle_unknown == "extend":
+                new_values = sorted(unknown)
+                vocabulary.extend(new_values)
+                prefix = CATEGORICAL_COLS[col]
+                self.columns_.extend(f"{prefix}_{v}" for v in new_values)
+
+        return self._encode(df).reindex(columns=self.columns_)
+
+    def fit_transform(self, df: pd.DataFrame) -> pd.DataFrame:
+        return self.fit(df).transform(df)
+
+    def _encode(self, df: pd.DataFrame) -> pd.DataFrame:
+        out = engineer_features(df, one_hot=None, reference_year=self.reference_year)
+        dtype = np.uint8 if self.one_hot == "uint8" else np.float64
+
+        blocks = []
+        for col, vocabulary in self.vocabulary_.items():
+            if col not in out.columns:
+                continue
+            # Valores fuera del vocabulario (handle_unknown="ignore") quedan con código -1
+            codes = pd.Categorical(out[col], categories=vocabulary).codes
+            block = np.zeros((len(out), len(vocabulary)), dtype=dtype)
+            rows = np.flatnonzero(codes >= 0)
+            block[rows, codes[rows]] = 1
+            prefix = CATEGORICAL_COLS[col]
+            blocks.append(
+                pd.DataFrame(
+                    block, index=out.index, columns=[f"{prefix}_{v}" for v in vocabulary]
+                )
+            )
+        return pd.concat([out, *blocks], axis=1) if blocks else out
+
+    def save(self, path: Union[str, Path]) -> None:
+        """
+        Save the vocabulary, column order and options as JSON.
+        """
+        state = {
+            "reference_year": self.reference_year,
+            "handle_unknown": self.handle_unknown,
+            "one_hot": self.one_hot,
+            "vocabulary": self.vocabulary_,
+            "columns": self.columns_,
+        }
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        Path(path).write_text(json.dumps(state, indent=2, ensure_ascii=False))
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "FeatureEncoder":
+        """
+        Load an encoder saved with save.
+        """
+        state = json.loads(Path(path).read_text())
+        encoder = cls(state["reference_year"], state["handle_unknown"], state["one_hot"])
+        encoder.vocabulary_ = state["vocabulary"]
+        encoder.columns_ = state["columns"]
+        return encoder
+
+
+def append_features(
+    df: pd.DataFrame,
+    encoder: FeatureEncoder,
+    root: Union[str, Path] = PROCESSED_DATASET_DIR,
+) -> int:
+    """
+    Engineer features for new cleaned listings and add them to the partitioned processed
+    dataset (dd360.load) as new part files, without touching the existing files.
+
+    The new rows are written under their (neighborhood, property_type) partitions with a
+    unique file name and the manifest is rebuilt from the Parquet footers, so the cost
+    follows the batch, plus one scan of the property_id column to skip listings already in
+    the dataset. The dataset's columns are fixed: if the encoder's vocabulary was extended
+    with new one-hot columns, the dataset has to be rewritten (rewrite_with_features or
+    dd360.load.write_partitioned_dataset).
+
+    Parameters:
+        df (pd.DataFrame): Cleaned listings (property_id as index or column).
+        encoder (FeatureEncoder): Fitted encoder whose columns match the dataset.
+        root (str or Path): Dataset directory (default data/processed/final_df/).
+
+    Returns:
+        int: Number of rows appended.
+    """
+    root = Path(root)
+    features = _encoded_rows(df, encoder)
+    if not (root / MANIFEST_NAME).exists():
+        write_partitioned_dataset(features, root, overwrite=False)
+        return len(features)
+
+    partition_cols = read_manifest(root)["partition_cols"]
+    dataset = ds.dataset(root, format="parquet", partitioning="hive")
+    existing_ids = dataset.to_table(columns=["property_id"])["property_id"]
+    known = pc.is_in(pa.array(features["property_id"].to_numpy()), value_set=existing_ids)
+    features = features[~known.to_numpy(zero_copy_only=False)]
+    if features.empty:
+        return 0
+
+    schema = dataset.schema
+    missing = [name for name in schema.names if name not in features.columns]
+    if missing:
+        raise ValueError(f"Encoder output lacks columns of {root.name}: {missing}")
+    added = [name for name in features.columns if name not in schema.names]
+    if added:
+        raise ValueError(
+            f"Encoder added columns not in {root.name}: {added}; rewrite the dataset instead"
+        )
+
+    table = pa.Table.from_pandas(features, preserve_index=False).select(schema.names)
+    ds.write_dataset(
+        table.cast(schema),
+        root,
+        format="parquet",
+        partitioning=partition_cols,
+        partitioning_flavor="hive",
+        basename_template=f"part-{uuid.uuid4().hex}-{{i}}.parquet",
+        existing_data_behavior="overwrite_or_ignore",
+    )
+    manifest = build_manifest(root)
+    (root / MANIFEST_NAME).write_text(json.dumps(manifest, indent=2, ensure_ascii=False))
+    return len(features)
+
+
+def rewrite_with_features(
+    df: pd.DataFrame,
+    encoder: FeatureEncoder,
+    path: Union[str, Path] = PROCESSED_DATA_DIR / "final_df.parquet",
+) -> int:
+    """
+    Engineer features for new cleaned listings and rewrite a single processed Parquet file
+    with them appended, without recomputing the existing rows.
+
+    Unlike append_features this rewrites the whole file (cost proportional to the file, not
+    to the batch): the existing row groups are copied as Arrow tables (columns added by a
+    vocabulary extension are filled with 0 for the old rows), the new rows are written as an
+    extra row group and the file is replaced atomically. Listings whose property_id is
+    already in the file are skipped.
+
+    Parameters:
+        df (pd.DataFrame): Cleaned listings (property_id as index or column).
+        encoder (FeatureEncoder): Fitted encoder whose columns match the file.
+        path (str or Path): Processed Parquet file (default data/processed/final_df.parquet).
+
+    Returns:
+        int: Number of rows appended.
+    """
+    path = Path(path)
+    features = _encoded_rows(df, encoder)
+
+    if not path.exists():
+        features.to_parquet(path, index=False)
+        return len(features)
+
+    parquet_file = pq.ParquetFile(path)
+    existing_ids = pq.read_table(path, columns=["property_id"])["property_id"].to_pylist()
+    features = features[~features["property_id"].isin(set(existing_ids))]
+    if features.empty:
+        return 0
+
+    old_schema = parquet_file.schema_arrow
+    new_table = pa.Table.from_pandas(features, preserve_index=False)
+    missing = [name for name in old_schema.names if name not in new_table.schema.names]
+    if missing:
+        raise ValueError(f"Encoder output lacks columns of {path.name}: {missing}")
+    added = [name for name in new_table.schema.names if name not in old_schema.names]
+    if [n for n in new_table.schema.names if n in old_schema.names] != old_schema.names:
+        raise ValueError(f"Encoder column order does not match {path.name}")
+
+    # Existing columns keep their stored types; pandas metadata comes from the new rows
+    schema = pa.schema(
+        [
+            old_schema.field(n) if n in old_schema.names else new_table.schema.field(n)
+            for n in new_table.schema.names
+        ],
+        metadata=new_table.schema.metadata,
+    )
+
+    tmp_path = path.with_name(path.name + ".tmp")
+    with parquet_file, pq.ParquetWriter(tmp_path, schema) as writer:
+        for i in range(parquet_file.num_row_groups):
+            table = parquet_file.read_row_group(i)
+            for name in added:
+                field = schema.field(name)
+                table = table.append_column(
+                    field, pa.array(np.zeros(table.num_rows), type=pa.float64()).cast(field.type)
+                )
+            writer.write_table(table.select(schema.names).cast(schema))
+        writer.write_table(new_table.cast(schema))
+    os.replace(tmp_path, path)
+    return len(features)
+
+
+def _encoded_rows(df: pd.DataFrame, encoder: FeatureEncoder) -> pd.DataFrame:
+    features = encoder.transform(df)
+    if "property_id" not in features.columns:
+        features = features.reset_index()
+    return features[["property_id"] + [c for c in features.columns if c != "property_id"]]
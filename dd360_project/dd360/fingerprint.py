@@ -0,0 +1,23 @@
+import hashlib
+import json
+
+import pandas as pd
+
+
+def dataframe_fingerprint(df: pd.DataFrame) -> str:
+    """
+    Calcula una huella (sha256) del contenido, columnas, tipos e índice de un DataFrame.
+
+    La usan la caché de resultados de dd360.experiments y las tablas de vecinos de
+    dd360.neighbors para saber si fueron calculadas con los mismos datos.
+
+    Args:
+        df (pd.DataFrame): DataFrame de entrada.
+
+    Returns:
+        str: Huella hexadecimal.
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps([[str(c), str(t)] for c, t in df.dtypes.items()]).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
@@ -0,0 +1,293 @@
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import sqlite3
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from bs4 import BeautifulSoup
+from loguru import logger
+import requests
+from requests.adapters import HTTPAdapter
+import typer
+import urllib3
+
+from dd360.config import IMAGES_CACHE_PATH, PROCESSED_DATA_DIR
+from dd360.extract import extract_data
+
+# Imagen que se muestra cuando un anuncio no tiene og:image o no se pudo consultar
+DEFAULT_IMAGE = (
+    "https://cdn.prod.website-files.com/61e9b342b016364181c41f50/"
+    "63e6833197ca517367b6be46_6%20(1).png"
+)
+
+HEADERS = {"User-Agent": "Mozilla/5.0"}
+
+# Vigencia de los resultados en caché: imágenes encontradas, anuncios sin og:image (o con
+# respuesta distinta de 200) y errores de red / timeouts.
+IMAGE_TTL_S = 7 * 24 * 3600
+MISSING_TTL_S = 24 * 3600
+ERROR_TTL_S = 3600
+
+# Bytes máximos que se leen de una página si no aparece </head>
+MAX_HEAD_BYTES = 512 * 1024
+
+app = typer.Typer()
+
+
+class ImageCache:
+    """
+    Caché en disco (SQLite) de la imagen principal de cada anuncio, con vigencia.
+
+    Guarda también los resultados negativos (anuncio sin og:image, respuesta distinta de 200 o
+    error de red) con una vigencia más corta, para no volver a consultar en cada búsqueda los
+    anuncios que no tienen imagen. Sobrevive a reinicios de la app.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path] = IMAGES_CACHE_PATH,
+        ttl: float = IMAGE_TTL_S,
+        missing_ttl: float = MISSING_TTL_S,
+        error_ttl: float = ERROR_TTL_S,
+    ) -> None:
+        """
+        Abre (o crea) la caché.
+
+        Args:
+            path (Union[str, Path]): Ruta del archivo SQLite.
+            ttl (float): Vigencia en segundos de las imágenes encontradas.
+            missing_ttl (float): Vigencia de los anuncios sin imagen.
+            error_ttl (float): Vigencia de los errores de red.
+        """
+        self.path: Path = Path(path)
+        self.ttls: Dict[str, float] = {"ok": ttl, "missing": missing_ttl, "error": error_ttl}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with sqlite3.connect(self.path) as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS listing_images (
+                    url TEXT PRIMARY KEY,
+                    image_url TEXT,
+                    status TEXT,
+                    expires_at REAL
+                )
+                """
+            )
+
+    def get_many(self, urls: Sequence[str]) -> Dict[str, Tuple[Optional[str], str]]:
+        """
+        Resultados vigentes de varias URLs.
+
+        Args:
+            urls (Sequence[str]): URLs de anuncios.
+
+        Returns:
+            Dict[str, Tuple[Optional[str], str]]: url -> (imagen o None, estado) sólo para las
+                URLs con un resultado vigente.
+        """
+        found = {}
+        now = time.time()
+        with sqlite3.connect(self.path) as conn:
+            for start in range(0, len(urls), 500):
+                chunk = list(urls[start:start + 500])
+                rows = conn.execute(
+                    "SELECT url, image_url, status FROM listing_images "
+                    f"WHERE expires_at > ? AND url IN ({', '.join('?' * len(chunk))})",
+                    [now, *chunk],
+                ).fetchall()
+                found.update({url: (image, status) for url, image, status in rows})
+        return found
+
+    def put_many(self, results: Dict[str, Tuple[Optional[str], str]]) -> None:
+        """
+        Guarda (o reemplaza) resultados url -> (imagen o None, estado), con la vigencia de su
+        estado ("ok", "missing" o "error").
+        """
+        now = time.time()
+        with sqlite3.connect(self.path) as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO listing_images VALUES (?, ?, ?, ?)",
+                [
+                    (url, image, status, now + self.ttls[status])
+                    for url, (image, status) in results.items()
+                ],
+            )
+
+    def purge_expired(self) -> int:
+        """
+        Elimina los resultados vencidos y devuelve cuántos se borraron.
+        """
+        with sqlite3.connect(self.path) as conn:
+            return conn.execute(
+                "DELETE FROM listing_images WHERE expires_at <= ?", (time.time(),)
+            ).rowcount
+
+
+def read_head(response: requests.Response, max_bytes: int = MAX_HEAD_BYTES) -> bytes:
+    """
+    Lee una respuesta en streaming sólo hasta el cierre de </head> (o max_bytes).
+
+    Con urllib3 >= 2 se usa read1, que devuelve lo que ya llegó sin esperar a juntar un bloque
+    completo; el resto del documento nunca se descarga. Al leer de response.raw, los errores de
+    lectura llegan como excepciones de urllib3 (ReadTimeoutError, ProtocolError) y no como
+    requests.RequestException.
+    """
+    raw = response.raw
+    if hasattr(raw, "read1"):
+        chunks = iter(lambda: raw.read1(16 * 1024, decode_content=True), b"")
+    else:
+        chunks = response.iter_content(chunk_size=1024)
+
+    content = b""
+    for chunk in chunks:
+        # Se busca también en el final del bloque anterior por si la etiqueta quedó partida
+        tail = max(0, len(content) - 6)
+        content += chunk
+        end = content[tail:].lower().find(b"</head>")
+        if end >= 0:
+            return content[:tail + end + 7]
+        if len(content) >= max_bytes:
+            break
+    return content
+
+
+def parse_og_image(html: Union[str, bytes]) -> Optional[str]:
+    """
+    Extrae la meta og:image de un documento (o de su <head>); None si no hay.
+    """
+    soup = BeautifulSoup(html, "html.parser")
+    og_image = soup.find("meta", property="og:image")
+    if og_image and og_image.get("content") and og_image["content"].strip():
+        return og_image["content"].strip()
+    return None
+
+
+class ImageResolver:
+    """
+    Servicio que obtiene la imagen principal (meta og:image) de los anuncios.
+
+    Consulta en paralelo (pool de hilos) con una requests.Session compartida cuyo pool de
+    conexiones tiene un lugar por hilo, lee cada página sólo hasta </head> y guarda todos los
+    resultados, incluidos los negativos, en una ImageCache persistente. La sesión y la caché se
+    pueden inyectar (por ejemplo para probar contra un servidor HTTP local).
+    """
+
+    def __init__(
+        self,
+        cache: Optional[ImageCache] = None,
+        session: Optional[requests.Session] = None,
+        max_workers: int = 8,
+        timeout: float = 5.0,
+        default_image: str = DEFAULT_IMAGE,
+    ) -> None:
+        """
+        Args:
+            cache (Optional[ImageCache]): Caché de resultados (None para no usar caché).
+            session (Optional[requests.Session]): Sesión HTTP; por defecto una con un pool de
+                max_workers conexiones por host.
+            max_workers (int): Consultas simultáneas.
+            timeout (float): Timeout en segundos de conexión y de lectura de cada consulta.
+            default_image (str): Imagen para los anuncios sin og:image.
+        """
+        self.cache: Optional[ImageCache] = cache
+        self.max_workers: int = max_workers
+        self.timeout: float = timeout
+        self.default_image: str = default_image
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers.update(HEADERS)
+        self.session: requests.Session = session
+
+    def fetch(self, url: str) -> Tuple[Optional[str], str]:
+        """
+        Consulta un anuncio.
+
+        Args:
+            url (str): URL del anuncio.
+
+        Returns:
+            Tuple[Optional[str], str]: (imagen o None, estado "ok" / "missing" / "error"); un
+                timeout o una conexión cortada a media lectura cuentan como "error".
+        """
+        try:
+            with self.session.get(url, timeout=self.timeout, stream=True) as response:
+                if response.status_code != 200:
+                    return None, "missing"
+                image = parse_og_image(read_head(response))
+        except (requests.RequestException, urllib3.exceptions.HTTPError, OSError) as e:
+            logger.debug(f"Error fetching {url}: {e}")
+            return None, "error"
+        return (image, "ok") if image else (None, "missing")
+
+    def resolve_many(self, urls: Iterable[str]) -> Dict[str, str]:
+        """
+        Imagen principal de varios anuncios: toma los vigentes de la caché, consulta el resto
+        en paralelo y guarda sus resultados.
+
+        Args:
+            urls (Iterable[str]): URLs de anuncios (se ignoran vacías / no texto y repetidas).
+
+        Returns:
+            Dict[str, str]: url -> imagen (default_image si no tiene o hubo un error).
+        """
+        urls = list(dict.fromkeys(u for u in urls if isinstance(u, str) and u.strip()))
+        results = self.cache.get_many(urls) if self.cache is not None else {}
+        missing = [u for u in urls if u not in results]
+        if missing:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(missing))) as pool:
+                fetched = dict(zip(missing, pool.map(self.fetch, missing)))
+            if self.cache is not None:
+                self.cache.put_many(fetched)
+            results.update(fetched)
+        return {url: image or self.default_image for url, (image, _) in results.items()}
+
+    def resolve(self, url: str) -> str:
+        """
+        Imagen principal de un anuncio (default_image si no tiene o hubo un error).
+        """
+        return self.resolve_many([url]).get(url, self.default_image)
+
+    def images_for(self, urls: Sequence[str]) -> List[str]:
+        """
+        Imágenes de varios anuncios en el mismo orden de `urls` (con repetidos y vacíos).
+        """
+        resolved = self.resolve_many(urls)
+        return [resolved[u] if u in resolved else self.default_image for u in urls]
+
+
+@app.command()
+def prefetch(
+    input_path: Path = PROCESSED_DATA_DIR / "final_df.parquet",
+    cache_path: Path = IMAGES_CACHE_PATH,
+    max_workers: int = 16,
+    timeout: float = 5.0,
+    batch_size: int = 500,
+):
+    """
+    Warm the image cache for every listing in the processed dataset.
+
+    Only listings without a fresh cached result are fetched, so the job can be re-run (for
+    example daily) and resumes where an interrupted run stopped.
+    """
+    urls = extract_data(input_path, columns=["url_ad"])["url_ad"].dropna().unique().tolist()
+    cache = ImageCache(cache_path)
+    cache.purge_expired()
+    pending = [u for u in urls if u not in cache.get_many(urls)]
+    logger.info(f"{len(urls)} listings, {len(pending)} without a fresh cached image")
+
+    resolver = ImageResolver(cache, max_workers=max_workers, timeout=timeout)
+    for start in range(0, len(pending), batch_size):
+        resolver.resolve_many(pending[start:start + batch_size])
+        logger.info(f"{min(start + batch_size, len(pending))}/{len(pending)} fetched")
+
+    statuses: Dict[str, int] = {}
+    for _, status in cache.get_many(urls).values():
+        statuses[status] = statuses.get(status, 0) + 1
+    logger.success(f"Image cache warmed: {statuses}")
+
+
+if __name__ == "__main__":
+    app()
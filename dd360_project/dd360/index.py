@@ -0,0 +1,896 @@
+from collections import OrderedDict
+import json
+from pathlib import Path
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+import warnings
+
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+from sklearn.neighbors import BallTree, KDTree
+
+from dd360.geo import GeoGridIndex, geo_distances_km, haversine_km
+
+SCALINGS = ("standard", "minmax")
+
+# Backends de búsqueda de vecinos: fuerza bruta, árboles exactos y búsqueda aproximada.
+ALGORITHMS = ("brute", "kd_tree", "ball_tree", "approximate")
+
+# Número máximo de índices que se mantienen vivos en la caché de módulo.
+INDEX_CACHE_SIZE = 32
+
+# Búsquedas por lotes: candidatos extra por fila que se recalculan con la distancia exacta y
+# memoria aproximada (bytes) de cada bloque de la matriz de distancias.
+BATCH_SLACK = 16
+BATCH_BLOCK_BYTES = 64 * 2**20
+
+_INDEX_CACHE: "OrderedDict[Tuple, Any]" = OrderedDict()
+# Protege la caché de módulo: la API la consulta desde varios hilos a la vez
+_INDEX_CACHE_LOCK = threading.Lock()
+
+
+def fit_scaling(X: np.ndarray, scaling: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Calcula los parámetros de escalado equivalentes a StandardScaler / MinMaxScaler de sklearn,
+    ignorando NaNs igual que sklearn.
+
+    Args:
+        X (np.ndarray): Matriz (filas x features) sin escalar.
+        scaling (str): "standard" o "minmax".
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: (offset, scale) tales que X_scaled = (X - offset) * scale.
+    """
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        if scaling == "standard":
+            offset = np.nanmean(X, axis=0)
+            spread = np.nanstd(X, axis=0)
+        elif scaling == "minmax":
+            offset = np.nanmin(X, axis=0)
+            spread = np.nanmax(X, axis=0) - offset
+        else:
+            raise ValueError(f"Escalado no soportado: {scaling}. Usa uno de {SCALINGS}.")
+
+    # Igual que sklearn: las columnas constantes no se escalan
+    spread = np.where(spread < 10 * np.finfo(np.float64).eps, 1.0, spread)
+    return offset, 1.0 / spread
+
+
+def top_k_positions(
+    scores: np.ndarray, n: int, tiebreak: Optional[Sequence[np.ndarray]] = None
+) -> np.ndarray:
+    """
+    Devuelve las posiciones de los n puntajes más pequeños, ordenadas de menor a mayor.
+
+    Usa argpartition en lugar de un ordenamiento completo. Los empates se resuelven con las llaves
+    de tiebreak (en orden de prioridad) y después por posición, como un ordenamiento estable;
+    los NaN quedan al final, igual que sort_values.
+
+    Args:
+        scores (np.ndarray): Vector de puntajes (distancias).
+        n (int): Número de posiciones a devolver.
+        tiebreak (Optional[Sequence[np.ndarray]]): Llaves secundarias para desempatar.
+
+    Returns:
+        np.ndarray: Posiciones de los n menores puntajes.
+    """
+    scores = np.where(np.isnan(scores), np.inf, scores)
+    if n <= 0:
+        return np.empty(0, dtype=np.intp)
+
+    if n >= len(scores):
+        candidates = np.arange(len(scores))
+    else:
+        kth = np.partition(scores, n - 1)[n - 1]
+        candidates = np.flatnonzero(scores <= kth)
+
+    keys = [candidates] + [k[candidates] for k in reversed(tiebreak or ())] + [scores[candidates]]
+    order = np.lexsort(keys)
+    return candidates[order[:n]]
+
+
+def _block_rows(n_candidates: int, block_size: Optional[int], n_arrays: int = 1) -> int:
+    """
+    Número de filas de consulta por bloque para que la matriz de distancias quepa en
+    BATCH_BLOCK_BYTES (o block_size si se indica).
+    """
+    if block_size:
+        return block_size
+    return max(1, BATCH_BLOCK_BYTES // max(1, n_candidates * 8 * n_arrays))
+
+
+def _shortlist(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Índices (por fila, sin ordenar) de los k menores puntajes de una matriz; NaN al final.
+    """
+    scores = np.where(np.isnan(scores), np.inf, scores)
+    if k >= scores.shape[1]:
+        return np.tile(np.arange(scores.shape[1]), (scores.shape[0], 1))
+    return np.argpartition(scores, k - 1, axis=1)[:, :k]
+
+
+def _rank_rows(scores: np.ndarray, n: int, tiebreak: Sequence[np.ndarray]) -> np.ndarray:
+    """
+    Orden (por fila) de los n menores puntajes, desempatando con tiebreak; NaN al final.
+    """
+    keys = list(reversed(tiebreak)) + [np.where(np.isnan(scores), np.inf, scores)]
+    return np.lexsort(keys, axis=-1)[:, :n]
+
+
+def numeric_features(input_dict: Dict[str, Any], non_numeric_keys: Sequence[str]) -> List[str]:
+    """
+    Obtiene las features numéricas de input_dict (en su orden) excluyendo las llaves indicadas.
+    """
+    return [k for k in input_dict.keys() if k not in non_numeric_keys]
+
+
+class _LocatedIndex:
+    """
+    Base de los índices: resuelve la ubicación de una consulta y mantiene una malla espacial
+    (GeoGridIndex) sobre las filas indexadas, construida al primer uso de max_radius_km.
+    """
+
+    def __init__(self, df: pd.DataFrame, rows: np.ndarray, cell_km: float = 0.5) -> None:
+        """
+        Args:
+            df (pd.DataFrame): DataFrame de origen.
+            rows (np.ndarray): Posiciones de df cubiertas por el índice.
+            cell_km (float): Tamaño de celda de la malla espacial en kilómetros.
+        """
+        self.source: pd.DataFrame = df
+        self.rows: np.ndarray = rows
+        self.cell_km: float = cell_km
+        self._coords: Optional[np.ndarray] = None
+        self._grid: Optional[GeoGridIndex] = None
+        self._centroids: Optional[pd.DataFrame] = None
+
+    @property
+    def coords(self) -> np.ndarray:
+        """Matriz (filas x 2) con latitud y longitud de las filas indexadas (al primer uso)."""
+        if self._coords is None:
+            coords = self.source[["latitude", "longitude"]].to_numpy(dtype=np.float64)
+            self._coords = np.ascontiguousarray(coords[self.rows])
+        return self._coords
+
+    @property
+    def grid(self) -> GeoGridIndex:
+        """Malla espacial sobre las filas indexadas, construida al primer uso."""
+        if self._grid is None:
+            self._grid = GeoGridIndex(self.coords[:, 0], self.coords[:, 1], cell_km=self.cell_km)
+        return self._grid
+
+    def centroid(self, neighborhood: Any) -> Tuple[float, float]:
+        """
+        Devuelve la latitud y longitud promedio de un barrio (NaN si no existe).
+        """
+        if self._centroids is None:
+            self._centroids = self.source.groupby("neighborhood", observed=True)[
+                ["latitude", "longitude"]
+            ].mean()
+        if neighborhood not in self._centroids.index:
+            return np.nan, np.nan
+        lat, lon = self._centroids.loc[neighborhood]
+        return lat, lon
+
+    def location(self, input_dict: Dict[str, Any]) -> Tuple[float, float]:
+        """
+        Ubicación de la consulta: 'latitude'/'longitude' de input_dict o, si faltan,
+        el centroide de su 'neighborhood'.
+
+        Raises:
+            ValueError: Si input_dict no tiene coordenadas ni barrio.
+        """
+        if "latitude" in input_dict and "longitude" in input_dict:
+            return float(input_dict["latitude"]), float(input_dict["longitude"])
+        if "neighborhood" in input_dict:
+            return self.centroid(input_dict["neighborhood"])
+        raise ValueError(
+            "input_dict debe contener 'latitude' y 'longitude' o 'neighborhood' para usar max_radius_km"
+        )
+
+    def within_radius(self, input_dict: Dict[str, Any], max_radius_km: float) -> np.ndarray:
+        """
+        Posiciones (en el índice) de las filas a lo más a max_radius_km de la consulta.
+        """
+        lat, lon = self.location(input_dict)
+        return self.grid.query_radius(lat, lon, max_radius_km)
+
+
+class SimilarityIndex(_LocatedIndex):
+    """
+    Índice de similitud con escalado global construido una sola vez por
+    (DataFrame, conjunto de features, tipo de escalado).
+
+    Guarda la matriz de features escalada como un arreglo float64 contiguo, de forma que cada
+    consulta sólo escala el vector de entrada y calcula distancias Euclidianas.
+
+    La búsqueda de vecinos se puede hacer por fuerza bruta o con un árbol (KD-tree, ball-tree o
+    KD-tree aproximado) que se construye sobre la misma matriz la primera vez que se usa.
+    """
+
+    def __init__(
+        self,
+        df: pd.DataFrame,
+        features: Sequence[str],
+        scaling: str = "standard",
+        leaf_size: int = 40,
+        approx_eps: float = 0.5,
+    ) -> None:
+        """
+        Construye el índice.
+
+        Args:
+            df (pd.DataFrame): DataFrame con 'property_id' y las features numéricas.
+            features (Sequence[str]): Columnas numéricas a comparar.
+            scaling (str): "standard" (StandardScaler) o "minmax" (MinMaxScaler).
+            leaf_size (int): Tamaño de hoja de los árboles.
+            approx_eps (float): Tolerancia del modo aproximado: cada vecino devuelto está a lo más
+                a (1 + approx_eps) veces la distancia del verdadero k-ésimo vecino.
+        """
+        self.features: List[str] = list(features)
+        self.scaling: str = scaling
+        self.leaf_size: int = leaf_size
+        self.approx_eps: float = approx_eps
+        self._trees: Dict[str, Any] = {}
+
+        columns = ["property_id"] + self.features
+        super().__init__(df, np.flatnonzero(df[columns].notna().all(axis=1).to_numpy()))
+        self.frame: pd.DataFrame = df[columns].iloc[self.rows]
+        if self.frame.empty:
+            raise ValueError("No hay filas sin valores nulos para las features solicitadas.")
+
+        X = self.frame[self.features].to_numpy(dtype=np.float64)
+        self.offset_, self.scale_ = fit_scaling(X, scaling)
+        self.X: np.ndarray = np.ascontiguousarray((X - self.offset_) * self.scale_)
+
+    def __len__(self) -> int:
+        return len(self.X)
+
+    def transform(self, input_dict: Dict[str, Any]) -> np.ndarray:
+        """
+        Escala el vector de entrada con los parámetros aprendidos.
+
+        Args:
+            input_dict (Dict[str, Any]): Características de la propiedad de entrada.
+
+        Returns:
+            np.ndarray: Vector de entrada escalado.
+        """
+        vec = np.array([input_dict[f] for f in self.features], dtype=np.float64)
+        return (vec - self.offset_) * self.scale_
+
+    def distances(self, input_dict: Dict[str, Any]) -> np.ndarray:
+        """
+        Calcula la distancia Euclidiana (en el espacio escalado) contra todas las filas del índice.
+        """
+        diff = self.X - self.transform(input_dict)
+        return np.sqrt(np.einsum("ij,ij->i", diff, diff))
+
+    def tree(self, algorithm: str) -> Any:
+        """
+        Devuelve el árbol del backend indicado, construyéndolo la primera vez.
+
+        Args:
+            algorithm (str): "kd_tree", "ball_tree" o "approximate".
+
+        Returns:
+            Any: KDTree / BallTree de sklearn o cKDTree de scipy (modo aproximado).
+        """
+        if algorithm not in self._trees:
+            if algorithm == "kd_tree":
+                self._trees[algorithm] = KDTree(self.X, leaf_size=self.leaf_size)
+            elif algorithm == "ball_tree":
+                self._trees[algorithm] = BallTree(self.X, leaf_size=self.leaf_size)
+            elif algorithm == "approximate":
+                self._trees[algorithm] = cKDTree(self.X, leafsize=self.leaf_size)
+            else:
+                raise ValueError(f"Algoritmo no soportado: {algorithm}. Usa uno de {ALGORITHMS}.")
+        return self._trees[algorithm]
+
+    def search(
+        self,
+        input_dict: Dict[str, Any],
+        n: int = 5,
+        algorithm: str = "brute",
+        max_radius_km: Optional[float] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Busca los n vecinos más cercanos con el backend indicado.
+
+        Args:
+            input_dict (Dict[str, Any]): Características de la propiedad de entrada.
+            n (int): Número de vecinos.
+            algorithm (str): Uno de ALGORITHMS.
+            max_radius_km (Optional[float]): Si se indica, sólo se consideran las propiedades a lo
+                más a esa distancia (malla espacial) y las distancias se calculan sólo sobre ellas;
+                en ese caso la búsqueda es por fuerza bruta sobre los candidatos.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Posiciones (en self.frame) y distancias, de menor a mayor.
+        """
+        if max_radius_km is not None:
+            candidates = self.within_radius(input_dict, max_radius_km)
+            diff = self.X[candidates] - self.transform(input_dict)
+            distances = np.sqrt(np.einsum("ij,ij->i", diff, diff))
+            top = top_k_positions(distances, n)
+            return candidates[top], distances[top]
+
+        if algorithm == "brute":
+            distances = self.distances(input_dict)
+            top = top_k_positions(distances, n)
+            return top, distances[top]
+
+        k = min(n, len(self.X))
+        if k <= 0:
+            return np.empty(0, dtype=np.intp), np.empty(0)
+
+        vec = self.transform(input_dict)
+        tree = self.tree(algorithm)
+        if algorithm == "approximate":
+            distances, positions = tree.query(vec, k=k, eps=self.approx_eps)
+            return np.atleast_1d(positions), np.atleast_1d(distances)
+
+        distances, positions = tree.query(vec.reshape(1, -1), k=k)
+        return positions[0], distances[0]
+
+    def search_batch(
+        self, Q: np.ndarray, n: int = 5, block_size: Optional[int] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Busca los n vecinos de muchas consultas a la vez con operaciones matriciales por bloques.
+
+        Cada bloque calcula ||x||^2 + ||q||^2 - 2 q x^T (BLAS) para preseleccionar candidatos y
+        recalcula la distancia exacta sólo para ellos, así los puntajes son los mismos que query().
+
+        Args:
+            Q (np.ndarray): Matriz (consultas x features) sin escalar, en el orden de self.features.
+            n (int): Número de vecinos por consulta.
+            block_size (Optional[int]): Consultas por bloque; por defecto se limita la memoria
+                del bloque a BATCH_BLOCK_BYTES.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Posiciones (en self.frame) y distancias, ambas de
+            tamaño (consultas x min(n, filas)); las consultas con valores nulos quedan en -1 / NaN.
+        """
+        Qs = (np.asarray(Q, dtype=np.float64) - self.offset_) * self.scale_
+        k = max(min(n, len(self.X)), 0)
+        positions = np.full((len(Qs), k), -1, dtype=np.intp)
+        distances = np.full((len(Qs), k), np.nan)
+        if k == 0:
+            return positions, distances
+
+        valid = np.flatnonzero(~np.isnan(Qs).any(axis=1))
+        x_sq = np.einsum("ij,ij->i", self.X, self.X)
+        short_k = min(len(self.X), k + BATCH_SLACK)
+        step = _block_rows(len(self.X), block_size, n_arrays=3)
+
+        for start in range(0, len(valid), step):
+            rows = valid[start:start + step]
+            q = Qs[rows]
+            d2 = q @ self.X.T
+            d2 *= -2.0
+            d2 += x_sq[None, :]
+            d2 += np.einsum("ij,ij->i", q, q)[:, None]
+            idx = _shortlist(d2, short_k)
+
+            diff = self.X[idx] - q[:, None, :]
+            exact = np.sqrt(np.einsum("ijk,ijk->ij", diff, diff))
+            order = _rank_rows(exact, k, [idx])
+            positions[rows] = np.take_along_axis(idx, order, axis=1)
+            distances[rows] = np.take_along_axis(exact, order, axis=1)
+
+        return positions, distances
+
+    def query(
+        self,
+        input_dict: Dict[str, Any],
+        n: int = 5,
+        algorithm: str = "brute",
+        max_radius_km: Optional[float] = None,
+    ) -> pd.DataFrame:
+        """
+        Devuelve las n propiedades más cercanas a input_dict.
+
+        Args:
+            input_dict (Dict[str, Any]): Características de la propiedad de entrada.
+            n (int): Número de propiedades a devolver.
+            algorithm (str): Backend de búsqueda de vecinos (ver ALGORITHMS). Todos devuelven la
+                misma distancia Euclidiana como 'similarity_score'.
+            max_radius_km (Optional[float]): Radio máximo (km) para considerar candidatos.
+
+        Returns:
+            pd.DataFrame: Columnas 'property_id', features y 'similarity_score', ordenado por similitud.
+        """
+        positions, distances = self.search(input_dict, n, algorithm, max_radius_km)
+        return self.frame.iloc[positions].assign(similarity_score=distances)
+
+
+class HierarchicalIndex(_LocatedIndex):
+    """
+    Índice para la búsqueda jerárquica por barrio y tipo de propiedad.
+
+    Al construirse codifica 'neighborhood' y 'property_type' como códigos categóricos, ordena las
+    filas por (tipo, barrio) y precalcula el mínimo y máximo de cada feature por grupo. Así cada
+    nivel de la jerarquía es un conjunto de rangos contiguos de grupos: su escalado MinMax sale de
+    los estadísticos por grupo y todos los niveles necesarios se puntúan en una sola pasada
+    vectorizada, sin copiar el DataFrame ni construir máscaras sobre todas las filas.
+    """
+
+    # Arreglos que definen el índice (lo que save / load escriben y leen como .npy)
+    ARRAYS = (
+        "X", "neigh_codes", "type_codes", "order",
+        "group_keys", "group_starts", "group_ends", "group_min", "group_max",
+    )
+
+    def __init__(self, df: pd.DataFrame, features: Sequence[str]) -> None:
+        """
+        Construye el índice.
+
+        Args:
+            df (pd.DataFrame): DataFrame con 'neighborhood', 'property_type' y las features numéricas.
+            features (Sequence[str]): Columnas numéricas a comparar.
+        """
+        super().__init__(df, np.arange(len(df)))
+        self.features: List[str] = list(features)
+        self.X: np.ndarray = np.ascontiguousarray(df[self.features].to_numpy(dtype=np.float64))
+
+        # Códigos categóricos desplazados en 1: el código 0 agrupa los valores nulos
+        self.neigh_codes, self._neigh_lookup = _category_codes(df["neighborhood"])
+        self.type_codes, self._type_lookup = _category_codes(df["property_type"])
+        self.n_neigh: int = len(self._neigh_lookup) + 1
+
+        keys = self.type_codes * self.n_neigh + self.neigh_codes
+        self.order: np.ndarray = np.argsort(keys, kind="stable")
+        self.group_keys, group_starts, group_sizes = np.unique(
+            keys[self.order], return_index=True, return_counts=True
+        )
+        self.group_starts: np.ndarray = group_starts
+        self.group_ends: np.ndarray = group_starts + group_sizes
+
+        if len(self.group_keys):
+            X_sorted = self.X[self.order]
+            self.group_min: np.ndarray = np.fmin.reduceat(X_sorted, group_starts, axis=0)
+            self.group_max: np.ndarray = np.fmax.reduceat(X_sorted, group_starts, axis=0)
+        else:
+            self.group_min = self.group_max = np.empty((0, len(self.features)))
+
+    def __len__(self) -> int:
+        return len(self.X)
+
+    def save(self, directory: Union[str, Path]) -> None:
+        """
+        Guarda el índice en un directorio: un .npy por arreglo más index.json con las features
+        y los valores de 'neighborhood' / 'property_type' en el orden de sus códigos.
+
+        Args:
+            directory (Union[str, Path]): Directorio de destino (se crea si no existe).
+        """
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        for name in self.ARRAYS:
+            np.save(directory / f"{name}.npy", getattr(self, name))
+        meta = {
+            "features": self.features,
+            "neighborhoods": _json_values(self._neigh_lookup),
+            "property_types": _json_values(self._type_lookup),
+        }
+        (directory / "index.json").write_text(json.dumps(meta, ensure_ascii=False))
+
+    @classmethod
+    def load(
+        cls, directory: Union[str, Path], df: pd.DataFrame, mmap: bool = True
+    ) -> "HierarchicalIndex":
+        """
+        Carga un índice guardado con save sin recalcularlo.
+
+        Args:
+            directory (Union[str, Path]): Directorio escrito por save.
+            df (pd.DataFrame): El mismo DataFrame (mismas filas y orden) con el que se construyó.
+            mmap (bool): Si es True los arreglos se mapean en memoria (sólo lectura), de modo que
+                la carga no lee los datos y varios procesos comparten las mismas páginas.
+
+        Returns:
+            HierarchicalIndex: Índice listo para consultas.
+        """
+        directory = Path(directory)
+        meta = json.loads((directory / "index.json").read_text())
+        index = cls.__new__(cls)
+        _LocatedIndex.__init__(index, df, np.arange(len(df)))
+        index.features = list(meta["features"])
+        mmap_mode = "r" if mmap else None
+        for name in cls.ARRAYS:
+            setattr(index, name, np.load(directory / f"{name}.npy", mmap_mode=mmap_mode))
+        if len(index.X) != len(df):
+            raise ValueError(f"El índice en {directory} no corresponde al DataFrame recibido.")
+        index._neigh_lookup = {v: i + 1 for i, v in enumerate(meta["neighborhoods"])}
+        index._type_lookup = {v: i + 1 for i, v in enumerate(meta["property_types"])}
+        index.n_neigh = len(index._neigh_lookup) + 1
+        return index
+
+    def _group_ranges(
+        self, neighborhood: Any, prop_type: Any, nested: bool
+    ) -> List[List[Tuple[int, int]]]:
+        """
+        Rangos [inicio, fin) de grupos que forman cada nivel de la jerarquía.
+        """
+        n_groups = len(self.group_keys)
+        t_code = _lookup(self._type_lookup, prop_type)
+        n_code = _lookup(self._neigh_lookup, neighborhood)
+
+        t_lo = t_hi = 0
+        if t_code > 0:
+            t_lo = int(np.searchsorted(self.group_keys, t_code * self.n_neigh, side="left"))
+            t_hi = int(np.searchsorted(self.group_keys, (t_code + 1) * self.n_neigh, side="left"))
+
+        g = -1
+        if t_code > 0 and n_code > 0:
+            pos = int(np.searchsorted(self.group_keys, t_code * self.n_neigh + n_code))
+            if pos < n_groups and self.group_keys[pos] == t_code * self.n_neigh + n_code:
+                g = pos
+
+        first = [(g, g + 1)] if g >= 0 else []
+        if nested or g < 0:
+            second = [(t_lo, t_hi)]
+        else:
+            second = [(t_lo, g), (g + 1, t_hi)]
+        third = [(0, t_lo), (t_hi, n_groups)]
+        return [[(lo, hi) for lo, hi in tier if hi > lo] for tier in (first, second, third)]
+
+    def _select_tiers(
+        self,
+        neighborhood: Any,
+        prop_type: Any,
+        n: int,
+        nested: bool = False,
+        candidates: Optional[np.ndarray] = None,
+    ) -> List[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        """
+        Elige los niveles necesarios para juntar al menos n candidatos (saltando los vacíos) y
+        devuelve, para cada uno, sus posiciones y su escalado MinMax (offset, scale).
+
+        Args:
+            neighborhood (Any): Barrio de la propiedad de entrada.
+            prop_type (Any): Tipo de la propiedad de entrada.
+            n (int): Número de propiedades a devolver.
+            nested (bool): Si es True, el segundo nivel incluye también el mismo barrio
+                (comportamiento de get_similars_combined_geo).
+            candidates (Optional[np.ndarray]): Si se indica, sólo se consideran esas posiciones
+                y el escalado se ajusta sobre ellas.
+
+        Returns:
+            List[Tuple[np.ndarray, np.ndarray, np.ndarray]]: (posiciones, offset, scale) por nivel.
+        """
+        selected = []
+        total = 0
+
+        if candidates is None:
+            for ranges in self._group_ranges(neighborhood, prop_type, nested):
+                if not ranges:
+                    continue
+                positions = np.concatenate([
+                    self.order[self.group_starts[lo]:self.group_ends[hi - 1]] for lo, hi in ranges
+                ])
+                data_min = np.fmin.reduce(np.concatenate([self.group_min[a:b] for a, b in ranges]))
+                data_max = np.fmax.reduce(np.concatenate([self.group_max[a:b] for a, b in ranges]))
+                spread = data_max - data_min
+                spread = np.where(spread < 10 * np.finfo(np.float64).eps, 1.0, spread)
+                selected.append((positions, data_min, 1.0 / spread))
+                total += len(positions)
+                if total >= n:
+                    break
+            return selected
+
+        same_neigh = self.neigh_codes[candidates] == _lookup(self._neigh_lookup, neighborhood)
+        same_type = self.type_codes[candidates] == _lookup(self._type_lookup, prop_type)
+        second = same_type if nested else ~same_neigh & same_type
+        for mask in (same_neigh & same_type, second, ~same_type):
+            positions = candidates[mask]
+            if len(positions) == 0:
+                continue
+            offset, scale = fit_scaling(self.X[positions], "minmax")
+            selected.append((positions, offset, scale))
+            total += len(positions)
+            if total >= n:
+                break
+        return selected
+
+    def query(
+        self,
+        input_dict: Dict[str, Any],
+        n: int = 5,
+        geo: bool = False,
+        geo_weight: float = 0.5,
+        geo_method: str = "haversine",
+        max_radius_km: Optional[float] = None,
+    ) -> pd.DataFrame:
+        """
+        Devuelve las n propiedades más similares (ver search).
+
+        Returns:
+            pd.DataFrame: Filas del DataFrame original más 'similarity_score'.
+        """
+        positions, scores = self.search(input_dict, n, geo, geo_weight, geo_method, max_radius_km)
+        return self.source.iloc[positions].assign(similarity_score=scores)
+
+    def search(
+        self,
+        input_dict: Dict[str, Any],
+        n: int = 5,
+        geo: bool = False,
+        geo_weight: float = 0.5,
+        geo_method: str = "haversine",
+        max_radius_km: Optional[float] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Busca las n propiedades más similares recorriendo los niveles de la jerarquía.
+
+        Se agregan niveles hasta juntar al menos n candidatos; cada nivel se escala con MinMax
+        sobre sus propios candidatos y el resultado final se ordena por 'similarity_score'
+        (los empates se resuelven por nivel y luego por posición, como el ordenamiento original).
+
+        Args:
+            input_dict (Dict[str, Any]): Características de la propiedad de entrada.
+            n (int): Número de propiedades a devolver.
+            geo (bool): Si es True combina la distancia numérica con la distancia geográfica
+                (requiere 'latitude' y 'longitude' en input_dict).
+            geo_weight (float): Peso de la distancia geográfica normalizada en el puntaje.
+            geo_method (str): "haversine" (vectorizado, error < 0.5%) o "geodesic" (exacto, lento).
+            max_radius_km (Optional[float]): Si se indica, sólo se consideran las propiedades a lo
+                más a esa distancia; la poda se hace con la malla espacial antes de escalar.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Posiciones (en el DataFrame original) y
+            'similarity_score', de más a menos similar.
+        """
+        target = np.array([input_dict[f] for f in self.features], dtype=np.float64)
+        candidates = None
+        if max_radius_km is not None:
+            candidates = self.within_radius(input_dict, max_radius_km)
+        tiers = self._select_tiers(
+            input_dict.get("neighborhood"),
+            input_dict.get("property_type"),
+            n,
+            nested=geo,
+            candidates=candidates,
+        )
+        if not tiers:
+            return np.empty(0, dtype=np.intp), np.empty(0)
+
+        positions = np.concatenate([t[0] for t in tiers])
+        sizes = np.array([len(t[0]) for t in tiers])
+        labels = np.repeat(np.arange(len(tiers)), sizes)
+        scales = np.stack([t[2] for t in tiers])
+
+        # (x - min) * scale - (target - min) * scale == (x - target) * scale
+        diff = (self.X[positions] - target) * scales[labels]
+        scores = np.sqrt(np.einsum("ij,ij->i", diff, diff))
+
+        if geo:
+            coords = self.coords[positions]
+            geo_distances = geo_distances_km(
+                input_dict["latitude"], input_dict["longitude"],
+                coords[:, 0], coords[:, 1], method=geo_method,
+            )
+            starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+            with np.errstate(divide="ignore", invalid="ignore"):
+                geo_norm = geo_distances / np.fmax.reduceat(geo_distances, starts)[labels]
+            scores = (1 - geo_weight) * scores + geo_weight * geo_norm
+
+        top = top_k_positions(scores, n, tiebreak=(labels, positions))
+        return positions[top], scores[top]
+
+    def search_batch(
+        self,
+        subjects: pd.DataFrame,
+        n: int = 5,
+        geo: bool = False,
+        geo_weight: float = 0.5,
+        geo_method: str = "haversine",
+        block_size: Optional[int] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Búsqueda jerárquica para muchas propiedades a la vez.
+
+        Las consultas se agrupan por (barrio, tipo): todas las de un grupo comparten los mismos
+        niveles y el mismo escalado, así que cada nivel se puntúa con una multiplicación de
+        matrices por bloques. Los candidatos preseleccionados se recalculan con la distancia exacta,
+        por lo que los puntajes y el orden coinciden con query().
+
+        Args:
+            subjects (pd.DataFrame): Propiedades a consultar con las columnas de self.features,
+                'neighborhood' y 'property_type' (y 'latitude'/'longitude' si geo=True; si faltan
+                o son nulas se usa el centroide de su barrio).
+            n (int): Número de vecinos por consulta.
+            geo (bool): Si es True combina con la distancia geográfica (get_similars_combined_geo).
+            geo_weight (float): Peso de la distancia geográfica normalizada en el puntaje.
+            geo_method (str): "haversine" o "geodesic".
+            block_size (Optional[int]): Consultas por bloque; por defecto se limita la memoria
+                del bloque a BATCH_BLOCK_BYTES.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Posiciones (en el DataFrame del índice) y puntajes, de
+            tamaño (consultas x n), rellenados con -1 / NaN si hay menos de n candidatos.
+        """
+        Q = subjects[self.features].to_numpy(dtype=np.float64)
+        positions = np.full((len(subjects), max(n, 0)), -1, dtype=np.intp)
+        scores = np.full((len(subjects), max(n, 0)), np.nan)
+        if n <= 0 or len(subjects) == 0:
+            return positions, scores
+
+        if geo:
+            lat = _column_or_nan(subjects, "latitude")
+            lon = _column_or_nan(subjects, "longitude")
+            for i in np.flatnonzero(np.isnan(lat) | np.isnan(lon)):
+                lat[i], lon[i] = self.centroid(subjects["neighborhood"].iloc[i])
+
+        groups = subjects.groupby(
+            ["neighborhood", "property_type"], dropna=False, sort=False, observed=True
+        ).indices
+        for (neighborhood, prop_type), rows in groups.items():
+            tiers = self._select_tiers(neighborhood, prop_type, n, nested=geo)
+            if not tiers:
+                continue
+
+            P = np.concatenate([t[0] for t in tiers])
+            sizes = np.array([len(t[0]) for t in tiers])
+            starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+            labels = np.repeat(np.arange(len(tiers)), sizes)
+            scales = np.stack([t[2] for t in tiers])
+
+            X_scaled = self.X[P] * scales[labels]
+            x_sq = np.einsum("ij,ij->i", X_scaled, X_scaled)
+            k = min(n, len(P))
+            short_k = min(len(P), k + BATCH_SLACK)
+            step = _block_rows(len(P), block_size, n_arrays=5 if geo else 3)
+
+            for start in range(0, len(rows), step):
+                block = rows[start:start + step]
+                q = Q[block]
+                d2 = np.empty((len(block), len(P)))
+                for t, (lo, size) in enumerate(zip(starts, sizes)):
+                    q_scaled = q * scales[t]
+                    np.matmul(q_scaled, X_scaled[lo:lo + size].T, out=d2[:, lo:lo + size])
+                    d2[:, lo:lo + size] *= -2.0
+                    d2[:, lo:lo + size] += x_sq[lo:lo + size][None, :]
+                    d2[:, lo:lo + size] += np.einsum("ij,ij->i", q_scaled, q_scaled)[:, None]
+                approx = np.sqrt(np.maximum(d2, 0.0, out=d2), out=d2)
+
+                if geo:
+                    geo_norm = self._geo_norm_block(lat[block], lon[block], P, starts, labels, geo_method)
+                    approx = (1 - geo_weight) * approx + geo_weight * geo_norm
+
+                idx = _shortlist(approx, short_k)
+                diff = (self.X[P[idx]] - q[:, None, :]) * scales[labels[idx]]
+                exact = np.sqrt(np.einsum("ijk,ijk->ij", diff, diff))
+                if geo:
+                    exact = (1 - geo_weight) * exact + geo_weight * np.take_along_axis(geo_norm, idx, axis=1)
+
+                order = _rank_rows(exact, k, [labels[idx], P[idx]])
+                positions[block, :k] = P[np.take_along_axis(idx, order, axis=1)]
+                scores[block, :k] = np.take_along_axis(exact, order, axis=1)
+
+        return positions, scores
+
+    def _geo_norm_block(
+        self,
+        lat: np.ndarray,
+        lon: np.ndarray,
+        P: np.ndarray,
+        starts: np.ndarray,
+        labels: np.ndarray,
+        geo_method: str,
+    ) -> np.ndarray:
+        """
+        Distancia geográfica (consultas x candidatos) normalizada por el máximo de cada nivel.
+        """
+        coords = self.coords[P]
+        if geo_method == "haversine":
+            distances = haversine_km(lat[:, None], lon[:, None], coords[:, 0], coords[:, 1])
+        else:
+            distances = np.stack([
+                geo_distances_km(la, lo, coords[:, 0], coords[:, 1], method=geo_method)
+                for la, lo in zip(lat, lon)
+            ])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return distances / np.fmax.reduceat(distances, starts, axis=1)[:, labels]
+
+
+def _column_or_nan(df: pd.DataFrame, column: str) -> np.ndarray:
+    """
+    Copia de una columna como float64, o un arreglo de NaN si no existe.
+    """
+    if column not in df.columns:
+        return np.full(len(df), np.nan)
+    return df[column].to_numpy(dtype=np.float64, copy=True)
+
+
+def _category_codes(values: pd.Series) -> Tuple[np.ndarray, Dict[Any, int]]:
+    """
+    Codifica una columna categórica como enteros >= 1 (0 para nulos) y devuelve el diccionario
+    valor -> código usado para las consultas.
+    """
+    codes, uniques = pd.factorize(values)
+    return codes.astype(np.int64) + 1, {v: i + 1 for i, v in enumerate(uniques)}
+
+
+def _json_values(lookup: Dict[Any, int]) -> List[Any]:
+    """
+    Valores de un diccionario valor -> código en el orden de sus códigos, como tipos de Python.
+    """
+    return [v.item() if isinstance(v, np.generic) else v for v in lookup]
+
+
+def _lookup(lookup: Dict[Any, int], value: Any) -> int:
+    """
+    Código de un valor de consulta; -1 si no existe (no coincide con ninguna fila).
+    """
+    try:
+        return lookup.get(value, -1)
+    except TypeError:
+        return -1
+
+
+def _cached_index(cls: type, df: pd.DataFrame, features: Sequence[str], **params: Any) -> Any:
+    """
+    Obtiene un índice de la caché de módulo o lo construye si no existe.
+
+    La llave usa la identidad del DataFrame; el índice asume que el DataFrame no se modifica
+    in-place después de construirlo (usar clear_index_cache() en ese caso). La construcción
+    ocurre fuera del lock: dos hilos que piden el mismo índice nuevo pueden construirlo dos
+    veces, pero ninguno bloquea las consultas de los demás mientras tanto.
+    """
+    key = (cls.__name__, id(df), tuple(features), tuple(sorted(params.items())))
+    with _INDEX_CACHE_LOCK:
+        index = _INDEX_CACHE.get(key)
+        if index is not None and index.source is df:
+            _INDEX_CACHE.move_to_end(key)
+            return index
+
+    index = cls(df, features, **params)
+    _store_index(key, index)
+    return index
+
+
+def _store_index(key: Tuple, index: Any) -> None:
+    with _INDEX_CACHE_LOCK:
+        _INDEX_CACHE[key] = index
+        _INDEX_CACHE.move_to_end(key)
+        if len(_INDEX_CACHE) > INDEX_CACHE_SIZE:
+            _INDEX_CACHE.popitem(last=False)
+
+
+def register_index(index: Any, **params: Any) -> None:
+    """
+    Agrega a la caché de módulo un índice construido o cargado fuera de ella (por ejemplo con
+    HierarchicalIndex.load), de modo que las funciones de dd360.compare lo reutilicen para su
+    DataFrame y features.
+    """
+    features = tuple(index.features)
+    key = (type(index).__name__, id(index.source), features, tuple(sorted(params.items())))
+    _store_index(key, index)
+
+
+def get_similarity_index(
+    df: pd.DataFrame, features: Sequence[str], scaling: str = "standard"
+) -> SimilarityIndex:
+    """
+    Devuelve el SimilarityIndex para (df, features, scaling), construyéndolo sólo la primera vez.
+    """
+    return _cached_index(SimilarityIndex, df, features, scaling=scaling)
+
+
+def get_hierarchical_index(df: pd.DataFrame, features: Sequence[str]) -> HierarchicalIndex:
+    """
+    Devuelve el HierarchicalIndex para (df, features), construyéndolo sólo la primera vez.
+    """
+    return _cached_index(HierarchicalIndex, df, features)
+
+
+def clear_index_cache() -> None:
+    """
+    Elimina todos los índices en caché (por ejemplo, después de modificar un DataFrame in-place).
+    """
+    with _INDEX_CACHE_LOCK:
+        _INDEX_CACHE.clear()
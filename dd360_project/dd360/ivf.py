@@ -0,0 +1,373 @@
+from pathlib import Path
+import time
+from typing import Any, Dict, Optional, Sequence, Tuple, Union
+
+from loguru import logger
+import numpy as np
+import pandas as pd
+from sklearn.cluster import MiniBatchKMeans
+import typer
+
+from dd360.config import FEATURE_SETS, MODELS_DIR, PROCESSED_DATA_DIR
+from dd360.extract import extract_data
+from dd360.index import (
+    SimilarityIndex,
+    _cached_index,
+    _category_codes,
+    _lookup,
+    get_similarity_index,
+    top_k_positions,
+)
+
+# Columnas categóricas con las que se puede cruzar la búsqueda (niveles de la jerarquía)
+TIER_COLUMNS = ("neighborhood", "property_type")
+
+IVF_INDEX_PATH = MODELS_DIR / "ivf_index.npz"
+
+app = typer.Typer()
+
+
+def default_n_clusters(n_rows: int) -> int:
+    """
+    Número de listas por defecto: ~4·sqrt(n), la regla usual para que explorar unas pocas
+    listas revise una fracción pequeña de las filas.
+    """
+    return int(max(1, min(n_rows, round(4 * np.sqrt(n_rows)))))
+
+
+class IVFIndex:
+    """
+    Índice de archivo invertido (IVF) sobre las features escaladas de un SimilarityIndex.
+
+    Las filas se agrupan con MiniBatchKMeans (el mismo clustering de
+    FeatureSelectionPipeline.run_clustering) y se guardan contiguas por cluster. Una consulta
+    sólo calcula distancias exactas contra las filas de los nprobe clusters cuyo centroide está
+    más cerca, opcionalmente restringidas al mismo barrio / tipo de propiedad. Cambia una
+    fracción medida de recall (ver recall_report) por revisar ~nprobe / n_clusters de las filas.
+    """
+
+    def __init__(
+        self,
+        df: pd.DataFrame,
+        features: Sequence[str],
+        scaling: str = "minmax",
+        n_clusters: Optional[int] = None,
+        random_state: int = 42,
+        batch_size: int = 4096,
+    ) -> None:
+        """
+        Construye el índice.
+
+        Args:
+            df (pd.DataFrame): DataFrame con 'property_id' y las features numéricas.
+            features (Sequence[str]): Columnas numéricas a comparar.
+            scaling (str): "standard" o "minmax", como get_similars_euclidean_*.
+            n_clusters (Optional[int]): Número de listas (default_n_clusters por defecto).
+            random_state (int): Semilla de MiniBatchKMeans.
+            batch_size (int): Tamaño de lote de MiniBatchKMeans.
+        """
+        base = get_similarity_index(df, features, scaling=scaling)
+        n_clusters = min(n_clusters or default_n_clusters(len(base)), len(base))
+        kmeans = MiniBatchKMeans(
+            n_clusters=n_clusters, batch_size=batch_size, n_init=3, random_state=random_state
+        )
+        labels = kmeans.fit_predict(base.X)
+        self._setup(base, kmeans.cluster_centers_, labels)
+
+    def _setup(self, base: SimilarityIndex, centroids: np.ndarray, labels: np.ndarray) -> None:
+        self.base: SimilarityIndex = base
+        self.source: pd.DataFrame = base.source
+        self.features = base.features
+        self.scaling: str = base.scaling
+        self.centroids: np.ndarray = np.ascontiguousarray(centroids, dtype=np.float64)
+        self.labels: np.ndarray = np.asarray(labels, dtype=np.int64)
+
+        # Filas ordenadas por cluster: la lista c ocupa [list_starts[c], list_starts[c + 1])
+        self.order: np.ndarray = np.argsort(self.labels, kind="stable")
+        counts = np.bincount(self.labels, minlength=len(self.centroids))
+        self.list_starts: np.ndarray = np.concatenate([[0], np.cumsum(counts)])
+        self.X: np.ndarray = np.ascontiguousarray(base.X[self.order])
+
+        rows = base.source.iloc[base.rows[self.order]]
+        self._codes: Dict[str, Tuple[np.ndarray, Dict[Any, int]]] = {
+            col: _category_codes(rows[col]) for col in TIER_COLUMNS if col in rows.columns
+        }
+
+    def __len__(self) -> int:
+        return len(self.X)
+
+    @property
+    def n_clusters(self) -> int:
+        return len(self.centroids)
+
+    def _candidates(
+        self, q: np.ndarray, n: int, nprobe: int, same: Dict[str, Any]
+    ) -> np.ndarray:
+        """
+        Posiciones (en el orden por cluster) de las filas de los nprobe clusters más cercanos
+        que cumplen el filtro; si el filtro deja menos de n filas se siguen agregando clusters.
+        """
+        diff = self.centroids - q
+        probe = np.argsort(np.einsum("ij,ij->i", diff, diff), kind="stable")
+        filters = [
+            (self._codes[col][0], _lookup(self._codes[col][1], v)) for col, v in same.items()
+        ]
+
+        candidates = np.empty(0, dtype=np.intp)
+        done = 0
+        step = max(nprobe, 1)
+        while done < len(probe):
+            chunk = probe[done:done + step]
+            done += len(chunk)
+            idx = np.concatenate([
+                np.arange(self.list_starts[c], self.list_starts[c + 1]) for c in chunk
+            ])
+            for codes, code in filters:
+                idx = idx[codes[idx] == code]
+            candidates = np.concatenate([candidates, idx])
+            if len(candidates) >= n:
+                break
+            step *= 2
+        return candidates
+
+    def search(
+        self,
+        input_dict: Dict[str, Any],
+        n: int = 5,
+        nprobe: int = 8,
+        same: Optional[Sequence[str]] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Busca los n vecinos aproximados de una propiedad.
+
+        Args:
+            input_dict (Dict[str, Any]): Características de la propiedad de entrada.
+            n (int): Número de vecinos.
+            nprobe (int): Clusters a explorar (más clusters: más recall y más costo).
+            same (Optional[Sequence[str]]): Columnas de TIER_COLUMNS que deben coincidir con
+                input_dict, por ejemplo ("neighborhood", "property_type") para el primer nivel
+                de la búsqueda jerárquica.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Posiciones (en base.frame) y distancias, de menor a
+                mayor, igual que SimilarityIndex.search.
+        """
+        q = self.base.transform(input_dict)
+        filters = {col: input_dict.get(col) for col in (same or ())}
+        idx = self._candidates(q, n, nprobe, filters)
+        diff = self.X[idx] - q
+        distances = np.sqrt(np.einsum("ij,ij->i", diff, diff))
+        positions = self.order[idx]
+        # Desempate por posición original, como la búsqueda exacta
+        top = top_k_positions(distances, n, tiebreak=(positions,))
+        return positions[top], distances[top]
+
+    def query(
+        self,
+        input_dict: Dict[str, Any],
+        n: int = 5,
+        nprobe: int = 8,
+        same: Optional[Sequence[str]] = None,
+    ) -> pd.DataFrame:
+        """
+        Devuelve las n propiedades aproximadamente más cercanas (mismo formato que
+        get_similars_euclidean_*).
+        """
+        positions, distances = self.search(input_dict, n, nprobe, same)
+        return self.base.frame.iloc[positions].assign(similarity_score=distances)
+
+    def save(self, path: Union[str, Path] = IVF_INDEX_PATH) -> None:
+        """
+        Guarda los centroides y la asignación de cada fila (.npz). Al cargar sólo se reescala
+        la matriz; no se vuelve a correr el clustering.
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        np.savez(
+            path,
+            centroids=self.centroids,
+            labels=self.labels,
+            features=np.array(self.features),
+            scaling=np.array(self.scaling),
+            offset=self.base.offset_,
+            scale=self.base.scale_,
+        )
+
+    @classmethod
+    def load(cls, df: pd.DataFrame, path: Union[str, Path] = IVF_INDEX_PATH) -> "IVFIndex":
+        """
+        Carga un índice guardado con save para el mismo DataFrame.
+
+        Raises:
+            ValueError: Si el DataFrame no es el del índice (otro número de filas o escalado).
+        """
+        with np.load(path) as data:
+            features = data["features"].tolist()
+            base = get_similarity_index(df, features, scaling=str(data["scaling"]))
+            same_scaling = np.allclose(base.offset_, data["offset"]) and np.allclose(
+                base.scale_, data["scale"]
+            )
+            if len(data["labels"]) != len(base) or not same_scaling:
+                raise ValueError(f"El índice {path} no corresponde al DataFrame recibido.")
+            index = cls.__new__(cls)
+            index._setup(base, data["centroids"], data["labels"])
+        return index
+
+
+def get_ivf_index(
+    df: pd.DataFrame,
+    features: Sequence[str],
+    scaling: str = "minmax",
+    n_clusters: Optional[int] = None,
+) -> IVFIndex:
+    """
+    Devuelve el IVFIndex para (df, features, scaling, n_clusters), construyéndolo sólo la
+    primera vez (caché de dd360.index).
+    """
+    return _cached_index(IVFIndex, df, features, scaling=scaling, n_clusters=n_clusters)
+
+
+def get_similars_ivf(
+    df: pd.DataFrame,
+    input_dict: Dict[str, Any],
+    n: int = 5,
+    nprobe: int = 8,
+    scaling: str = "minmax",
+    same: Optional[Sequence[str]] = None,
+) -> pd.DataFrame:
+    """
+    Versión aproximada de get_similars_euclidean_{scaling}: sólo revisa los nprobe clusters más
+    cercanos (opcionalmente del mismo barrio / tipo, ver IVFIndex.search).
+
+    Args:
+        df (pd.DataFrame): DataFrame con datos de propiedades.
+        input_dict (Dict[str, Any]): Características de la propiedad de entrada.
+        n (int): Número de propiedades similares a devolver.
+        nprobe (int): Clusters a explorar.
+        scaling (str): "minmax" o "standard".
+        same (Optional[Sequence[str]]): Columnas categóricas que deben coincidir.
+
+    Returns:
+        pd.DataFrame: 'property_id', features y 'similarity_score', ordenado por similitud.
+    """
+    features = [k for k in input_dict if k not in TIER_COLUMNS]
+    return get_ivf_index(df, features, scaling).query(input_dict, n, nprobe, same)
+
+
+def recall_report(
+    index: IVFIndex,
+    subjects: pd.DataFrame,
+    n: int = 5,
+    nprobes: Sequence[int] = (1, 2, 4, 8, 16, 32),
+    same: Optional[Sequence[str]] = None,
+) -> pd.DataFrame:
+    """
+    Mide recall@n y latencia del IVF contra la búsqueda exacta por fuerza bruta con el mismo
+    escalado (la que usa get_similars_euclidean_*; con `same`, restringida a las filas del
+    mismo barrio / tipo).
+
+    Args:
+        index (IVFIndex): Índice a evaluar.
+        subjects (pd.DataFrame): Propiedades de consulta (features y, si se usa same, las
+            columnas de TIER_COLUMNS).
+        n (int): Número de vecinos.
+        nprobes (Sequence[int]): Valores de nprobe a evaluar.
+        same (Optional[Sequence[str]]): Columnas categóricas que deben coincidir.
+
+    Returns:
+        pd.DataFrame: Por nprobe: 'recall' (fracción de los n vecinos exactos recuperados),
+            'scanned' (fracción media de filas revisadas), 'ivf_ms' y 'exact_ms' (latencia media
+            por consulta) y 'speedup'.
+    """
+    base = index.base
+    columns = list(index.features) + [c for c in (same or ()) if c in subjects.columns]
+    queries = subjects[columns].dropna(subset=list(index.features)).to_dict("records")
+    # Códigos de las columnas categóricas en el orden de base.X
+    codes = {}
+    for col in same or ():
+        codes[col] = np.empty(len(index), dtype=np.int64)
+        codes[col][index.order] = index._codes[col][0]
+
+    exact = []
+    start = time.perf_counter()
+    for q in queries:
+        distances = base.distances(q)
+        for col in same or ():
+            code = _lookup(index._codes[col][1], q[col])
+            distances = np.where(codes[col] == code, distances, np.nan)
+        top = top_k_positions(distances, n)
+        exact.append(set(top[~np.isnan(distances[top])].tolist()))
+    exact_ms = (time.perf_counter() - start) * 1000 / max(len(queries), 1)
+
+    rows = []
+    for nprobe in nprobes:
+        found, scanned = [], 0
+        start = time.perf_counter()
+        for q in queries:
+            positions, _ = index.search(q, n, nprobe, same)
+            found.append(positions)
+        ivf_ms = (time.perf_counter() - start) * 1000 / max(len(queries), 1)
+        for q in queries:
+            filters = {col: q.get(col) for col in (same or ())}
+            scanned += len(index._candidates(base.transform(q), n, nprobe, filters))
+        hits = sum(len(e & set(f.tolist())) for e, f in zip(exact, found))
+        rows.append({
+            "nprobe": nprobe,
+            "recall": hits / max(sum(len(e) for e in exact), 1),
+            "scanned": scanned / max(len(queries), 1) / len(index),
+            "ivf_ms": ivf_ms,
+            "exact_ms": exact_ms,
+            "speedup": exact_ms / ivf_ms if ivf_ms else np.nan,
+        })
+    return pd.DataFrame(rows)
+
+
+@app.command()
+def build(
+    input_path: Path = PROCESSED_DATA_DIR / "final_df.parquet",
+    output_path: Path = IVF_INDEX_PATH,
+    feature_set: str = "surface_improved",
+    scaling: str = "minmax",
+    n_clusters: Optional[int] = None,
+):
+    """
+    Cluster the scaled comparable features and save the IVF index.
+    """
+    df = extract_data(input_path)
+    index = IVFIndex(df, FEATURE_SETS[feature_set], scaling, n_clusters)
+    index.save(output_path)
+    logger.success(
+        f"IVF index with {index.n_clusters} lists over {len(index)} rows -> {output_path}"
+    )
+
+
+@app.command()
+def recall(
+    input_path: Path = PROCESSED_DATA_DIR / "final_df.parquet",
+    index_path: Path = IVF_INDEX_PATH,
+    n: int = 5,
+    sample: int = 500,
+    nprobes: str = "1,2,4,8,16,32",
+    tiers: bool = False,
+    seed: int = 0,
+):
+    """
+    Report recall@n and speed of a saved IVF index against exact search on sampled listings.
+    """
+    df = extract_data(input_path)
+    index = IVFIndex.load(df, index_path)
+    subjects = df.sample(min(sample, len(df)), random_state=seed)
+    report = recall_report(
+        index,
+        subjects,
+        n,
+        [int(p) for p in nprobes.split(",")],
+        same=TIER_COLUMNS if tiers else None,
+    )
+    logger.info(
+        f"{index.n_clusters} lists, {len(index)} rows\n{report.round(4).to_string(index=False)}"
+    )
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,231 @@
+from datetime import datetime, timezone
+import json
+from pathlib import Path
+import shutil
+from typing import Any, Dict, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import typer
+
+from dd360.config import PROCESSED_DATA_DIR, PROCESSED_DATASET_DIR
+from dd360.extract import Filters, extract_data
+
+PARTITION_COLS = ["neighborhood", "property_type"]
+MANIFEST_NAME = "_manifest.json"
+
+app = typer.Typer()
+
+
+def write_partitioned_dataset(
+    df: pd.DataFrame,
+    root: Union[str, Path] = PROCESSED_DATASET_DIR,
+    partition_cols: Sequence[str] = tuple(PARTITION_COLS),
+    row_group_size: int = 50_000,
+    overwrite: bool = True,
+) -> Dict[str, Any]:
+    """
+    Write a DataFrame as a Hive-partitioned Parquet dataset plus a metadata manifest.
+
+    Each (neighborhood, property_type) pair becomes a directory such as
+    ``neighborhood=ROMA%20NORTE/property_type=apartment/`` (values are URL-encoded), so a
+    query that filters on the partition columns only opens the matching files. Parquet files
+    keep their row-group statistics (min / max per column) for pushdown inside a partition.
+    ``_manifest.json`` records the column order and, per partition, its path, row count and
+    min / max of every numerical column.
+
+    Parameters:
+        df (pd.DataFrame): Processed data (e.g. final_df), with the partition columns.
+        root (str or Path): Dataset directory (default data/processed/final_df/).
+        partition_cols (Sequence[str]): Partition columns, outermost first.
+        row_group_size (int): Maximum rows per Parquet row group.
+        overwrite (bool): Replace an existing dataset written by this function (a directory
+            with a manifest). Other non-empty directories are never deleted.
+
+    Returns:
+        Dict[str, Any]: The manifest.
+    """
+    root = Path(root)
+    partition_cols = list(partition_cols)
+    if root.exists() and any(root.iterdir()):
+        if not (overwrite and (root / MANIFEST_NAME).exists()):
+            raise FileExistsError(f"{root} is not empty and is not a dataset to overwrite")
+        shutil.rmtree(root)
+
+    if "property_id" not in df.columns and df.index.name == "property_id":
+        df = df.reset_index()
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    ds.write_dataset(
+        table,
+        root,
+        format="parquet",
+        partitioning=partition_cols,
+        partitioning_flavor="hive",
+        max_rows_per_group=row_group_size,
+        min_rows_per_group=min(row_group_size, 1024),
+        basename_template="part-{i}.parquet",
+    )
+
+    manifest = build_manifest(root)
+    (root / MANIFEST_NAME).write_text(json.dumps(manifest, indent=2, ensure_ascii=False))
+    return manifest
+
+
+def build_manifest(root: Union[str, Path]) -> Dict[str, Any]:
+    """
+    Build the manifest of a Hive-partitioned Parquet dataset from its files: column order,
+    total rows and, per partition, its relative path, files, row count and the min / max of
+    every numerical column (taken from the row-group statistics, no data is read).
+
+    Parameters:
+        root (str or Path): Dataset directory.
+
+    Returns:
+        Dict[str, Any]: The manifest.
+    """
+    root = Path(root)
+    dataset = ds.dataset(root, format="parquet", partitioning="hive")
+    partition_cols = [
+        name for name in dataset.partitioning.schema.names if name in dataset.schema.names
+    ]
+    numeric = {
+        field.name
+        for field in dataset.schema
+        if pa.types.is_integer(field.type) or pa.types.is_floating(field.type)
+    }
+
+    partitions: Dict[str, Dict[str, Any]] = {}
+    for fragment in dataset.get_fragments():
+        path = Path(fragment.path)
+        directory = path.parent.relative_to(root).as_posix()
+        entry = partitions.setdefault(
+            directory,
+            {
+                "path": directory,
+                **ds.get_partition_keys(fragment.partition_expression),
+                "files": [],
+                "num_rows": 0,
+                "min": {},
+                "max": {},
+            },
+        )
+        entry["files"].append(path.name)
+
+        metadata = fragment.metadata
+        entry["num_rows"] += metadata.num_rows
+        for i in range(metadata.num_row_groups):
+            row_group = metadata.row_group(i)
+            for j in range(row_group.num_columns):
+                column = row_group.column(j)
+                stats = column.statistics
+                name = column.path_in_schema
+                if name not in numeric or stats is None or not stats.has_min_max:
+                    continue
+                low, high = _plain(stats.min), _plain(stats.max)
+                entry["min"][name] = min(entry["min"].get(name, low), low)
+                entry["max"][name] = max(entry["max"].get(name, high), high)
+
+    columns = [n for n in dataset.schema.names if n not in partition_cols]
+    pandas_metadata = dataset.schema.pandas_metadata
+    if pandas_metadata:
+        # Orden original de las columnas (las de partición viven en los directorios)
+        columns = [c["name"] for c in pandas_metadata["columns"] if c["name"] is not None]
+
+    return {
+        "created": datetime.now(timezone.utc).isoformat(),
+        "partition_cols": partition_cols,
+        "columns": columns,
+        "num_rows": int(sum(p["num_rows"] for p in partitions.values())),
+        "partitions": sorted(partitions.values(), key=lambda p: p["path"]),
+    }
+
+
+def _plain(value: Any) -> Any:
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def read_manifest(root: Union[str, Path] = PROCESSED_DATASET_DIR) -> Dict[str, Any]:
+    """
+    Read the manifest written by write_partitioned_dataset.
+    """
+    return json.loads((Path(root) / MANIFEST_NAME).read_text())
+
+
+def hierarchical_filters(input_dict: Dict[str, Any], tier: int = 1) -> Optional[Filters]:
+    """
+    Partition filters covering the tiers of get_similars_hierarchical up to `tier`:
+    1 = same neighborhood and type (one partition), 2 = same type (one partition per
+    neighborhood), 3 = everything (no filter).
+    """
+    if tier <= 1:
+        return [
+            ("neighborhood", "=", input_dict["neighborhood"]),
+            ("property_type", "=", input_dict["property_type"]),
+        ]
+    if tier == 2:
+        return [("property_type", "=", input_dict["property_type"])]
+    return None
+
+
+def read_hierarchical_candidates(
+    input_dict: Dict[str, Any],
+    n: int = 5,
+    root: Union[str, Path] = PROCESSED_DATASET_DIR,
+    columns: Optional[Sequence[str]] = None,
+) -> pd.DataFrame:
+    """
+    Read only the partitions a hierarchical comparable query needs.
+
+    get_similars_hierarchical stops adding tiers once it has n candidates, so with the
+    manifest row counts (no data read) the smallest sufficient tier is chosen: when the
+    input's (neighborhood, property_type) partition has at least n rows it is a single
+    partition read, and the query over the returned rows gives the same comparables as over
+    the full dataset.
+
+    Parameters:
+        input_dict (Dict[str, Any]): Input property with 'neighborhood' and 'property_type'.
+        n (int): Number of comparables the query will ask for.
+        root (str or Path): Dataset directory.
+        columns (Sequence[str], optional): Columns to read.
+
+    Returns:
+        pd.DataFrame: Candidate rows for get_similars_hierarchical.
+    """
+    manifest = read_manifest(root)
+    neighborhood = input_dict.get("neighborhood")
+    property_type = input_dict.get("property_type")
+
+    same_type = [p for p in manifest["partitions"] if p.get("property_type") == property_type]
+    tier_1 = sum(p["num_rows"] for p in same_type if p.get("neighborhood") == neighborhood)
+    tier_2 = sum(p["num_rows"] for p in same_type)
+
+    if neighborhood is not None and property_type is not None and tier_1 >= n:
+        tier = 1
+    elif property_type is not None and tier_2 >= n:
+        tier = 2
+    else:
+        tier = 3
+    return extract_data(root, columns=columns, filters=hierarchical_filters(input_dict, tier))
+
+
+@app.command()
+def main(
+    input_path: Path = PROCESSED_DATA_DIR / "final_df.parquet",
+    output_dir: Path = PROCESSED_DATASET_DIR,
+    row_group_size: int = 50_000,
+):
+    """
+    Write the processed dataset as a partitioned Parquet dataset with its manifest.
+    """
+    manifest = write_partitioned_dataset(
+        extract_data(input_path), output_dir, row_group_size=row_group_size
+    )
+    typer.echo(
+        f"{manifest['num_rows']} rows in {len(manifest['partitions'])} partitions -> {output_dir}"
+    )
+
+
+if __name__ == "__main__":
+    app()
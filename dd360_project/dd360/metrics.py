@@ -0,0 +1,203 @@
+from itertools import combinations
+from typing import Dict, List, Optional
+import warnings
+
+import numpy as np
+import pandas as pd
+
+import dd360.compare as compare
+
+# Columnas de precio: son el objetivo de comparable_price_error, así que nunca se usan para
+# buscar los vecinos con los que se estima
+PRICE_COLUMNS = ("price", "price_per_m2")
+
+
+def method_features(method_name: str, features: List[str]) -> List[str]:
+    """
+    Features numéricas que usa un método cuando la propiedad de entrada viene del propio
+    DataFrame (igual que ExperimentScorer._build_input_dict): los métodos no geográficos
+    también comparan 'latitude' y 'longitude'.
+
+    Args:
+        method_name (str): Nombre del método (uno de compare.BATCH_METHODS).
+        features (List[str]): Conjunto de características.
+
+    Returns:
+        List[str]: Features numéricas en el orden del input_dict.
+    """
+    if method_name == "combined_geo":
+        return list(dict.fromkeys(features))
+    return list(dict.fromkeys(features + ["latitude", "longitude"]))
+
+
+def leave_one_out_neighbours(
+    df: pd.DataFrame, features: List[str], method_name: str, k: int = 5
+) -> Dict[str, np.ndarray]:
+    """
+    Calcula la matriz top-k de vecinos de cada propiedad del DataFrame excluyendo a la propia
+    propiedad (leave-one-out), con una sola búsqueda por lotes.
+
+    Args:
+        df (pd.DataFrame): DataFrame de propiedades (consultas y candidatos).
+        features (List[str]): Conjunto de características.
+        method_name (str): Uno de compare.BATCH_METHODS.
+        k (int): Número de vecinos.
+
+    Returns:
+        Dict[str, np.ndarray]: 'positions' (filas x k, -1 sin vecino) y 'scores' (NaN sin vecino).
+    """
+    numeric = method_features(method_name, features)
+    # En combined_geo los niveles se anidan (el nivel 2 incluye al barrio propio), así que la
+    # propia fila puede aparecer dos veces
+    n_self = 2 if method_name == "combined_geo" else 1
+    positions, scores = compare.search_batch(df, df, numeric, method_name, k + n_self)
+
+    # La propia fila se mueve al final (orden estable) y se descartan las últimas columnas
+    is_self = positions == np.arange(len(df))[:, None]
+    order = np.argsort(is_self, axis=1, kind="stable")[:, :k]
+    return {
+        "positions": np.take_along_axis(positions, order, axis=1),
+        "scores": np.take_along_axis(scores, order, axis=1),
+    }
+
+
+def comparable_price_error(positions: np.ndarray, price_per_m2: np.ndarray) -> Dict[str, float]:
+    """
+    Error de valuación por comparables: para cada propiedad se predice su precio por m² con la
+    mediana del precio por m² de sus vecinos.
+
+    Los vecinos deben venir de una búsqueda sin PRICE_COLUMNS entre sus features (ver
+    evaluate_methods); si el objetivo forma parte de la búsqueda, el error premia a los
+    conjuntos de features que lo contienen.
+
+    Args:
+        positions (np.ndarray): Matriz (filas x k) de posiciones de vecinos (-1 sin vecino).
+        price_per_m2 (np.ndarray): Precio por m² de cada fila del DataFrame.
+
+    Returns:
+        Dict[str, float]: 'mae', 'mape' (en %) y 'coverage' (fracción de filas con predicción).
+    """
+    price_per_m2 = np.asarray(price_per_m2, dtype=np.float64)
+    neighbour_prices = np.where(positions >= 0, price_per_m2[np.maximum(positions, 0)], np.nan)
+
+    # Las filas sin ningún vecino quedan en NaN (nanmedian avisa con RuntimeWarning)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        predicted = np.nanmedian(neighbour_prices, axis=1)
+    errors = np.abs(predicted - price_per_m2)
+    valid = ~np.isnan(errors)
+    positive = valid & (price_per_m2 > 0)
+    relative = errors[positive] / price_per_m2[positive]
+
+    return {
+        "mae": float(errors[valid].mean()) if valid.any() else np.nan,
+        "mape": float(relative.mean() * 100) if len(relative) else np.nan,
+        "coverage": float(valid.mean()) if len(valid) else np.nan,
+    }
+
+
+def tier_hit_rates(
+    positions: np.ndarray, neighborhoods: np.ndarray, property_types: np.ndarray
+) -> Dict[str, float]:
+    """
+    Fracción de vecinos en cada nivel de la jerarquía respecto a su propiedad de entrada:
+    mismo barrio y tipo (tier_1), mismo tipo en otro barrio (tier_2) y distinto tipo (tier_3).
+
+    Args:
+        positions (np.ndarray): Matriz (filas x k) de posiciones de vecinos (-1 sin vecino).
+        neighborhoods (np.ndarray): Barrio de cada fila del DataFrame.
+        property_types (np.ndarray): Tipo de cada fila del DataFrame.
+
+    Returns:
+        Dict[str, float]: 'tier_1', 'tier_2' y 'tier_3'.
+    """
+    neigh_codes = pd.factorize(neighborhoods)[0]
+    type_codes = pd.factorize(property_types)[0]
+    found = positions >= 0
+    safe = np.maximum(positions, 0)
+
+    same_neigh = neigh_codes[safe] == neigh_codes[:, None]
+    same_type = type_codes[safe] == type_codes[:, None]
+    total = found.sum()
+    if total == 0:
+        return {"tier_1": np.nan, "tier_2": np.nan, "tier_3": np.nan}
+    return {
+        "tier_1": float((found & same_neigh & same_type).sum() / total),
+        "tier_2": float((found & ~same_neigh & same_type).sum() / total),
+        "tier_3": float((found & ~same_type).sum() / total),
+    }
+
+
+def neighbour_overlap(neighbours: Dict[str, np.ndarray]) -> pd.DataFrame:
+    """
+    Traslape promedio entre los vecinos de cada par de métodos: |A ∩ B| / k por fila.
+
+    Args:
+        neighbours (Dict[str, np.ndarray]): Matriz de posiciones (filas x k) por método.
+
+    Returns:
+        pd.DataFrame: Matriz simétrica método x método con el traslape promedio (1 en la
+        diagonal).
+    """
+    names = list(neighbours)
+    overlap = pd.DataFrame(np.eye(len(names)), index=names, columns=names)
+    for a, b in combinations(names, 2):
+        A, B = neighbours[a], neighbours[b]
+        shared = ((A[:, :, None] == B[:, None, :]) & (A[:, :, None] >= 0)).any(axis=2).sum(axis=1)
+        k = max(A.shape[1], B.shape[1], 1)
+        overlap.loc[a, b] = overlap.loc[b, a] = float(np.mean(shared / k))
+    return overlap
+
+
+def evaluate_methods(
+    df: pd.DataFrame,
+    features: List[str],
+    methods: Optional[List[str]] = None,
+    k: int = 5,
+) -> Dict[str, pd.DataFrame]:
+    """
+    Evalúa los métodos de comparación con matrices de vecinos leave-one-out por método.
+
+    Las proporciones por nivel, el traslape y mean_similarity salen de los vecinos con las
+    features indicadas. El error de precio (mae, mape, coverage) sale de una segunda búsqueda
+    sin PRICE_COLUMNS, para que el precio por m² que se estima no participe en la búsqueda de
+    sus comparables (sólo se reutiliza la primera matriz si features ya no tiene precios).
+
+    Args:
+        df (pd.DataFrame): DataFrame de propiedades con 'price_per_m2', 'neighborhood' y
+            'property_type'.
+        features (List[str]): Conjunto de características.
+        methods (Optional[List[str]]): Métodos a evaluar (por defecto compare.BATCH_METHODS).
+        k (int): Número de comparables.
+
+    Returns:
+        Dict[str, pd.DataFrame]: 'metrics' (una fila por método con mae, mape, coverage,
+        tier_1..3 y mean_similarity) y 'overlap' (traslape entre métodos).
+    """
+    methods = list(methods or compare.BATCH_METHODS)
+    price_per_m2 = df["price_per_m2"].to_numpy(dtype=np.float64)
+    neighborhoods = df["neighborhood"].to_numpy(dtype=object)
+    property_types = df["property_type"].to_numpy(dtype=object)
+
+    price_free = [f for f in features if f not in PRICE_COLUMNS]
+
+    rows = []
+    neighbours: Dict[str, np.ndarray] = {}
+    for method_name in methods:
+        result = leave_one_out_neighbours(df, features, method_name, k)
+        neighbours[method_name] = result["positions"]
+        scores = result["scores"][np.isfinite(result["scores"])]
+        if len(price_free) == len(features):
+            price_positions = result["positions"]
+        else:
+            price_positions = leave_one_out_neighbours(df, price_free, method_name, k)["positions"]
+        rows.append(
+            {
+                "method": method_name,
+                **comparable_price_error(price_positions, price_per_m2),
+                **tier_hit_rates(result["positions"], neighborhoods, property_types),
+                "mean_similarity": float(scores.mean()) if len(scores) else np.nan,
+            }
+        )
+
+    return {"metrics": pd.DataFrame(rows), "overlap": neighbour_overlap(neighbours)}
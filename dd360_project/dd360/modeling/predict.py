@@ -1,29 +1,135 @@
 from pathlib import Path
+import time
+from typing import Any, Dict, Iterable, Iterator, Union
 
 from loguru import logger
-from tqdm import tqdm
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 import typer
 
-from dd360.config import MODELS_DIR, PROCESSED_DATA_DIR
+from dd360.config import PRICE_MODEL_PATH, PROCESSED_DATA_DIR
+from dd360.extract import iter_batches, read_columns
+from dd360.modeling.train import load_model
 
 app = typer.Typer()
 
+ID_COLUMN = "property_id"
+
+
+def predict_frame(bundle: Dict[str, Any], df: pd.DataFrame) -> np.ndarray:
+    """
+    Score a DataFrame with a single vectorized model call.
+
+    Parameters:
+        bundle (Dict[str, Any]): Model bundle from train_price_model / load_model.
+        df (pd.DataFrame): Rows with the bundle's feature columns.
+
+    Returns:
+        np.ndarray: Predicted target for every row.
+    """
+    X = df[bundle["features"]].to_numpy(dtype=np.float64)
+    if not len(X):
+        return np.empty(0)
+    return bundle["model"].predict(X)
+
+
+def predict_batches(
+    bundle: Dict[str, Any], batches: Iterable[pd.DataFrame]
+) -> Iterator[pd.DataFrame]:
+    """
+    Score each chunk, yielding property_id (when present) and predicted_<target>.
+    """
+    column = f"predicted_{bundle['target']}"
+    for batch in batches:
+        out = batch[[ID_COLUMN]].copy() if ID_COLUMN in batch.columns else pd.DataFrame()
+        out[column] = predict_frame(bundle, batch)
+        yield out
+
+
+def predict_file(
+    features_path: Union[str, Path],
+    bundle: Dict[str, Any],
+    predictions_path: Union[str, Path],
+    chunksize: int = 100_000,
+) -> Dict[str, float]:
+    """
+    Stream a features file in chunks, score each chunk and write the predictions.
+
+    Only the model features (and property_id) are read, and each chunk is written as soon
+    as it is scored, so memory follows the chunk size and not the feed.
+
+    Parameters:
+        features_path (str or Path): CSV, Parquet, Feather or partitioned Parquet directory
+            with the engineered features.
+        bundle (Dict[str, Any]): Model bundle from load_model.
+        predictions_path (str or Path): Output file (.parquet or .csv).
+        chunksize (int): Maximum rows per chunk.
+
+    Returns:
+        Dict[str, float]: "rows", "chunks", "seconds" and "rows_per_second" (end to end:
+            reading, scoring and writing).
+    """
+    features_path, predictions_path = Path(features_path), Path(predictions_path)
+    if predictions_path.suffix.lower() not in (".parquet", ".csv"):
+        raise ValueError(f"Unsupported predictions file: {predictions_path.suffix}")
+
+    columns = list(bundle["features"])
+    if ID_COLUMN in read_columns(features_path) and ID_COLUMN not in columns:
+        columns = [ID_COLUMN] + columns
+
+    predictions_path.parent.mkdir(parents=True, exist_ok=True)
+    rows = chunks = 0
+    writer = None
+    start = time.perf_counter()
+    try:
+        batches = iter_batches(features_path, columns, chunksize)
+        for out in predict_batches(bundle, batches):
+            if predictions_path.suffix.lower() == ".csv":
+                mode = "a" if chunks else "w"
+                out.to_csv(predictions_path, mode=mode, header=not chunks, index=False)
+            else:
+                table = pa.Table.from_pandas(out, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(predictions_path, table.schema)
+                writer.write_table(table)
+            rows += len(out)
+            chunks += 1
+        if not chunks:
+            # Feed sin filas: el archivo de salida existe (vacío) igual
+            empty = pd.DataFrame({f"predicted_{bundle['target']}": np.empty(0)})
+            write = empty.to_csv if predictions_path.suffix.lower() == ".csv" else empty.to_parquet
+            write(predictions_path, index=False)
+    finally:
+        if writer is not None:
+            writer.close()
+    seconds = time.perf_counter() - start
+    return {
+        "rows": rows,
+        "chunks": chunks,
+        "seconds": seconds,
+        "rows_per_second": rows / seconds if seconds else float("nan"),
+    }
+
 
 @app.command()
 def main(
-    # ---- REPLACE DEFAULT PATHS AS APPROPRIATE ----
-    features_path: Path = PROCESSED_DATA_DIR / "test_features.csv",
-    model_path: Path = MODELS_DIR / "model.pkl",
-    predictions_path: Path = PROCESSED_DATA_DIR / "test_predictions.csv",
-    # -----------------------------------------
+    features_path: Path = PROCESSED_DATA_DIR / "final_df.parquet",
+    model_path: Path = PRICE_MODEL_PATH,
+    predictions_path: Path = PROCESSED_DATA_DIR / "price_predictions.parquet",
+    chunksize: int = 100_000,
 ):
-    # ---- REPLACE THIS WITH YOUR OWN CODE ----
-    logger.info("Performing inference for model...")
-    for i in tqdm(range(10), total=10):
-        if i == 5:
-            logger.info("Something happened for iteration 5.")
-    logger.success("Inference complete.")
-    # -----------------------------------------
+    """
+    Score a features file with the trained price model, chunk by chunk.
+    """
+    bundle = load_model(model_path)
+    logger.info(f"Scoring {features_path} with the {bundle['target']} model...")
+    stats = predict_file(features_path, bundle, predictions_path, chunksize)
+    logger.success(
+        f"{stats['rows']:,} rows in {stats['chunks']} chunks, {stats['seconds']:.2f}s "
+        f"({stats['rows_per_second']:,.0f} rows/s) -> {predictions_path}"
+    )
 
 
 if __name__ == "__main__":
@@ -1,29 +1,192 @@
+from datetime import datetime, timezone
 from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Union
 
+import joblib
 from loguru import logger
-from tqdm import tqdm
+import numpy as np
+import pandas as pd
+import sklearn
+from sklearn.compose import TransformedTargetRegressor
+from sklearn.ensemble import HistGradientBoostingRegressor
+from sklearn.metrics import mean_absolute_error, mean_absolute_percentage_error, r2_score
+from sklearn.model_selection import train_test_split
 import typer
 
-from dd360.config import MODELS_DIR, PROCESSED_DATA_DIR
+from dd360.config import PRICE_MODEL_PATH, PROCESSED_DATA_DIR
+from dd360.extract import extract_data
 
 app = typer.Typer()
 
+TARGETS = ("price", "price_per_m2")
+
+# Never model inputs: identifiers, raw categoricals (their one-hots are used instead) and the
+# price columns, since either target is derived from the other.
+EXCLUDED_COLUMNS = (
+    "property_id",
+    "listing_type",
+    "property_type",
+    "url_ad",
+    "neighborhood",
+    "id_neighborhood",
+    "price",
+    "price_per_m2",
+)
+
+
+def model_features(df: pd.DataFrame) -> List[str]:
+    """
+    Numeric engineered columns used as model inputs (in the DataFrame's order).
+
+    Parameters:
+        df (pd.DataFrame): Processed DataFrame (data/processed/final_df.parquet).
+
+    Returns:
+        List[str]: Feature columns.
+    """
+    return [
+        col
+        for col in df.columns
+        if col not in EXCLUDED_COLUMNS and pd.api.types.is_numeric_dtype(df[col])
+    ]
+
+
+def make_model(
+    max_iter: int = 150, learning_rate: float = 0.1, random_state: int = 42
+) -> TransformedTargetRegressor:
+    """
+    Gradient-boosted trees on log(target): prices are right-skewed, so errors are fitted in
+    relative terms and predictions are always positive.
+    """
+    return TransformedTargetRegressor(
+        regressor=HistGradientBoostingRegressor(
+            max_iter=max_iter, learning_rate=learning_rate, random_state=random_state
+        ),
+        func=np.log,
+        inverse_func=np.exp,
+    )
+
+
+def evaluate(y_true: np.ndarray, y_pred: np.ndarray) -> Dict[str, float]:
+    """
+    MAE, MAPE and R² of a set of predictions.
+    """
+    return {
+        "mae": float(mean_absolute_error(y_true, y_pred)),
+        "mape": float(mean_absolute_percentage_error(y_true, y_pred)),
+        "r2": float(r2_score(y_true, y_pred)),
+    }
+
+
+def train_price_model(
+    df: pd.DataFrame,
+    target: str = "price",
+    features: Optional[Sequence[str]] = None,
+    test_size: float = 0.2,
+    random_state: int = 42,
+    max_iter: int = 150,
+    learning_rate: float = 0.1,
+) -> Dict[str, Any]:
+    """
+    Train a price (or price per m²) model on the engineered features.
+
+    The model is first fitted on a train split to report holdout metrics, then refitted on
+    every row with a known target.
+
+    Parameters:
+        df (pd.DataFrame): Processed DataFrame.
+        target (str): "price" or "price_per_m2".
+        features (Sequence[str], optional): Input columns (model_features(df) by default).
+        test_size (float): Fraction of rows held out for the metrics (0 skips evaluation).
+        random_state (int): Seed for the split and the model.
+        max_iter (int): Boosting iterations.
+        learning_rate (float): Boosting learning rate.
+
+    Returns:
+        Dict[str, Any]: Model bundle with "model", "target", "features", "metrics",
+            "n_rows", "trained_at" and "sklearn_version" (see save_model).
+    """
+    if target not in TARGETS:
+        raise ValueError(f"Unsupported target: {target}. Use one of {TARGETS}.")
+    features = list(features) if features is not None else model_features(df)
+    leaked = [col for col in features if col in TARGETS]
+    if leaked:
+        raise ValueError(f"Price columns can not be model features: {leaked}")
+
+    data = df[df[target].notna() & (df[target] > 0)]
+    X = data[features].to_numpy(dtype=np.float64)
+    y = data[target].to_numpy(dtype=np.float64)
+
+    metrics: Dict[str, float] = {}
+    if test_size:
+        X_train, X_test, y_train, y_test = train_test_split(
+            X, y, test_size=test_size, random_state=random_state
+        )
+        holdout = make_model(max_iter, learning_rate, random_state).fit(X_train, y_train)
+        metrics = evaluate(y_test, holdout.predict(X_test))
+
+    model = make_model(max_iter, learning_rate, random_state).fit(X, y)
+    return {
+        "model": model,
+        "target": target,
+        "features": features,
+        "metrics": metrics,
+        "n_rows": len(data),
+        "trained_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "sklearn_version": sklearn.__version__,
+    }
+
+
+def save_model(bundle: Dict[str, Any], path: Union[str, Path] = PRICE_MODEL_PATH) -> None:
+    """
+    Persist a model bundle with joblib.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    joblib.dump(bundle, path)
+
+
+def load_model(path: Union[str, Path] = PRICE_MODEL_PATH) -> Dict[str, Any]:
+    """
+    Load a model bundle saved with save_model.
+    """
+    bundle = joblib.load(path)
+    if bundle.get("sklearn_version") != sklearn.__version__:
+        logger.warning(
+            f"Model trained with scikit-learn {bundle.get('sklearn_version')}, "
+            f"running {sklearn.__version__}"
+        )
+    return bundle
+
 
 @app.command()
 def main(
-    # ---- REPLACE DEFAULT PATHS AS APPROPRIATE ----
-    features_path: Path = PROCESSED_DATA_DIR / "features.csv",
-    labels_path: Path = PROCESSED_DATA_DIR / "labels.csv",
-    model_path: Path = MODELS_DIR / "model.pkl",
-    # -----------------------------------------
+    input_path: Path = PROCESSED_DATA_DIR / "final_df.parquet",
+    model_path: Path = PRICE_MODEL_PATH,
+    target: str = "price",
+    test_size: float = 0.2,
+    max_iter: int = 150,
+    learning_rate: float = 0.1,
+    random_state: int = 42,
 ):
-    # ---- REPLACE THIS WITH YOUR OWN CODE ----
-    logger.info("Training some model...")
-    for i in tqdm(range(10), total=10):
-        if i == 5:
-            logger.info("Something happened for iteration 5.")
-    logger.success("Modeling training complete.")
-    # -----------------------------------------
+    """
+    Train the price model on the processed data and save it to MODELS_DIR.
+    """
+    df = extract_data(input_path)
+    logger.info(f"Training {target} model on {len(df)} rows...")
+    bundle = train_price_model(
+        df,
+        target=target,
+        test_size=test_size,
+        random_state=random_state,
+        max_iter=max_iter,
+        learning_rate=learning_rate,
+    )
+    if bundle["metrics"]:
+        m = bundle["metrics"]
+        logger.info(f"Holdout MAE {m['mae']:,.0f} | MAPE {m['mape']:.2%} | R2 {m['r2']:.3f}")
+    save_model(bundle, model_path)
+    logger.success(f"Model with {len(bundle['features'])} features saved to {model_path}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,429 @@
+from concurrent.futures import ProcessPoolExecutor
+import json
+import os
+from pathlib import Path
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+from loguru import logger
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import typer
+
+import dd360.compare as compare
+from dd360.config import FEATURE_SETS, NEIGHBORS_DIR, PROCESSED_DATA_DIR
+from dd360.extract import extract_data
+from dd360.fingerprint import dataframe_fingerprint
+
+# Vecinos por propiedad (contando a la propia propiedad, como n en get_similars_*)
+NEIGHBORS_N = 5
+
+# Llave de los metadatos de la tabla en el esquema Parquet
+METADATA_KEY = b"dd360_neighbors"
+
+CONTEXT_COLUMNS = ["neighborhood", "property_type", "latitude", "longitude"]
+
+# Métodos cuyo top-m (m < n) es siempre un prefijo del top-n
+PREFIX_METHODS = ("euclidean_standard", "euclidean_minmax")
+
+# DataFrame de cada proceso del pool (se asigna una sola vez por proceso en _init_worker).
+_WORKER_DF: Optional[pd.DataFrame] = None
+
+_TABLES: Dict[str, Tuple[int, "NeighborTable"]] = {}
+
+app = typer.Typer()
+
+
+def _init_worker(df: pd.DataFrame) -> None:
+    """
+    Inicializa un proceso del pool con su propia copia del DataFrame (y de sus índices).
+    """
+    global _WORKER_DF
+    _WORKER_DF = df
+
+
+def _run_block(
+    features: List[str], method_name: str, n: int, start: int, stop: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Calcula los vecinos de un bloque de filas en un proceso del pool.
+    """
+    return row_neighbours(_WORKER_DF, features, method_name, n, start, stop)
+
+
+def row_neighbours(
+    df: pd.DataFrame,
+    features: List[str],
+    method_name: str,
+    n: int,
+    start: int = 0,
+    stop: Optional[int] = None,
+    block_size: Optional[int] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Top-n de vecinos de las filas [start, stop) de df usando cada fila como propiedad de entrada,
+    igual que ExperimentScorer: el input_dict de cada fila son sus features no nulas más barrio,
+    tipo, latitud y longitud (numéricas en los métodos no geográficos). Las filas se agrupan por
+    las columnas presentes y cada grupo se resuelve con compare.search_batch; la fila consultada
+    es candidata de sí misma.
+
+    Args:
+        df (pd.DataFrame): DataFrame de propiedades (consultas y candidatos).
+        features (List[str]): Conjunto de características.
+        method_name (str): Uno de compare.BATCH_METHODS.
+        n (int): Número de vecinos.
+        start (int): Primera fila (posición) a consultar.
+        stop (Optional[int]): Fila donde termina el bloque, sin incluirla (por defecto el final).
+        block_size (Optional[int]): Propiedades por bloque de compare.search_batch.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: Posiciones de los vecinos en df y sus 'similarity_score'
+            (filas x n); -1 / NaN donde no hay vecino o la comparación falló.
+    """
+    rows = df.iloc[start:stop]
+    keys = [k for k in dict.fromkeys(features + CONTEXT_COLUMNS) if k in rows.columns]
+    non_numeric = {"neighborhood", "property_type"}
+    if method_name == "combined_geo":
+        non_numeric |= {"latitude", "longitude"}
+
+    positions = np.full((len(rows), n), -1, dtype=np.int64)
+    scores = np.full((len(rows), n), np.nan)
+    present = rows[keys].notna().to_numpy()
+    patterns, inverse = np.unique(present, axis=0, return_inverse=True)
+    for p, pattern in enumerate(patterns):
+        members = np.flatnonzero(inverse.ravel() == p)
+        input_keys = [k for k, ok in zip(keys, pattern) if ok]
+        # combined_geo lanza ValueError sin barrio o tipo: esas filas quedan sin vecinos
+        if method_name == "combined_geo" and not set(CONTEXT_COLUMNS[:2]) <= set(input_keys):
+            continue
+
+        numeric = [k for k in input_keys if k not in non_numeric]
+        try:
+            found, found_scores = compare.search_batch(
+                df, rows.iloc[members], numeric, method_name, n, block_size=block_size
+            )
+        except Exception:
+            continue
+        positions[members, : found.shape[1]] = found
+        scores[members, : found.shape[1]] = found_scores
+    return positions, scores
+
+
+class NeighborTable:
+    """
+    Tabla precalculada de los vecinos más cercanos de cada propiedad para un conjunto de
+    features y un método.
+
+    Guarda, por fila del DataFrame de origen, las posiciones (int32) y 'similarity_score'
+    (float32) de sus n vecinos en el mismo orden que compare.search_batch, incluida la propia
+    propiedad: la fila de X es el resultado de get_similars_*(df, <features de X>, n). Buscar
+    los comparables de una propiedad del catálogo es una lectura O(1) por su 'property_id'.
+
+    Los métodos jerárquicos amplían los niveles hasta juntar n candidatos, así que su top-m con
+    m < n puede no ser un prefijo del top-n: una tabla sólo es exacta para su propio n (los
+    métodos Euclidianos, para cualquier m <= n; ver exact_for).
+    """
+
+    def __init__(
+        self,
+        property_ids: np.ndarray,
+        positions: np.ndarray,
+        scores: np.ndarray,
+        meta: Dict[str, Any],
+    ) -> None:
+        """
+        Args:
+            property_ids (np.ndarray): 'property_id' de cada fila del DataFrame de origen.
+            positions (np.ndarray): Posiciones de los vecinos (filas x columnas, -1 sin vecino).
+            scores (np.ndarray): 'similarity_score' de los vecinos (NaN sin vecino).
+            meta (Dict[str, Any]): 'feature_set', 'features', 'method', 'n' y 'data_hash'
+                (huella de data_fingerprint).
+        """
+        self.property_ids: np.ndarray = property_ids
+        self.positions: np.ndarray = positions
+        self.scores: np.ndarray = scores
+        self.meta: Dict[str, Any] = meta
+        self._slots: Dict[Any, int] = {pid: i for i, pid in enumerate(property_ids.tolist())}
+
+    def __len__(self) -> int:
+        return len(self.property_ids)
+
+    @property
+    def width(self) -> int:
+        """
+        Vecinos guardados por fila (n, contando a la propia propiedad).
+        """
+        return self.positions.shape[1]
+
+    def exact_for(self, n: int) -> bool:
+        """
+        Indica si las primeras n columnas son exactamente el resultado de una búsqueda con n.
+        """
+        return n == self.width or (self.meta["method"] in PREFIX_METHODS and n <= self.width)
+
+    def slot(self, property_id: Any) -> int:
+        """
+        Fila de una propiedad en la tabla.
+
+        Raises:
+            KeyError: Si la propiedad no está en el catálogo de la tabla.
+        """
+        return self._slots[property_id]
+
+    def lookup(
+        self, property_id: Any, n: Optional[int] = None, exclude_self: bool = False
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Vecinos de una propiedad del catálogo.
+
+        Args:
+            property_id (Any): Identificador de la propiedad.
+            n (Optional[int]): Máximo de vecinos a devolver (por defecto todos los guardados).
+            exclude_self (bool): Si es True se omite a la propia propiedad.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Posiciones (en el DataFrame de origen) y
+                'similarity_score', de más a menos similar.
+        """
+        i = self.slot(property_id)
+        positions, scores = self.positions[i], self.scores[i]
+        if exclude_self:
+            keep = positions != i
+            positions, scores = positions[keep], scores[keep]
+        return positions[:n], scores[:n].astype(np.float64)
+
+    def query(
+        self, property_id: Any, n: Optional[int] = None, exclude_self: bool = False
+    ) -> pd.DataFrame:
+        """
+        Comparables de una propiedad del catálogo.
+
+        Returns:
+            pd.DataFrame: 'property_id' y 'similarity_score' de los vecinos, ordenados por
+                similitud.
+        """
+        positions, scores = self.lookup(property_id, n, exclude_self)
+        found = positions >= 0
+        return pd.DataFrame(
+            {"property_id": self.property_ids[positions[found]], "similarity_score": scores[found]}
+        )
+
+    def save(self, path: Union[str, Path]) -> None:
+        """
+        Guarda la tabla como Parquet: 'property_id' y listas de tamaño fijo 'neighbors' (int32)
+        y 'scores' (float32); los metadatos van en el esquema.
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        width = self.width
+        neighbors = pa.FixedSizeListArray.from_arrays(
+            pa.array(self.positions.astype(np.int32).ravel()), width
+        )
+        scores = pa.FixedSizeListArray.from_arrays(
+            pa.array(self.scores.astype(np.float32).ravel()), width
+        )
+        table = pa.table(
+            {"property_id": self.property_ids, "neighbors": neighbors, "scores": scores}
+        )
+        table = table.replace_schema_metadata({METADATA_KEY: json.dumps(self.meta)})
+        tmp = path.with_name(path.name + ".tmp")
+        pq.write_table(table, tmp)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "NeighborTable":
+        """
+        Carga una tabla guardada con save.
+        """
+        table = pq.read_table(path)
+        meta = json.loads(table.schema.metadata[METADATA_KEY])
+
+        def matrix(column: str) -> np.ndarray:
+            values = table.column(column).combine_chunks()
+            width = values.type.list_size
+            return values.flatten().to_numpy().reshape(-1, width)
+
+        property_ids = table.column("property_id").to_numpy(zero_copy_only=False)
+        return cls(property_ids, matrix("neighbors"), matrix("scores"), meta)
+
+
+def data_fingerprint(df: pd.DataFrame, features: List[str]) -> str:
+    """
+    Huella (dataframe_fingerprint) de las columnas que determinan los vecinos: 'property_id',
+    las features y las columnas de contexto. Una tabla sirve para otro DataFrame (por ejemplo
+    uno cargado con ExperimentScorer.required_columns) si esta huella coincide.
+    """
+    columns = [c for c in dict.fromkeys(["property_id"] + features + CONTEXT_COLUMNS) if c in df]
+    return dataframe_fingerprint(df[columns])
+
+
+def table_path(
+    feature_set: str,
+    method_name: str,
+    n: int = NEIGHBORS_N,
+    directory: Union[str, Path] = NEIGHBORS_DIR,
+) -> Path:
+    """
+    Archivo de la tabla de (conjunto de features, método, n).
+    """
+    return Path(directory) / f"{feature_set}__{method_name}__n{n}.parquet"
+
+
+def build_neighbor_tables(
+    df: pd.DataFrame,
+    feature_sets: Optional[Sequence[str]] = None,
+    methods: Optional[Sequence[str]] = None,
+    n: int = NEIGHBORS_N,
+    n_jobs: int = 1,
+    block_rows: Optional[int] = None,
+    directory: Union[str, Path] = NEIGHBORS_DIR,
+) -> pd.DataFrame:
+    """
+    Calcula y guarda la tabla de vecinos de cada propiedad para cada conjunto de features y
+    método.
+
+    Las filas se procesan en bloques; con n_jobs > 1 los bloques de todas las combinaciones se
+    reparten en un pool de procesos que construye sus índices una sola vez por combinación.
+
+    Args:
+        df (pd.DataFrame): DataFrame procesado (consultas y candidatos).
+        feature_sets (Optional[Sequence[str]]): Nombres de FEATURE_SETS (por defecto todos).
+        methods (Optional[Sequence[str]]): Métodos (por defecto compare.BATCH_METHODS).
+        n (int): Vecinos por propiedad, contando a la propia propiedad (como get_similars_*).
+        n_jobs (int): Número de procesos (-1 para todos los núcleos).
+        block_rows (Optional[int]): Filas por bloque; por defecto ~4 bloques por proceso.
+        directory (Union[str, Path]): Carpeta de salida.
+
+    Returns:
+        pd.DataFrame: Una fila por tabla con 'feature_set', 'method', 'rows', 'seconds',
+            'bytes' y 'path'.
+    """
+    combinations = [
+        (feature_set, method_name)
+        for method_name in methods or compare.BATCH_METHODS
+        for feature_set in feature_sets or list(FEATURE_SETS)
+    ]
+    n_jobs = (os.cpu_count() or 1) if n_jobs == -1 else n_jobs
+    n_rows = len(df)
+    block_rows = block_rows or max(1, -(-n_rows // (max(n_jobs, 1) * 4)))
+    starts = range(0, n_rows, block_rows)
+    property_ids = df["property_id"].to_numpy()
+
+    summary = []
+    executor = (
+        ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker, initargs=(df,))
+        if n_jobs > 1
+        else None
+    )
+    try:
+        futures = {}
+        for feature_set, method_name in combinations:
+            features = FEATURE_SETS[feature_set]
+            if executor is not None:
+                futures[(feature_set, method_name)] = [
+                    executor.submit(
+                        _run_block, features, method_name, n, s, min(s + block_rows, n_rows)
+                    )
+                    for s in starts
+                ]
+
+        for feature_set, method_name in combinations:
+            features = FEATURE_SETS[feature_set]
+            began = time.perf_counter()
+            if executor is not None:
+                blocks = [f.result() for f in futures[(feature_set, method_name)]]
+            else:
+                blocks = [
+                    row_neighbours(df, features, method_name, n, s, min(s + block_rows, n_rows))
+                    for s in starts
+                ]
+            positions = np.concatenate([b[0] for b in blocks]) if blocks else np.empty((0, n))
+            scores = np.concatenate([b[1] for b in blocks]) if blocks else np.empty((0, n))
+
+            table = NeighborTable(
+                property_ids,
+                positions,
+                scores,
+                {
+                    "feature_set": feature_set,
+                    "features": features,
+                    "method": method_name,
+                    "n": n,
+                    "data_hash": data_fingerprint(df, features),
+                },
+            )
+            path = table_path(feature_set, method_name, n, directory)
+            table.save(path)
+            summary.append(
+                {
+                    "feature_set": feature_set,
+                    "method": method_name,
+                    "rows": len(table),
+                    "seconds": time.perf_counter() - began,
+                    "bytes": path.stat().st_size,
+                    "path": str(path),
+                }
+            )
+            logger.info(f"{feature_set} / {method_name}: {len(table)} rows -> {path.name}")
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return pd.DataFrame(summary)
+
+
+def get_neighbor_table(
+    feature_set: str,
+    method_name: str,
+    n: int = NEIGHBORS_N,
+    directory: Union[str, Path] = NEIGHBORS_DIR,
+) -> Optional[NeighborTable]:
+    """
+    Devuelve la tabla de (conjunto de features, método, n) cargándola sólo la primera vez (se
+    vuelve a leer si el archivo cambió), o None si no se ha construido.
+    """
+    path = table_path(feature_set, method_name, n, directory)
+    try:
+        mtime = path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+    key = os.path.abspath(path)
+    cached = _TABLES.get(key)
+    if cached is None or cached[0] != mtime:
+        cached = (mtime, NeighborTable.load(path))
+        _TABLES[key] = cached
+    return cached[1]
+
+
+@app.command()
+def main(
+    input_path: Path = PROCESSED_DATA_DIR / "final_df.parquet",
+    output_dir: Path = NEIGHBORS_DIR,
+    n: int = NEIGHBORS_N,
+    n_jobs: int = 1,
+    block_rows: Optional[int] = None,
+    feature_sets: Optional[str] = None,
+    methods: Optional[str] = None,
+):
+    """
+    Precompute the top-n comparables of every listing for each feature set and method.
+    """
+    df = extract_data(input_path)
+    summary = build_neighbor_tables(
+        df,
+        feature_sets.split(",") if feature_sets else None,
+        methods.split(",") if methods else None,
+        n,
+        n_jobs,
+        block_rows,
+        output_dir,
+    )
+    logger.success(
+        f"{len(summary)} neighbour tables, {summary['bytes'].sum() / 1e6:.1f} MB, "
+        f"{summary['seconds'].sum():.1f}s -> {output_dir}"
+    )
+
+
+if __name__ == "__main__":
+    app()
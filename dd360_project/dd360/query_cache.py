@@ -0,0 +1,177 @@
+from collections import OrderedDict
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Mapping, Optional, Tuple, TypeVar
+
+import numpy as np
+
+T = TypeVar("T")
+
+# Número máximo de resultados que se guardan por defecto
+QUERY_CACHE_SIZE = 1024
+
+
+class QueryCache:
+    """
+    Caché LRU (con vigencia opcional) de resultados de búsquedas de comparables.
+
+    La llave combina el método, la entrada normalizada (mismas llaves y valores numéricos como
+    float, sin importar su orden ni si llegan como int, float o tipos de NumPy), n, los
+    parámetros extra y la versión del dataset. Cuando se consulta con una versión distinta a
+    la actual la caché se vacía, así que un dataset nuevo nunca devuelve resultados viejos.
+
+    Es segura entre hilos. Los valores se devuelven tal cual se guardaron (sin copiar): quien
+    los use debe tratarlos como de sólo lectura.
+    """
+
+    def __init__(
+        self, maxsize: int = QUERY_CACHE_SIZE, ttl: Optional[float] = None, version: str = ""
+    ) -> None:
+        """
+        Args:
+            maxsize (int): Número máximo de resultados; se descarta el usado hace más tiempo.
+            ttl (Optional[float]): Vigencia en segundos de cada resultado (None: sin vencimiento).
+            version (str): Versión inicial del dataset.
+        """
+        self.maxsize: int = maxsize
+        self.ttl: Optional[float] = ttl
+        self.version: str = version
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+        self._entries: "OrderedDict[Hashable, Tuple[Optional[float], Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def make_key(
+        method: str, input_dict: Mapping[str, Any], n: int, version: str = "", **params: Any
+    ) -> Hashable:
+        """
+        Llave normalizada de una búsqueda.
+
+        Args:
+            method (str): Método de comparación.
+            input_dict (Mapping[str, Any]): Propiedad de entrada.
+            n (int): Número de comparables.
+            version (str): Versión del dataset.
+            **params (Any): Otros parámetros que cambian el resultado (por ejemplo max_radius_km).
+
+        Returns:
+            Hashable: Llave de la búsqueda.
+        """
+        values = tuple(sorted((k, _normalize(v)) for k, v in input_dict.items()))
+        extra = tuple(sorted((k, _normalize(v)) for k, v in params.items()))
+        return method, values, int(n), extra, version
+
+    def set_version(self, version: str) -> None:
+        """
+        Cambia la versión del dataset; si es distinta a la actual vacía la caché.
+        """
+        with self._lock:
+            if version != self.version:
+                self._entries.clear()
+                self.version = version
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        """
+        Busca una llave y cuenta el acierto o fallo.
+
+        Returns:
+            Tuple[bool, Any]: (encontrado, valor).
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry[0] is None or entry[0] > time.monotonic()):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """
+        Guarda un resultado, descartando el menos usado si se excede maxsize.
+        """
+        expires = None if self.ttl is None else time.monotonic() + self.ttl
+        with self._lock:
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_compute(
+        self,
+        method: str,
+        input_dict: Mapping[str, Any],
+        n: int,
+        compute: Callable[[], T],
+        version: Optional[str] = None,
+        **params: Any,
+    ) -> T:
+        """
+        Devuelve el resultado guardado de una búsqueda o lo calcula con `compute` y lo guarda.
+
+        Args:
+            method (str): Método de comparación.
+            input_dict (Mapping[str, Any]): Propiedad de entrada (la llave se calcula antes de
+                llamar a compute, que puede modificarla).
+            n (int): Número de comparables.
+            compute (Callable[[], T]): Función sin argumentos que hace la búsqueda.
+            version (Optional[str]): Versión del dataset; si cambió, la caché se vacía antes.
+            **params (Any): Otros parámetros que cambian el resultado.
+
+        Returns:
+            T: Resultado de la búsqueda.
+        """
+        if version is not None:
+            self.set_version(version)
+        key = self.make_key(method, input_dict, n, self.version, **params)
+        found, value = self.get(key)
+        if found:
+            return value
+        value = compute()
+        self.put(key, value)
+        return value
+
+    def clear(self) -> None:
+        """
+        Vacía la caché (los contadores se conservan).
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Aciertos, fallos, tasa de aciertos, descartes, tamaño y versión actual.
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "evictions": self.evictions,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "version": self.version,
+            }
+
+
+def _normalize(value: Any) -> Hashable:
+    """
+    Valor hashable y canónico: números (incluidos los de NumPy) como float, NaN como None.
+    """
+    if isinstance(value, (int, float, np.integer, np.floating, np.bool_)):
+        value = float(value)
+        return None if value != value else value
+    if value is None:
+        return None
+    if isinstance(value, (list, tuple)):
+        return tuple(_normalize(v) for v in value)
+    return value
@@ -0,0 +1,321 @@
+from datetime import datetime, timezone
+import hashlib
+import json
+import os
+from pathlib import Path
+import shutil
+from typing import Any, Dict, Optional, Sequence, Tuple, Union
+import uuid
+
+import pandas as pd
+import pyarrow.feather as feather
+
+from dd360.config import FEATURE_SETS, PROCESSED_DATA_DIR, SNAPSHOTS_DIR
+from dd360.extract import extract_data
+from dd360.index import HierarchicalIndex, register_index
+
+# Versión del formato en disco; cambiarla invalida los snapshots existentes.
+SNAPSHOT_VERSION = 1
+
+# Cómo se decide si el snapshot sigue vigente: por (mtime, tamaño) del parquet, o además por
+# su sha256 cuando cambió el mtime (un archivo tocado pero idéntico no se reconstruye).
+VALIDATIONS = ("mtime", "hash")
+
+# Archivo del directorio de un snapshot con el nombre de su versión vigente; se reemplaza de
+# forma atómica al publicar una versión nueva
+POINTER_NAME = "CURRENT"
+
+# Archivos del formato anterior (una sola versión en la raíz del directorio)
+LEGACY_ENTRIES = ("data.arrow", "index", "ranges.json", "meta.json")
+
+# Features numéricas del formulario de la webapp (en el orden de su input_dict)
+APP_FEATURES = FEATURE_SETS["surface_improved"]
+
+_SNAPSHOTS: Dict[Tuple, "Snapshot"] = {}
+
+
+class Snapshot:
+    """
+    Dataset procesado listo para servir: DataFrame, índice jerárquico y rangos de la interfaz.
+
+    Los datos viven en disco como Arrow IPC sin compresión y el índice como arreglos .npy; ambos
+    se abren mapeados en memoria, así que abrir un snapshot no decodifica el parquet ni
+    reconstruye el índice, y varios procesos comparten las mismas páginas.
+    """
+
+    def __init__(self, directory: Union[str, Path], mmap: bool = True) -> None:
+        """
+        Abre la versión vigente de un snapshot escrito por build_snapshot. Si otro proceso
+        publica una versión nueva y borra la que se estaba abriendo, se abre la nueva.
+
+        Args:
+            directory (Union[str, Path]): Directorio del snapshot (o de una de sus versiones).
+            mmap (bool): Si es True los datos y el índice se mapean en memoria.
+        """
+        while True:
+            version_dir = current_version_dir(directory)
+            try:
+                self._open(version_dir, mmap)
+                return
+            except FileNotFoundError:
+                if current_version_dir(directory) == version_dir:
+                    raise
+
+    def _open(self, directory: Path, mmap: bool) -> None:
+        self.directory: Path = directory
+        self.meta: Dict[str, Any] = _read_meta(self.directory)
+        if self.meta is None:
+            raise FileNotFoundError(f"No hay un snapshot en {self.directory}")
+
+        table = feather.read_table(self.directory / "data.arrow", memory_map=mmap)
+        # Un bloque por columna: las columnas numéricas quedan como vistas del archivo mapeado
+        # en lugar de consolidarse (y copiarse) en bloques por tipo
+        self.df: pd.DataFrame = table.to_pandas(split_blocks=True)
+        self.ranges: Dict[str, Any] = json.loads((self.directory / "ranges.json").read_text())
+        self.index: HierarchicalIndex = HierarchicalIndex.load(
+            self.directory / "index", self.df, mmap=mmap
+        )
+        self.stamp: Tuple[int, int] = (self.meta["mtime_ns"], self.meta["size"])
+
+    @property
+    def version(self) -> str:
+        """Identificador del contenido del parquet de origen (prefijo de su sha256)."""
+        return self.meta["sha256"][:16]
+
+    def column_range(self, column: str) -> Tuple[float, float]:
+        """
+        Mínimo y máximo precalculados de una columna numérica.
+        """
+        low, high = self.ranges["columns"][column]
+        return low, high
+
+
+def source_stamp(path: Union[str, Path]) -> Tuple[int, int]:
+    """
+    (mtime en ns, tamaño en bytes) de un archivo: un os.stat, sin leer su contenido.
+    """
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def file_sha256(path: Union[str, Path], chunk_size: int = 2**20) -> str:
+    """
+    sha256 del contenido de un archivo, leído por bloques.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def compute_ui_ranges(df: pd.DataFrame) -> Dict[str, Any]:
+    """
+    Rangos que necesita la interfaz: mínimo y máximo de cada columna numérica, barrios
+    ordenados y tipos de propiedad (en orden de aparición, como df["property_type"].unique()).
+
+    Args:
+        df (pd.DataFrame): Dataset procesado.
+
+    Returns:
+        Dict[str, Any]: {"columns": {col: [min, max]}, "neighborhoods": [...],
+            "property_types": [...]}.
+    """
+    numeric = df.select_dtypes(include="number")
+    columns = {
+        col: [float(numeric[col].min()), float(numeric[col].max())]
+        for col in numeric.columns
+        if numeric[col].notna().any()
+    }
+    return {
+        "columns": columns,
+        "neighborhoods": sorted(df["neighborhood"].dropna().unique().tolist()),
+        "property_types": df["property_type"].dropna().unique().tolist(),
+    }
+
+
+def build_snapshot(
+    source: Union[str, Path],
+    directory: Union[str, Path],
+    columns: Optional[Sequence[str]] = None,
+    features: Sequence[str] = tuple(APP_FEATURES),
+) -> Dict[str, Any]:
+    """
+    Escribe el snapshot de un parquet procesado: data.arrow (Arrow IPC sin compresión), el
+    HierarchicalIndex de `features` en index/, ranges.json y meta.json con la huella del origen.
+
+    Cada construcción escribe una versión nueva en su propio subdirectorio y la publica
+    reemplazando de forma atómica el archivo CURRENT; después se borra la versión anterior.
+    Un lector siempre encuentra una versión completa: la anterior o la nueva. Los procesos que
+    ya tenían abierta la anterior conservan sus archivos mapeados (en POSIX, borrar un archivo
+    no invalida sus mapeos).
+
+    Args:
+        source (Union[str, Path]): Parquet procesado (por ejemplo final_df.parquet).
+        directory (Union[str, Path]): Directorio del snapshot.
+        columns (Optional[Sequence[str]]): Columnas a incluir (todas por defecto).
+        features (Sequence[str]): Features numéricas del índice jerárquico.
+
+    Returns:
+        Dict[str, Any]: Contenido de meta.json de la versión publicada.
+    """
+    source, directory = Path(source), Path(directory)
+    mtime_ns, size = source_stamp(source)
+    table = extract_data(source, columns=columns, return_type="arrow")
+    df = table.to_pandas()
+
+    directory.mkdir(parents=True, exist_ok=True)
+    previous = _pointer(directory)
+    name = f"v-{datetime.now(timezone.utc):%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+    tmp = directory / name
+    tmp.mkdir()
+    # Un solo record batch: cada columna queda en un arreglo contiguo y tomar filas (iloc) no
+    # recorre un bloque por cada 64k filas
+    feather.write_feather(
+        table.combine_chunks(),
+        tmp / "data.arrow",
+        compression="uncompressed",
+        chunksize=max(table.num_rows, 1),
+    )
+    HierarchicalIndex(df, features).save(tmp / "index")
+    (tmp / "ranges.json").write_text(json.dumps(compute_ui_ranges(df), ensure_ascii=False))
+
+    meta = {
+        "version": SNAPSHOT_VERSION,
+        "source": str(source.resolve()),
+        "mtime_ns": mtime_ns,
+        "size": size,
+        "sha256": file_sha256(source),
+        "columns": table.schema.names,
+        "features": list(features),
+        "num_rows": table.num_rows,
+        "created": datetime.now(timezone.utc).isoformat(),
+    }
+    (tmp / "meta.json").write_text(json.dumps(meta, indent=2))
+
+    _write_atomic(directory / POINTER_NAME, name)
+    if previous is not None and previous != name:
+        shutil.rmtree(directory / previous, ignore_errors=True)
+    for entry in LEGACY_ENTRIES:
+        path = directory / entry
+        if path.is_dir():
+            shutil.rmtree(path, ignore_errors=True)
+        elif path.exists():
+            path.unlink()
+    return meta
+
+
+def current_version_dir(directory: Union[str, Path]) -> Path:
+    """
+    Subdirectorio de la versión vigente de un snapshot (la que indica CURRENT); si no hay
+    CURRENT, el propio directorio (una versión o un snapshot del formato anterior).
+    """
+    directory = Path(directory)
+    name = _pointer(directory)
+    return directory / name if name is not None else directory
+
+
+def load_snapshot(
+    source: Union[str, Path] = PROCESSED_DATA_DIR / "final_df.parquet",
+    columns: Optional[Sequence[str]] = None,
+    features: Sequence[str] = tuple(APP_FEATURES),
+    snapshot_dir: Union[str, Path] = SNAPSHOTS_DIR,
+    validate: str = "mtime",
+) -> Snapshot:
+    """
+    Devuelve el snapshot de `source`, cargándolo una sola vez por proceso.
+
+    Las llamadas siguientes sólo hacen un os.stat del parquet y devuelven el mismo objeto
+    (microsegundos); si el parquet cambió se reconstruye el snapshot en disco. Al abrirlo, su
+    índice jerárquico se registra en la caché de dd360.index, de modo que
+    get_similars_hierarchical(snapshot.df, ...) no lo vuelve a construir.
+
+    Args:
+        source (Union[str, Path]): Parquet procesado.
+        columns (Optional[Sequence[str]]): Columnas a cargar (todas por defecto).
+        features (Sequence[str]): Features numéricas del índice jerárquico.
+        snapshot_dir (Union[str, Path]): Directorio donde se guardan los snapshots.
+        validate (str): "mtime" (por mtime y tamaño) o "hash" (si el mtime cambió, compara
+            además el sha256 antes de reconstruir).
+
+    Returns:
+        Snapshot: Snapshot vigente.
+    """
+    if validate not in VALIDATIONS:
+        raise ValueError(f"Validación no soportada: {validate}. Usa una de {VALIDATIONS}.")
+    columns = tuple(columns) if columns is not None else None
+    key = (os.path.abspath(source), columns, tuple(features))
+
+    stamp = source_stamp(source)
+    cached = _SNAPSHOTS.get(key)
+    if cached is not None and cached.stamp == stamp:
+        return cached
+
+    source = Path(source)
+    name = hashlib.sha256(repr(key).encode()).hexdigest()[:16]
+    directory = Path(snapshot_dir) / name
+    if not _is_current(directory, source, stamp, validate):
+        build_snapshot(source, directory, columns, features)
+    elif cached is not None and _current_sha256(directory) == cached.meta["sha256"]:
+        # Mismo contenido con otro mtime (validate="hash"): se conserva el objeto cargado
+        cached.stamp = stamp
+        return cached
+
+    snapshot = Snapshot(directory)
+    snapshot.stamp = stamp
+    register_index(snapshot.index)
+    _SNAPSHOTS[key] = snapshot
+    return snapshot
+
+
+def clear_snapshot_cache() -> None:
+    """
+    Olvida los snapshots cargados en este proceso (los de disco se conservan).
+    """
+    _SNAPSHOTS.clear()
+
+
+def _current_sha256(directory: Path) -> Optional[str]:
+    meta = _read_meta(current_version_dir(directory))
+    return meta["sha256"] if meta is not None else None
+
+
+def _pointer(directory: Path) -> Optional[str]:
+    try:
+        return (directory / POINTER_NAME).read_text().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def _write_atomic(path: Path, text: str) -> None:
+    tmp = path.with_name(f".{path.name}.tmp-{os.getpid()}")
+    tmp.write_text(text)
+    os.replace(tmp, path)
+
+
+def _read_meta(directory: Path) -> Optional[Dict[str, Any]]:
+    path = directory / "meta.json"
+    if not path.exists():
+        return None
+    meta = json.loads(path.read_text())
+    return meta if meta.get("version") == SNAPSHOT_VERSION else None
+
+
+def _is_current(
+    directory: Path, source: Path, stamp: Tuple[int, int], validate: str
+) -> bool:
+    """
+    Indica si un snapshot corresponde al contenido actual del parquet. Con validate="hash" y
+    mismo sha256, actualiza la huella (mtime, tamaño) en meta.json para no volver a leerlo.
+    """
+    directory = current_version_dir(directory)
+    meta = _read_meta(directory)
+    if meta is None:
+        return False
+    if (meta["mtime_ns"], meta["size"]) == stamp:
+        return True
+    if validate != "hash" or meta["size"] != stamp[1] or file_sha256(source) != meta["sha256"]:
+        return False
+    meta["mtime_ns"] = stamp[0]
+    _write_atomic(directory / "meta.json", json.dumps(meta, indent=2))
+    return True
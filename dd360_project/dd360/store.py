@@ -0,0 +1,367 @@
+import json
+import os
+from pathlib import Path
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from dd360.index import fit_scaling, top_k_positions
+
+# Columnas categóricas que se guardan para filtrar por nivel de la jerarquía
+STORE_TIERS = ("neighborhood", "property_type")
+
+# Capacidad mínima de los arreglos (crecen al doble cuando se llenan)
+MIN_CAPACITY = 1024
+
+
+class ComparableStore:
+    """
+    Almacén actualizable de comparables: inserta, actualiza y elimina propiedades por
+    'property_id' sin reconstruir nada.
+
+    A diferencia de SimilarityIndex, el escalado (MinMax o Z-score) queda congelado: se ajusta
+    al construir el almacén o al llamar a refit(), y las altas y cambios se escalan con esos
+    mismos parámetros, así que una actualización sólo escribe sus filas. Las filas viven en
+    arreglos con capacidad de sobra (crecen al doble), un diccionario property_id -> slot y
+    una máscara de filas vivas; las bajas dejan el slot libre (tombstone) para la siguiente
+    alta y refit() compacta.
+
+    Es seguro entre hilos (un lock protege lecturas y escrituras). La versión cambia con cada
+    modificación, para usarla como versión de una QueryCache.
+    """
+
+    def __init__(
+        self,
+        df: pd.DataFrame,
+        features: Sequence[str],
+        scaling: str = "minmax",
+        capacity: Optional[int] = None,
+    ) -> None:
+        """
+        Construye el almacén y ajusta el escalado con las filas de df.
+
+        Args:
+            df (pd.DataFrame): Propiedades con 'property_id', las features y, opcionalmente,
+                'neighborhood' y 'property_type'. Las filas con features nulas se omiten (como
+                en SimilarityIndex).
+            features (Sequence[str]): Features numéricas a comparar.
+            scaling (str): "minmax" o "standard".
+            capacity (Optional[int]): Capacidad inicial (por defecto el doble de las filas).
+        """
+        self.features: List[str] = list(features)
+        self.scaling: str = scaling
+        self.generation: int = 0
+        self._epoch: str = uuid.uuid4().hex[:8]
+        self._lock = threading.RLock()
+        self._categories: Dict[str, Dict[Any, int]] = {col: {} for col in STORE_TIERS}
+        self._drift: Optional[Tuple[str, Dict[str, float]]] = None
+
+        complete = df.dropna(subset=["property_id"] + self.features)
+        complete = complete.drop_duplicates("property_id", keep="last")
+        raw = complete[self.features].to_numpy(dtype=np.float64)
+        if not len(raw):
+            raise ValueError("No hay filas sin valores nulos para las features solicitadas.")
+        self.offset_, self.scale_ = fit_scaling(raw, scaling)
+
+        self._allocate(max(capacity or 2 * len(complete), MIN_CAPACITY, len(complete)))
+        self.upsert(complete)
+        self.generation = 0
+
+    def _allocate(self, capacity: int) -> None:
+        self._ids: np.ndarray = np.empty(capacity, dtype=object)
+        self._raw: np.ndarray = np.zeros((capacity, len(self.features)))
+        self._X: np.ndarray = np.zeros((capacity, len(self.features)))
+        self._codes: np.ndarray = np.zeros((capacity, len(STORE_TIERS)), dtype=np.int64)
+        self._alive: np.ndarray = np.zeros(capacity, dtype=bool)
+        self._size: int = 0
+        self._free: List[int] = []
+        self._slots: Dict[Any, int] = {}
+
+    def _grow(self, needed: int) -> None:
+        """
+        Duplica la capacidad hasta que quepan `needed` slots.
+        """
+        capacity = len(self._alive)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        for name in ("_ids", "_raw", "_X", "_codes", "_alive"):
+            old = getattr(self, name)
+            new = np.empty((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[: len(old)] = old
+            new[len(old):] = None if old.dtype == object else 0
+            setattr(self, name, new)
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def __contains__(self, property_id: Any) -> bool:
+        return property_id in self._slots
+
+    @property
+    def capacity(self) -> int:
+        return len(self._alive)
+
+    @property
+    def version(self) -> str:
+        """
+        Identificador de los datos actuales (cambia con cada alta, baja o refit).
+        """
+        return f"{self._epoch}.{self.generation}"
+
+    def _encode(self, values: pd.Series, col: str) -> np.ndarray:
+        """
+        Códigos (>= 1, 0 para nulos) de una columna categórica; los valores nuevos se agregan
+        al diccionario.
+        """
+        codes, uniques = pd.factorize(values)
+        lookup = self._categories[col]
+        mapping = np.array(
+            [lookup.setdefault(v, len(lookup) + 1) for v in uniques.tolist()] + [0],
+            dtype=np.int64,
+        )
+        return mapping[codes]
+
+    def upsert(self, df: pd.DataFrame) -> Dict[str, int]:
+        """
+        Inserta propiedades nuevas y reemplaza las existentes (por 'property_id').
+
+        Las filas se escalan con los parámetros congelados. Una fila con features nulas no se
+        puede comparar: se omite y, si la propiedad ya existía, se elimina.
+
+        Args:
+            df (pd.DataFrame): Propiedades con 'property_id' y las features (y opcionalmente
+                'neighborhood' / 'property_type'). Si un id se repite gana la última fila.
+
+        Returns:
+            Dict[str, int]: Número de filas 'inserted', 'updated' y 'skipped'.
+        """
+        columns = ["property_id"] + self.features + [c for c in STORE_TIERS if c in df.columns]
+        df = df[list(dict.fromkeys(columns))].drop_duplicates("property_id", keep="last")
+        complete = df[["property_id"] + self.features].notna().all(axis=1).to_numpy()
+        incomplete_ids = df.loc[~complete, "property_id"].tolist()
+        df = df[complete]
+
+        with self._lock:
+            ids = df["property_id"].tolist()
+            slots = np.array([self._slots.get(i, -1) for i in ids], dtype=np.int64)
+            new = np.flatnonzero(slots < 0)
+            reused = self._free[-len(new):] if len(new) else []
+            del self._free[len(self._free) - len(reused):]
+            fresh = len(new) - len(reused)
+            self._grow(self._size + fresh)
+            slots[new] = np.concatenate(
+                [np.array(reused[::-1], dtype=np.int64), np.arange(self._size, self._size + fresh)]
+            )
+            self._size += fresh
+
+            raw = df[self.features].to_numpy(dtype=np.float64)
+            self._raw[slots] = raw
+            self._X[slots] = (raw - self.offset_) * self.scale_
+            for j, col in enumerate(STORE_TIERS):
+                if col in df.columns:
+                    self._codes[slots, j] = self._encode(df[col], col)
+                else:
+                    # Sin la columna, las actualizaciones conservan su código
+                    self._codes[slots[new], j] = 0
+            self._ids[slots] = np.array(ids, dtype=object)
+            self._alive[slots] = True
+            for i in new:
+                self._slots[ids[i]] = int(slots[i])
+
+            self._delete(incomplete_ids)
+            self.generation += 1
+        return {
+            "inserted": len(new),
+            "updated": len(ids) - len(new),
+            "skipped": len(incomplete_ids),
+        }
+
+    def delete(self, property_ids: Sequence[Any]) -> int:
+        """
+        Elimina propiedades (los ids desconocidos se ignoran).
+
+        Returns:
+            int: Número de propiedades eliminadas.
+        """
+        with self._lock:
+            removed = self._delete(property_ids)
+            if removed:
+                self.generation += 1
+        return removed
+
+    def _delete(self, property_ids: Sequence[Any]) -> int:
+        slots = [self._slots.pop(i) for i in property_ids if i in self._slots]
+        if slots:
+            self._alive[slots] = False
+            self._ids[slots] = None
+            self._free.extend(slots)
+        return len(slots)
+
+    def refit(self) -> None:
+        """
+        Reajusta el escalado con las propiedades vivas y compacta los arreglos (elimina los
+        tombstones). Es la única operación que cambia el escalado; pensada para correr de
+        forma programada (ver drift). Sin propiedades vivas sólo compacta.
+        """
+        with self._lock:
+            live = np.flatnonzero(self._alive[: self._size])
+            ids, raw, codes = self._ids[live], self._raw[live], self._codes[live]
+            if len(live):
+                self.offset_, self.scale_ = fit_scaling(raw, self.scaling)
+            self._allocate(max(2 * len(live), MIN_CAPACITY, self.capacity))
+            self._write_compact(ids, raw, codes)
+            self.generation += 1
+
+    def _write_compact(self, ids: np.ndarray, raw: np.ndarray, codes: np.ndarray) -> None:
+        n = len(ids)
+        self._ids[:n] = ids
+        self._raw[:n] = raw
+        self._X[:n] = (raw - self.offset_) * self.scale_
+        self._codes[:n] = codes
+        self._alive[:n] = True
+        self._size = n
+        self._slots = {pid: i for i, pid in enumerate(ids.tolist())}
+
+    def drift(self) -> Dict[str, float]:
+        """
+        Qué tanto se alejó el escalado congelado del que tendrían los datos actuales, en
+        unidades escaladas: 'offset' (máximo desplazamiento del origen) y 'scale' (máximo cambio
+        relativo de la escala), más la fracción de slots que son 'tombstones'.
+
+        El resultado se guarda por versión, así que consultarlo sin cambios en los datos no
+        recorre el almacén. Sin propiedades vivas no hay escalado contra el cual comparar y el
+        desplazamiento se reporta como 0.
+        """
+        with self._lock:
+            version = self.version
+            if self._drift is not None and self._drift[0] == version:
+                return dict(self._drift[1])
+            live = self._alive[: self._size]
+            drift = {"offset": 0.0, "scale": 0.0}
+            if live.any():
+                offset, scale = fit_scaling(self._raw[: self._size][live], self.scaling)
+                drift = {
+                    "offset": float(np.max(np.abs(offset - self.offset_) * self.scale_)),
+                    "scale": float(np.max(np.abs(self.scale_ / scale - 1))),
+                }
+            drift["tombstones"] = float(1 - live.mean()) if self._size else 0.0
+            self._drift = (version, drift)
+            return dict(drift)
+
+    def search(
+        self,
+        input_dict: Dict[str, Any],
+        n: int = 5,
+        same: Optional[Sequence[str]] = None,
+        exclude: Optional[Any] = None,
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Busca los n vecinos de una propiedad por distancia Euclidiana en el espacio escalado.
+
+        Args:
+            input_dict (Dict[str, Any]): Características de la propiedad de entrada.
+            n (int): Número de vecinos.
+            same (Optional[Sequence[str]]): Columnas de STORE_TIERS que deben coincidir con
+                input_dict (por ejemplo ("neighborhood", "property_type")).
+            exclude (Optional[Any]): 'property_id' a omitir (la propia propiedad).
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray, np.ndarray]: 'property_id', features sin escalar y
+                'similarity_score' de los vecinos, de más a menos similar.
+        """
+        vec = np.array([input_dict[f] for f in self.features], dtype=np.float64)
+        q = (vec - self.offset_) * self.scale_
+        with self._lock:
+            size = self._size
+            valid = self._alive[:size].copy()
+            for col in same or ():
+                j = STORE_TIERS.index(col)
+                code = self._categories[col].get(input_dict.get(col), -1)
+                valid &= self._codes[:size, j] == code
+            if exclude is not None and exclude in self._slots:
+                valid[self._slots[exclude]] = False
+            candidates = np.flatnonzero(valid)
+            diff = self._X[candidates] - q
+            distances = np.sqrt(np.einsum("ij,ij->i", diff, diff))
+            best = top_k_positions(distances, n)
+            top = candidates[best]
+            return self._ids[top], self._raw[top], distances[best]
+
+    def query(
+        self,
+        input_dict: Dict[str, Any],
+        n: int = 5,
+        same: Optional[Sequence[str]] = None,
+        exclude: Optional[Any] = None,
+    ) -> pd.DataFrame:
+        """
+        Devuelve las n propiedades más similares (mismo formato que get_similars_euclidean_*).
+        """
+        ids, raw, scores = self.search(input_dict, n, same, exclude)
+        columns = {f: raw[:, j] for j, f in enumerate(self.features)}
+        return pd.DataFrame({"property_id": ids, **columns, "similarity_score": scores})
+
+    def snapshot(self, path: Union[str, Path]) -> None:
+        """
+        Guarda el estado completo (filas vivas, escalado congelado, diccionarios de categorías
+        y versión) en un .npz; el archivo se reemplaza de forma atómica.
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            live = np.flatnonzero(self._alive[: self._size])
+            meta = {
+                "features": self.features,
+                "scaling": self.scaling,
+                "generation": self.generation,
+                "epoch": self._epoch,
+                "categories": {
+                    col: [[_plain(v), code] for v, code in lookup.items()]
+                    for col, lookup in self._categories.items()
+                },
+            }
+            arrays = {
+                "ids": np.array(self._ids[live].tolist()),
+                "raw": self._raw[live],
+                "codes": self._codes[live],
+                "offset": self.offset_,
+                "scale": self.scale_,
+                "meta": np.array(json.dumps(meta)),
+            }
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp, path)
+
+    @classmethod
+    def restore(cls, path: Union[str, Path]) -> "ComparableStore":
+        """
+        Carga un almacén guardado con snapshot (mismo escalado y misma versión).
+        """
+        with np.load(path) as data:
+            meta = json.loads(str(data["meta"]))
+            store = cls.__new__(cls)
+            store.features = meta["features"]
+            store.scaling = meta["scaling"]
+            store.generation = meta["generation"]
+            store._epoch = meta["epoch"]
+            store._lock = threading.RLock()
+            store._drift = None
+            store._categories = {
+                col: {v: code for v, code in pairs} for col, pairs in meta["categories"].items()
+            }
+            store.offset_, store.scale_ = data["offset"], data["scale"]
+            ids = np.empty(len(data["ids"]), dtype=object)
+            ids[:] = data["ids"].tolist()
+            store._allocate(max(2 * len(ids), MIN_CAPACITY))
+            store._write_compact(ids, data["raw"], data["codes"])
+        return store
+
+
+def _plain(value: Any) -> Any:
+    return value.item() if isinstance(value, np.generic) else value
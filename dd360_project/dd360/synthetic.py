@@ -0,0 +1,130 @@
+import numpy as np
+import pandas as pd
+
+# (neighborhood, id_neighborhood, listings in the raw sample, median latitude, median longitude)
+NEIGHBORHOODS = [
+    ("ROMA NORTE", 11819, 824, 19.4185, -99.1622),
+    ("JUAREZ", 11818, 399, 19.4268, -99.1618),
+    ("HIPODROMO", 11802, 368, 19.4094, -99.1710),
+    ("CUAUHTEMOC", 11817, 355, 19.4301, -99.1691),
+    ("ROMA SUR", 11822, 334, 19.4058, -99.1640),
+    ("CONDESA", 11803, 286, 19.4150, -99.1774),
+    ("SANTA MARIA LA RIBERA", 11813, 254, 19.4474, -99.1586),
+    ("CENTRO", 11800, 223, 19.4324, -99.1410),
+    ("TABACALERA", 11801, 212, 19.4356, -99.1537),
+    ("SAN RAFAEL", 11816, 202, 19.4373, -99.1618),
+    ("DOCTORES", 11820, 193, 19.4159, -99.1497),
+    ("HIPODROMO DE LA CONDESA", 11804, 142, 19.4091, -99.1802),
+    ("GUERRERO", 11811, 136, 19.4445, -99.1436),
+    ("BUENAVISTA", 11812, 58, 19.4431, -99.1498),
+    ("OBRERA", 11824, 55, 19.4148, -99.1394),
+    ("BUENOS AIRES", 11823, 52, 19.4055, -99.1482),
+    ("PERALVILLO", 11806, 48, 19.4613, -99.1335),
+    ("MORELOS", 11805, 40, 19.4473, -99.1314),
+    ("ALGARIN", 11830, 38, 19.4053, -99.1398),
+    ("CENTRO URBANO BENITO JUAREZ", 11821, 36, 19.4096, -99.1576),
+    ("SAN SIMON TOLNAHUAC", 11833, 34, 19.4576, -99.1436),
+    ("UNIDAD HAB NONOALCO TLATELOLCO", 11832, 30, 19.4533, -99.1421),
+    ("VALLE GOMEZ", 11807, 29, 19.4586, -99.1239),
+    ("ATLAMPA", 11815, 28, 19.4558, -99.1569),
+    ("ASTURIAS", 11827, 26, 19.4047, -99.1311),
+    ("SANTA MARIA INSURGENTES", 11814, 24, 19.4606, -99.1483),
+    ("TRANSITO", 11825, 21, 19.4181, -99.1318),
+    ("AMPL ASTURIAS", 11831, 19, 19.4065, -99.1300),
+    ("VISTA ALEGRE", 11828, 15, 19.4106, -99.1339),
+    ("ESPERANZA", 11826, 11, 19.4195, -99.1291),
+    ("EX HIPODROMO DE PERALVILLO", 11808, 10, 19.4568, -99.1354),
+    ("FELIPE PESCADOR", 11810, 7, 19.4547, -99.1243),
+    ("PAULINO NAVARRO", 11829, 3, 19.4125, -99.1306),
+    ("MAZA", 11809, 1, 19.4542, -99.1272),
+]
+
+# Share of missing values per column in data/raw/cuahutemoc_properties.csv
+MISSING_RATES = {
+    "construction_surface": 0.002,
+    "num_bathrooms": 0.017,
+    "num_parking_lots": 0.192,
+    "num_bedrooms": 0.020,
+    "built_year": 0.117,
+    "conservation_status": 0.149,
+}
+
+RAW_COLUMNS = [
+    "property_id", "listing_type", "property_type", "url_ad", "price", "terrain_surface",
+    "construction_surface", "num_bathrooms", "num_parking_lots", "num_bedrooms", "built_year",
+    "conservation_status", "latitude", "longitude", "id_neighborhood", "neighborhood",
+    "has_garden", "has_gym",
+]
+
+
+def generate_properties(n_rows: int, seed: int = 0) -> pd.DataFrame:
+    """
+    Generate synthetic raw listings with the columns of references/data_dictionary.txt.
+
+    Neighborhood frequencies, coordinates, price per m2, surfaces, build years and missing
+    value rates follow the distributions of data/raw/cuahutemoc_properties.csv, so the output
+    can go through clean_property_data and engineer_features like the real file. Generation is
+    fully vectorized (1M rows take a few seconds) and deterministic for a given seed.
+
+    Parameters:
+        n_rows (int): Number of listings to generate.
+        seed (int): Random seed.
+
+    Returns:
+        pd.DataFrame: Raw property-level data with the RAW_COLUMNS columns.
+    """
+    rng = np.random.default_rng(seed)
+
+    names, ids, counts, lats, lons = (np.array(col) for col in zip(*NEIGHBORHOODS))
+    neigh = rng.choice(len(names), size=n_rows, p=counts / counts.sum())
+    is_house = rng.random(n_rows) < 0.1
+
+    # Surfaces and price: log-normal around the medians of the raw sample
+    construction = np.exp(rng.normal(np.where(is_house, 5.5, 4.38), 0.45))
+    construction = np.clip(np.round(construction), 25, 1124)
+    terrain = np.clip(np.round(construction * rng.uniform(0.5, 1.2, n_rows)), 32, 822)
+    terrain = np.where(is_house & (rng.random(n_rows) < 0.89), terrain, np.nan)
+    price_per_m2 = np.exp(rng.normal(11.03, 0.4, n_rows))
+    price = np.clip(np.round(construction * price_per_m2, -3), 850_000, 85_000_000)
+
+    bedrooms = np.clip(np.round(construction / 45 + rng.normal(0, 0.6, n_rows)), 0, 9)
+    bathrooms = np.clip(np.round(bedrooms * 0.7 + rng.normal(0.5, 0.5, n_rows)), 1, 9)
+    parking = np.clip(rng.poisson(np.where(is_house, 2.0, 1.2)), 0, 10).astype(float)
+
+    # Build years: most listings are new developments, the rest spread since 1950
+    built_year = np.where(
+        rng.random(n_rows) < 0.45,
+        rng.integers(2023, 2029, n_rows),
+        rng.integers(1950, 2023, n_rows),
+    ).astype(float)
+    conservation = np.clip(1 - rng.beta(1.2, 9, n_rows), 0.248, 0.9925)
+
+    property_ids = rng.integers(0, 2**63, size=(n_rows, 2), dtype=np.int64)
+    df = pd.DataFrame(
+        {
+            "property_id": [f"{a:016x}{b:016x}" for a, b in property_ids],
+            "listing_type": "for-sale",
+            "property_type": np.where(is_house, "house", "apartment"),
+            "url_ad": [f"https://example.com/listings/{i}" for i in range(n_rows)],
+            "price": price,
+            "terrain_surface": terrain,
+            "construction_surface": construction,
+            "num_bathrooms": bathrooms,
+            "num_parking_lots": parking,
+            "num_bedrooms": bedrooms,
+            "built_year": built_year,
+            "conservation_status": conservation,
+            "latitude": lats[neigh] + rng.normal(0, 0.0018, n_rows),
+            "longitude": lons[neigh] + rng.normal(0, 0.0027, n_rows),
+            "id_neighborhood": ids[neigh].astype(np.int64),
+            "neighborhood": names[neigh],
+            "has_garden": np.where(rng.random(n_rows) < 0.26, 1.0, np.nan),
+            "has_gym": np.where(rng.random(n_rows) < 0.32, 1.0, np.nan),
+        },
+        columns=RAW_COLUMNS,
+    )
+
+    for col, rate in MISSING_RATES.items():
+        df.loc[rng.random(n_rows) < rate, col] = np.nan
+
+    return df
@@ -1,5 +1,20 @@
-import pandas as pd
+import json
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Union
+
 import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+NUM_COLS = [
+    'construction_surface', 'terrain_surface',
+    'num_bathrooms', 'num_parking_lots',
+    'num_bedrooms', 'built_year', 'conservation_status'
+]
+BINARY_COLS = ['has_garden', 'has_gym']
+CLIP_COLS = ['price', 'construction_surface', 'terrain_surface']
+INT_COLS = ['num_bathrooms', 'num_bedrooms', 'num_parking_lots', 'built_year']
 
 
 def fill_numerical_with_group_median(df: pd.DataFrame, column: str, group_col: str) -> pd.Series:
@@ -23,53 +38,412 @@ def clean_property_data(df: pd.DataFrame) -> pd.DataFrame:
     """
     Clean and preprocess property-level data without dropping rows.
 
+    The statistics (group medians, clip thresholds) are learned from `df` itself; use a
+    PropertyCleaner fitted once on the history to clean new batches consistently.
+
     Parameters:
         df (pd.DataFrame): Raw property-level data.
 
     Returns:
         pd.DataFrame: Cleaned and preprocessed DataFrame.
     """
-    df = df.copy()
-
-    # --- Standardize string columns ---
-    df['neighborhood'] = df['neighborhood'].str.upper().str.strip()
-    df['property_type'] = df['property_type'].str.lower().str.strip()
-
-    # --- Fill missing categorical values ---
-    df['neighborhood'] = df['neighborhood'].fillna('SIN_DATO')
-    df['property_type'] = df['property_type'].fillna('desconocido')
-
-    # --- Handle numerical columns ---
-    num_cols = [
-        'construction_surface', 'terrain_surface',
-        'num_bathrooms', 'num_parking_lots',
-        'num_bedrooms', 'built_year', 'conservation_status'
-    ]
-
-    for col in num_cols:
-        if col in df.columns:
-            df[col] = pd.to_numeric(df[col], errors='coerce')
-            df[col] = fill_numerical_with_group_median(df, col, 'neighborhood')
-
-    # --- Fill binary feature columns with 0 if missing ---
-    for col in ['has_garden', 'has_gym']:
-        if col in df.columns:
-            df[col] = df[col].fillna(0).astype(int)
-
-    # --- Clip outliers instead of removing ---
-    for col in ['price', 'construction_surface', 'terrain_surface']:
-        if col in df.columns:
-            df[col] = clip_upper_outliers(df, col)
-
-    # --- Ensure proper integer types safely ---
-    int_cols = ['num_bathrooms', 'num_bedrooms', 'num_parking_lots', 'built_year']
-    for col in int_cols:
-        if col in df.columns:
-            df[col] = df[col].fillna(df[col].median())
-            df[col] = df[col].astype(int)
-
-    # --- Reindex if property_id exists ---
-    if 'property_id' in df.columns:
-        df = df.set_index('property_id')
+    return PropertyCleaner().fit_transform(df)
+
 
+def standardize_categoricals(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Normalize and fill the neighborhood / property_type columns in place.
+    """
+    df['neighborhood'] = df['neighborhood'].str.upper().str.strip().fillna('SIN_DATO')
+    df['property_type'] = df['property_type'].str.lower().str.strip().fillna('desconocido')
     return df
+
+
+class PropertyCleaner:
+    """
+    Fitted version of clean_property_data.
+
+    fit learns the per-neighborhood and global medians of NUM_COLS and the upper clip
+    thresholds of CLIP_COLS; transform applies them row by row, so a small batch of new listings
+    is cleaned in O(batch) time exactly as it would be in a full re-clean of the history the
+    cleaner was fitted on. The learned statistics can be saved to / loaded from JSON.
+    """
+
+    def __init__(self, upper_quantile: float = 0.99, sketch_capacity: int = 4096) -> None:
+        """
+        Parameters:
+            upper_quantile (float): Quantile used to clip CLIP_COLS.
+            sketch_capacity (int): Distinct values kept exactly per sketch in fit_chunks.
+        """
+        self.upper_quantile = upper_quantile
+        self.sketch_capacity = sketch_capacity
+        self.group_medians_: Dict[str, Dict[str, float]] = {}
+        self.medians_: Dict[str, float] = {}
+        self.clip_upper_: Dict[str, float] = {}
+
+    def fit(self, df: pd.DataFrame) -> 'PropertyCleaner':
+        """
+        Learn the cleaning statistics from an in-memory DataFrame (exact).
+
+        Like clean_property_data, the clip threshold of a filled column is the quantile of the
+        column after the median fill.
+        """
+        df = standardize_categoricals(df[[c for c in df.columns if c != 'property_id']].copy())
+
+        self.group_medians_, self.medians_, self.clip_upper_ = {}, {}, {}
+        for col in NUM_COLS:
+            if col in df.columns:
+                values = pd.to_numeric(df[col], errors='coerce')
+                group_medians = values.groupby(df['neighborhood']).median()
+                self.group_medians_[col] = group_medians.to_dict()
+                self.medians_[col] = values.median()
+                df[col] = values.fillna(df['neighborhood'].map(group_medians)).fillna(
+                    self.medians_[col]
+                )
+
+        for col in CLIP_COLS:
+            if col in df.columns:
+                self.clip_upper_[col] = df[col].quantile(self.upper_quantile)
+        return self
+
+    def fit_chunks(self, chunks: Iterator[pd.DataFrame]) -> 'PropertyCleaner':
+        """
+        Learn the cleaning statistics from a stream of chunks with mergeable quantile sketches.
+
+        Exact while no sketch exceeds `sketch_capacity` distinct values, approximate otherwise.
+        The clip quantile of a filled column includes the filled values (each neighborhood
+        contributes its missing count at its median).
+
+        Parameters:
+            chunks (Iterator[pd.DataFrame]): Raw property-level data in chunks.
+
+        Returns:
+            PropertyCleaner: The fitted cleaner.
+        """
+        group_sketches: Dict[str, Dict[str, QuantileSketch]] = {col: {} for col in NUM_COLS}
+        missing: Dict[str, Dict[str, int]] = {col: {} for col in NUM_COLS}
+        sketches: Dict[str, QuantileSketch] = {}
+
+        for chunk in chunks:
+            chunk = standardize_categoricals(chunk.copy())
+            for col in dict.fromkeys(NUM_COLS + CLIP_COLS):
+                if col in chunk.columns:
+                    chunk[col] = pd.to_numeric(chunk[col], errors='coerce')
+                    sketch = sketches.setdefault(col, QuantileSketch(self.sketch_capacity))
+                    sketch.update(chunk[col])
+
+            for neighborhood, group in chunk.groupby('neighborhood', sort=False):
+                for col in NUM_COLS:
+                    if col not in group.columns:
+                        continue
+                    values = group[col].to_numpy(dtype=np.float64)
+                    sketches_by_group = group_sketches[col]
+                    if neighborhood not in sketches_by_group:
+                        sketches_by_group[neighborhood] = QuantileSketch(self.sketch_capacity)
+                    sketches_by_group[neighborhood].update(values)
+                    n_missing = int(np.isnan(values).sum())
+                    missing[col][neighborhood] = missing[col].get(neighborhood, 0) + n_missing
+
+        self.medians_ = {
+            col: sketch.quantile(0.5) for col, sketch in sketches.items() if col in NUM_COLS
+        }
+        self.group_medians_ = {
+            col: {neigh: sketch.quantile(0.5) for neigh, sketch in group_sketches[col].items()}
+            for col in self.medians_
+        }
+
+        self.clip_upper_ = {}
+        for col in CLIP_COLS:
+            if col not in sketches:
+                continue
+            sketch = sketches[col]
+            if col in self.medians_:
+                # Distribution after the fill: observed values plus each group's fill value
+                fills = pd.Series(self.group_medians_[col], dtype=np.float64).fillna(
+                    self.medians_[col]
+                )
+                counts = pd.Series(missing[col]).reindex(fills.index)
+                sketch = QuantileSketch(self.sketch_capacity).merge(sketch).update(fills, counts)
+            self.clip_upper_[col] = sketch.quantile(self.upper_quantile)
+        return self
+
+    def transform(self, df: pd.DataFrame, set_index: bool = True) -> pd.DataFrame:
+        """
+        Clean a DataFrame with the fitted statistics.
+
+        Parameters:
+            df (pd.DataFrame): Raw property-level data.
+            set_index (bool): Use property_id as the index (as clean_property_data does).
+
+        Returns:
+            pd.DataFrame: Cleaned and preprocessed DataFrame.
+        """
+        df = standardize_categoricals(df.copy())
+
+        # --- Handle numerical columns ---
+        for col in NUM_COLS:
+            if col in df.columns:
+                df[col] = pd.to_numeric(df[col], errors='coerce')
+                group_median = df['neighborhood'].map(self.group_medians_.get(col, {}))
+                df[col] = df[col].fillna(group_median).fillna(self.medians_.get(col, np.nan))
+
+        # --- Fill binary feature columns with 0 if missing ---
+        for col in BINARY_COLS:
+            if col in df.columns:
+                df[col] = df[col].fillna(0).astype(int)
+
+        # --- Clip outliers instead of removing ---
+        for col in CLIP_COLS:
+            if col in df.columns and col in self.clip_upper_:
+                upper = self.clip_upper_[col]
+                df[col] = np.where(df[col] > upper, upper, df[col])
+
+        # --- Ensure proper integer types safely ---
+        for col in INT_COLS:
+            if col in df.columns:
+                df[col] = df[col].astype(int)
+
+        # --- Reindex if property_id exists ---
+        if set_index and 'property_id' in df.columns:
+            df = df.set_index('property_id')
+
+        return df
+
+    def fit_transform(self, df: pd.DataFrame) -> pd.DataFrame:
+        return self.fit(df).transform(df)
+
+    def to_dict(self) -> dict:
+        """
+        Learned statistics as plain JSON-compatible values (NaN becomes None).
+        """
+        def clean(value):
+            return None if pd.isna(value) else float(value)
+
+        return {
+            'upper_quantile': self.upper_quantile,
+            'sketch_capacity': self.sketch_capacity,
+            'group_medians': {
+                col: {str(neigh): clean(v) for neigh, v in medians.items()}
+                for col, medians in self.group_medians_.items()
+            },
+            'medians': {col: clean(v) for col, v in self.medians_.items()},
+            'clip_upper': {col: clean(v) for col, v in self.clip_upper_.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, state: dict) -> 'PropertyCleaner':
+        def restore(value):
+            return np.nan if value is None else value
+
+        cleaner = cls(state['upper_quantile'], state['sketch_capacity'])
+        cleaner.group_medians_ = {
+            col: {neigh: restore(v) for neigh, v in medians.items()}
+            for col, medians in state['group_medians'].items()
+        }
+        cleaner.medians_ = {col: restore(v) for col, v in state['medians'].items()}
+        cleaner.clip_upper_ = {col: restore(v) for col, v in state['clip_upper'].items()}
+        return cleaner
+
+    def save(self, path: Union[str, Path]) -> None:
+        """
+        Save the fitted statistics as JSON.
+        """
+        Path(path).write_text(json.dumps(self.to_dict(), indent=2, ensure_ascii=False))
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> 'PropertyCleaner':
+        """
+        Load a cleaner saved with save.
+        """
+        return cls.from_dict(json.loads(Path(path).read_text()))
+
+
+class QuantileSketch:
+    """
+    Mergeable quantile sketch over a stream of values.
+
+    Distinct values are kept with their counts, so while the number of distinct values stays
+    under `capacity` quantiles are exact (same linear interpolation as pandas). Beyond that the
+    sorted values are compressed into `capacity` bins (weighted mean per bin), narrower towards
+    the tails, which bounds memory and keeps the rank error around 1 / capacity. Sketches built on
+    different chunks can be merged, and values can carry weights (e.g. n copies of a fill value).
+    """
+
+    def __init__(self, capacity: int = 4096) -> None:
+        self.capacity = capacity
+        self.values = np.empty(0, dtype=np.float64)
+        self.weights = np.empty(0, dtype=np.float64)
+        self.exact = True
+
+    @property
+    def count(self) -> float:
+        return float(self.weights.sum())
+
+    def update(self, values, weights=None) -> 'QuantileSketch':
+        """
+        Add values (NaNs are ignored), optionally with a weight per value.
+        """
+        values = np.asarray(values, dtype=np.float64).ravel()
+        weights = np.ones(len(values)) if weights is None else np.broadcast_to(
+            np.asarray(weights, dtype=np.float64), values.shape
+        )
+        keep = ~np.isnan(values) & (weights > 0)
+        if not keep.any():
+            return self
+
+        values = np.concatenate([self.values, values[keep]])
+        weights = np.concatenate([self.weights, weights[keep]])
+        self.values, inverse = np.unique(values, return_inverse=True)
+        self.weights = np.bincount(inverse.ravel(), weights=weights)
+        if len(self.values) > self.capacity:
+            self._compress()
+        return self
+
+    def merge(self, other: 'QuantileSketch') -> 'QuantileSketch':
+        """
+        Merge another sketch into this one.
+        """
+        self.exact = self.exact and other.exact
+        return self.update(other.values, other.weights)
+
+    def _compress(self) -> None:
+        cumulative = np.cumsum(self.weights)
+        midpoints = (cumulative - self.weights / 2) / cumulative[-1]
+        # Arcsine scale (as in t-digest): narrower bins near q=0 and q=1, where clip thresholds are
+        scale = np.arcsin(2 * midpoints - 1) / np.pi + 0.5
+        bins = np.minimum((scale * self.capacity).astype(np.int64), self.capacity - 1)
+        weights = np.bincount(bins, weights=self.weights)
+        means = np.bincount(bins, weights=self.values * self.weights)
+        used = weights > 0
+        self.values = means[used] / weights[used]
+        self.weights = weights[used]
+        self.exact = False
+
+    def quantile(self, q: float) -> float:
+        """
+        Quantile with linear interpolation between the closest ranks (pandas' default).
+        """
+        if len(self.values) == 0:
+            return np.nan
+        cumulative = np.cumsum(self.weights)
+        position = (cumulative[-1] - 1) * q
+        lower = np.floor(position)
+        upper = min(lower + 1, cumulative[-1] - 1)
+        ranks = np.searchsorted(cumulative, [lower, upper], side='right')
+        a, b = self.values[np.minimum(ranks, len(self.values) - 1)]
+        t = position - lower
+        # Same interpolation formula as numpy's quantile (symmetric around t = 0.5)
+        return float(a + (b - a) * t) if t < 0.5 else float(b - (b - a) * (1 - t))
+
+
+def iter_raw_chunks(
+    file_path: Union[str, Path], chunksize: int = 100_000
+) -> Iterator[pd.DataFrame]:
+    """
+    Read a CSV or Parquet file as a sequence of DataFrames of at most `chunksize` rows.
+    """
+    file_path = Path(file_path)
+    ext = file_path.suffix.lower()
+    if ext == '.csv':
+        yield from pd.read_csv(file_path, chunksize=chunksize)
+    elif ext == '.parquet':
+        for batch in pq.ParquetFile(file_path).iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+    else:
+        raise ValueError(f"Unsupported file extension: {ext}. Only .csv and .parquet supported.")
+
+
+def collect_cleaning_stats(
+    chunks: Iterator[pd.DataFrame],
+    upper_quantile: float = 0.99,
+    sketch_capacity: int = 4096,
+) -> Dict[str, dict]:
+    """
+    First streaming pass: gather the statistics clean_property_data computes in memory.
+
+    Thin wrapper over PropertyCleaner.fit_chunks that returns the learned statistics as a dict.
+
+    Parameters:
+        chunks (Iterator[pd.DataFrame]): Raw property-level data in chunks.
+        upper_quantile (float): Quantile used to clip CLIP_COLS.
+        sketch_capacity (int): Distinct values kept exactly per sketch.
+
+    Returns:
+        Dict[str, dict]: 'group_medians' ({col: {neighborhood: median}}), 'medians'
+        ({col: global median}) and 'clip_upper' ({col: threshold}).
+    """
+    cleaner = PropertyCleaner(upper_quantile, sketch_capacity).fit_chunks(chunks)
+    return {
+        'group_medians': cleaner.group_medians_,
+        'medians': cleaner.medians_,
+        'clip_upper': cleaner.clip_upper_,
+    }
+
+
+def apply_cleaning_stats(df: pd.DataFrame, stats: Dict[str, dict]) -> pd.DataFrame:
+    """
+    Second streaming pass: clean one chunk with statistics from collect_cleaning_stats.
+
+    Thin wrapper over PropertyCleaner.transform.
+
+    Parameters:
+        df (pd.DataFrame): Raw property-level data (one chunk).
+        stats (Dict[str, dict]): Output of collect_cleaning_stats.
+
+    Returns:
+        pd.DataFrame: Cleaned chunk (property_id stays a column).
+    """
+    cleaner = PropertyCleaner()
+    cleaner.group_medians_ = stats['group_medians']
+    cleaner.medians_ = stats['medians']
+    cleaner.clip_upper_ = stats['clip_upper']
+    return cleaner.transform(df, set_index=False)
+
+
+def clean_property_data_streaming(
+    input_path: Union[str, Path],
+    output_path: Union[str, Path],
+    chunksize: int = 100_000,
+    cleaner: Optional[PropertyCleaner] = None,
+    upper_quantile: float = 0.99,
+    sketch_capacity: int = 4096,
+) -> PropertyCleaner:
+    """
+    Clean a raw CSV / Parquet file in two streaming passes and write the result as Parquet.
+
+    Pass one fits a PropertyCleaner with mergeable sketches (PropertyCleaner.fit_chunks); pass
+    two cleans chunk by chunk and appends each chunk to the output file, so peak memory depends
+    on `chunksize` and not on the file size. While no sketch exceeds `sketch_capacity` distinct
+    values the output equals clean_property_data(df).reset_index(); larger files get approximate
+    medians / thresholds. With an already fitted `cleaner` pass one is skipped (e.g. to clean a
+    daily delta with the statistics of the full history).
+
+    Parameters:
+        input_path (str or Path): Raw data file (.csv or .parquet).
+        output_path (str or Path): Parquet file to write.
+        chunksize (int): Rows per chunk.
+        cleaner (PropertyCleaner, optional): Fitted cleaner to use instead of fitting one.
+        upper_quantile (float): Quantile used to clip CLIP_COLS.
+        sketch_capacity (int): Distinct values kept exactly per sketch.
+
+    Returns:
+        PropertyCleaner: The cleaner used to clean the data.
+    """
+    if cleaner is None:
+        cleaner = PropertyCleaner(upper_quantile, sketch_capacity).fit_chunks(
+            iter_raw_chunks(input_path, chunksize)
+        )
+
+    writer: Optional[pq.ParquetWriter] = None
+    try:
+        for chunk in iter_raw_chunks(input_path, chunksize):
+            cleaned = cleaner.transform(chunk, set_index=False)
+            table = pa.Table.from_pandas(cleaned, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(output_path, table.schema)
+            writer.write_table(table.cast(writer.schema))
+    finally:
+        if writer is not None:
+            writer.close()
+
+    return cleaner
@@ -0,0 +1,104 @@
+import json
+import threading
+import urllib.request
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from webapp.api import ComparablesServer, ComparablesService
+
+# Dos colonias a ~1.5 km: un radio de 0.5 km alrededor de una no alcanza a la otra
+CENTERS = {"ROMA NORTE": (19.415, -99.162), "JUAREZ": (19.428, -99.158)}
+PROPERTY = {
+    "property_type": "Departamento", "num_bedrooms": 2, "num_bathrooms": 1, "age": 10,
+    "total_surface": 80,
+}
+
+
+def listings(rows_per_neighborhood: int = 200) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    frames = []
+    for neighborhood, (lat, lon) in CENTERS.items():
+        n = rows_per_neighborhood
+        frames.append(pd.DataFrame({
+            "neighborhood": neighborhood,
+            "property_type": rng.choice(["Casa", "Departamento"], n),
+            "price_per_m2": rng.uniform(20_000, 90_000, n),
+            "num_bedrooms": rng.integers(1, 5, n),
+            "num_bathrooms": rng.integers(1, 4, n),
+            "age": rng.integers(0, 60, n),
+            "has_amenities": rng.integers(0, 2, n),
+            "url_ad": "https://listing.example",
+            "price": rng.uniform(1e6, 9e6, n),
+            "total_surface": rng.uniform(40, 300, n),
+            "latitude": lat + rng.normal(0, 0.001, n),
+            "longitude": lon + rng.normal(0, 0.001, n),
+        }))
+    df = pd.concat(frames, ignore_index=True)
+    df.insert(0, "property_id", np.arange(len(df)))
+    return df
+
+
+@pytest.fixture(scope="module")
+def df():
+    return listings()
+
+
+@pytest.fixture
+def server(df):
+    httpd = ComparablesServer(("127.0.0.1", 0), ComparablesService(df, "test"), quiet=True)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def post(server, path: str, payload: dict) -> dict:
+    request = urllib.request.Request(
+        f"http://127.0.0.1:{server.server_port}{path}",
+        data=json.dumps(payload).encode(),
+        headers={"Content-Type": "application/json"},
+    )
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return json.loads(response.read())
+
+
+def neighborhoods(df: pd.DataFrame, comparables: list) -> set:
+    ids = [c["property_id"] for c in comparables]
+    return set(df.set_index("property_id").loc[ids, "neighborhood"])
+
+
+@pytest.mark.parametrize(
+    "method", ["euclidean_standard", "euclidean_minmax", "hierarchical", "combined_geo"]
+)
+def test_radius_searches_are_cached_per_neighborhood(server, df, method):
+    payloads = {
+        neighborhood: {
+            "method": method, "n": 5, "max_radius_km": 0.5,
+            "property": {**PROPERTY, "neighborhood": neighborhood},
+        }
+        for neighborhood in CENTERS
+    }
+
+    first = post(server, "/comparables", payloads["ROMA NORTE"])["comparables"]
+    second = post(server, "/comparables", payloads["JUAREZ"])["comparables"]
+
+    assert neighborhoods(df, first) == {"ROMA NORTE"}
+    assert neighborhoods(df, second) == {"JUAREZ"}
+    # Mismo resultado que sin caché
+    assert second == ComparablesService(df, "test").single(payloads["JUAREZ"])["comparables"]
+    assert server.service.cache.stats()["hits"] == 0
+
+
+def test_radius_is_centred_on_the_client_coordinates(server, df):
+    lat, lon = CENTERS["JUAREZ"]
+    payload = {
+        "method": "euclidean_minmax", "n": 5, "max_radius_km": 0.5,
+        "property": {**PROPERTY, "neighborhood": "ROMA NORTE", "latitude": lat, "longitude": lon},
+    }
+
+    comparables = post(server, "/comparables", payload)["comparables"]
+
+    assert neighborhoods(df, comparables) == {"JUAREZ"}
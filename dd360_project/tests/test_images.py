@@ -0,0 +1,118 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import socket
+import struct
+import threading
+import time
+
+import pytest
+
+from dd360.images import ImageCache, ImageResolver
+
+IMAGE = "https://img.example/listing.jpg"
+HEAD_OK = f'<html><head><meta property="og:image" content="{IMAGE}"></head>'.encode()
+HEAD_MISSING = b"<html><head><title>sin imagen</title></head>"
+BODY = b"<body>" + b"x" * 64 * 1024 + b"</body></html>"
+
+TIMEOUT = 0.5
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    Páginas de anuncio de prueba: con og:image, sin og:image, 404, una que se queda sin
+    responder a media lectura y una que corta la conexión (RST) a media lectura.
+    """
+
+    def do_GET(self) -> None:
+        self.server.hits[self.path] = self.server.hits.get(self.path, 0) + 1
+        if self.path == "/ok":
+            self._send(200, HEAD_OK + BODY)
+        elif self.path == "/missing":
+            self._send(200, HEAD_MISSING + BODY)
+        elif self.path == "/not-found":
+            self._send(404, b"not found")
+        elif self.path == "/stall":
+            self._partial(b"<html><head><title>")
+            time.sleep(TIMEOUT * 4)
+        elif self.path == "/reset":
+            self._partial(b"<html><head><title>")
+            self.connection.setsockopt(
+                socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0)
+            )
+            self.connection.close()
+        else:
+            self._send(404, b"")
+
+    def _send(self, status: int, body: bytes) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _partial(self, body: bytes) -> None:
+        # Promete más bytes de los que envía, para que el cliente se quede leyendo
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(body) + 10_000))
+        self.end_headers()
+        self.wfile.write(body)
+        self.wfile.flush()
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    httpd.daemon_threads = True
+    httpd.hits = {}
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def url(server, path: str) -> str:
+    return f"http://127.0.0.1:{server.server_port}{path}"
+
+
+@pytest.mark.parametrize(
+    "path, expected",
+    [
+        ("/ok", (IMAGE, "ok")),
+        ("/missing", (None, "missing")),
+        ("/not-found", (None, "missing")),
+        ("/stall", (None, "error")),
+        ("/reset", (None, "error")),
+    ],
+)
+def test_fetch_statuses(server, path, expected):
+    resolver = ImageResolver(timeout=TIMEOUT)
+    assert resolver.fetch(url(server, path)) == expected
+
+
+def test_images_for_falls_back_to_default_image(server):
+    resolver = ImageResolver(timeout=TIMEOUT, default_image="default.png")
+    paths = ["/ok", "/missing", "/not-found", "/stall", "/reset", "/ok"]
+
+    images = resolver.images_for([url(server, p) for p in paths] + [None, ""])
+
+    assert images == [IMAGE] + ["default.png"] * 4 + [IMAGE] + ["default.png"] * 2
+
+
+def test_negative_results_are_cached_until_their_ttl(server, tmp_path):
+    cache = ImageCache(tmp_path / "images.sqlite", missing_ttl=1.0, error_ttl=1.0)
+    resolver = ImageResolver(cache, timeout=TIMEOUT)
+    urls = [url(server, p) for p in ("/ok", "/missing", "/reset")]
+
+    resolver.resolve_many(urls)
+    resolver.resolve_many(urls)
+    assert server.hits == {"/ok": 1, "/missing": 1, "/reset": 1}
+
+    time.sleep(1.2)
+    resolver.resolve_many(urls)
+    # Los negativos vencieron y se vuelven a consultar; la imagen encontrada sigue vigente
+    assert server.hits == {"/ok": 1, "/missing": 2, "/reset": 2}
+    assert cache.get_many(urls)[urls[0]] == (IMAGE, "ok")
@@ -0,0 +1,551 @@
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+from pathlib import Path
+import threading
+import time
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import typer
+
+import dd360.compare as compare
+from dd360.config import LIVE_STORE_PATH, PROCESSED_DATA_DIR
+from dd360.index import numeric_features
+from dd360.query_cache import QueryCache
+from dd360.snapshot import APP_FEATURES, load_snapshot
+from dd360.store import STORE_TIERS, ComparableStore
+
+# Métodos de comparación expuestos por la API
+METHODS: Dict[str, Callable[..., pd.DataFrame]] = {
+    "euclidean_standard": compare.get_similars_euclidean_standard,
+    "euclidean_minmax": compare.get_similars_euclidean_minmax,
+    "hierarchical": compare.get_similars_hierarchical,
+    "combined_geo": compare.get_similars_combined_geo,
+}
+
+# Llaves de una propiedad de entrada que no son features numéricas
+NON_NUMERIC_KEYS = {"property_id", "neighborhood", "property_type", "latitude", "longitude"}
+
+# Columnas de cada comparable en las respuestas (además de 'similarity_score')
+RESPONSE_COLUMNS = [
+    "property_id", "neighborhood", "property_type", "price", "price_per_m2", "total_surface",
+    "num_bedrooms", "num_bathrooms", "age", "has_amenities", "latitude", "longitude", "url_ad",
+]
+
+MAX_N = 100
+MAX_BATCH = 10_000
+
+app = typer.Typer()
+
+
+class LatencyStats:
+    """
+    Latencias recientes por ruta (ventana de las últimas `window` peticiones), seguras entre hilos.
+    """
+
+    def __init__(self, window: int = 10_000) -> None:
+        self.window: int = window
+        self._samples: Dict[str, Deque[float]] = {}
+        self._counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def record(self, route: str, latency_ms: float) -> None:
+        with self._lock:
+            self._samples.setdefault(route, deque(maxlen=self.window)).append(latency_ms)
+            self._counts[route] = self._counts.get(route, 0) + 1
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """
+        Número de peticiones y percentiles p50 / p95 / p99 / máximo (ms) por ruta.
+        """
+        with self._lock:
+            samples = {route: np.array(values) for route, values in self._samples.items()}
+            counts = dict(self._counts)
+        summary = {}
+        for route, values in samples.items():
+            p50, p95, p99 = np.percentile(values, [50, 95, 99])
+            summary[route] = {
+                "count": counts[route],
+                "p50_ms": round(float(p50), 3),
+                "p95_ms": round(float(p95), 3),
+                "p99_ms": round(float(p99), 3),
+                "max_ms": round(float(values.max()), 3),
+            }
+        return summary
+
+
+class ComparablesService:
+    """
+    Lógica de la API: mantiene el dataset procesado y sus índices cargados en memoria y
+    responde consultas de comparables con dd360.compare.
+    """
+
+    def __init__(
+        self,
+        df: pd.DataFrame,
+        version: str = "",
+        cache: Optional[QueryCache] = None,
+        store: Optional[ComparableStore] = None,
+        store_path: Optional[Path] = None,
+    ) -> None:
+        """
+        Args:
+            df (pd.DataFrame): Dataset procesado (final_df).
+            version (str): Identificador de los datos que se reporta en /health y que forma
+                parte de la llave de la caché de búsquedas.
+            cache (Optional[QueryCache]): Caché de búsquedas compartida por /comparables y
+                /comparables/batch (por defecto una QueryCache nueva).
+            store (Optional[ComparableStore]): Almacén actualizable para las rutas /listings y
+                /comparables/live (deshabilitadas si es None).
+            store_path (Optional[Path]): Archivo de POST /listings/snapshot.
+        """
+        self.df: pd.DataFrame = df
+        self.version: str = version
+        self.cache: QueryCache = cache if cache is not None else QueryCache()
+        self.cache.set_version(version)
+        self.store: Optional[ComparableStore] = store
+        self.store_path: Path = Path(store_path or LIVE_STORE_PATH)
+        # Caché aparte: su versión es la del almacén, que cambia con cada alta o baja
+        self.live_cache: QueryCache = QueryCache()
+        # Columnas de respuesta como arreglos, para armar cada comparable sin pasar por pandas
+        self.arrays: Dict[str, np.ndarray] = {
+            c: df[c].to_numpy() for c in RESPONSE_COLUMNS if c in df.columns
+        }
+        self.latency: LatencyStats = LatencyStats()
+        self.started: float = time.time()
+
+    @classmethod
+    def from_snapshot(cls, source: Path) -> "ComparablesService":
+        """
+        Carga el dataset desde su snapshot (dd360.snapshot) y construye los índices de los
+        métodos con las features del formulario, para que la primera petición no pague su costo.
+        """
+        snapshot = load_snapshot(source)
+        service = cls(snapshot.df, snapshot.version)
+        service.warm_up()
+        return service
+
+    def warm_up(self, features: Optional[List[str]] = None) -> None:
+        """
+        Ejecuta una consulta por método para construir sus índices.
+        """
+        features = list(features or APP_FEATURES)
+        row = self.df[["neighborhood", "property_type", *features]].dropna().iloc[0]
+        for method in METHODS:
+            self.single({"method": method, "n": 1, "property": row.to_dict()})
+
+    def single(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Comparables de una propiedad.
+
+        'latitude' y 'longitude' nunca se comparan como features numéricas (salvo como
+        distancia geográfica en combined_geo). Con max_radius_km, el radio se centra en ellas
+        si la propiedad las trae y, si no, en el centroide de su 'neighborhood'.
+
+        Args:
+            payload (Dict[str, Any]): {"property": {...}, "method": "hierarchical", "n": 5,
+                "max_radius_km": null}.
+
+        Returns:
+            Dict[str, Any]: {"method", "n", "comparables": [...]}.
+        """
+        method, n = _method_and_n(payload)
+        prop = payload.get("property")
+        if not isinstance(prop, dict) or not numeric_features(prop, NON_NUMERIC_KEYS):
+            raise ValueError("'property' debe ser un objeto con al menos una feature numérica")
+        input_dict = {k: v for k, v in prop.items() if k != "property_id"}
+        features = numeric_features(input_dict, NON_NUMERIC_KEYS)
+
+        kwargs = {}
+        if payload.get("max_radius_km") is not None:
+            kwargs["max_radius_km"] = float(payload["max_radius_km"])
+
+        def compute() -> List[Dict[str, Any]]:
+            # Mismo criterio que METHODS[method], pero con posiciones: las filas se arman con
+            # los arreglos por columna, sin tomar filas del DataFrame
+            try:
+                positions, scores = compare.search(
+                    self.df, input_dict, method, n, features=features, **kwargs
+                )
+            except KeyError as e:
+                raise ValueError(f"Columna desconocida: {e}") from None
+            return self.records(positions, np.asarray(scores, dtype=float))
+
+        columns = method_columns(method, features, radius="max_radius_km" in kwargs)
+        key_input = {c: input_dict.get(c) for c in columns}
+        comparables = self.cache.get_or_compute(
+            method, key_input, n, compute, version=self.version, **kwargs
+        )
+        return {"method": method, "n": n, "comparables": comparables}
+
+    def batch(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Comparables de muchas propiedades en una sola pasada (compare.get_similars_batch).
+
+        Args:
+            payload (Dict[str, Any]): {"properties": [{...}, ...], "method": "hierarchical",
+                "n": 5, "features": [...] (opcional; por defecto las llaves numéricas de la
+                primera propiedad)}.
+
+        Returns:
+            Dict[str, Any]: {"method", "n", "features", "results": [{"subject", "comparables"}]};
+                "subject" es el 'property_id' de la propiedad o su posición en la lista.
+        """
+        method, n = _method_and_n(payload)
+        properties = payload.get("properties")
+        if not isinstance(properties, list) or not properties:
+            raise ValueError("'properties' debe ser una lista no vacía de objetos")
+        if len(properties) > MAX_BATCH:
+            raise ValueError(f"Máximo {MAX_BATCH} propiedades por petición")
+
+        subjects = pd.DataFrame(properties)
+        if "property_id" not in subjects.columns:
+            subjects["property_id"] = np.arange(len(subjects))
+        features = payload.get("features") or numeric_features(properties[0], NON_NUMERIC_KEYS)
+        required = method_columns(method, features)
+        missing = [c for c in required if c not in subjects.columns]
+        if missing:
+            raise ValueError(f"Faltan columnas en 'properties': {missing}")
+        unknown = [c for c in features if c not in self.df.columns]
+        if unknown:
+            raise ValueError(f"Features desconocidas: {unknown}")
+
+        # Cada propiedad usa la misma llave que tendría en /comparables: sólo las que no están
+        # en la caché pasan por la búsqueda por lotes
+        self.cache.set_version(self.version)
+        keys = [
+            QueryCache.make_key(method, dict(zip(required, values)), n, self.version)
+            for values in subjects[required].itertuples(index=False, name=None)
+        ]
+        comparables = [self.cache.get(key) for key in keys]
+        pending = [i for i, (found, _) in enumerate(comparables) if not found]
+        comparables = [value for _, value in comparables]
+        if pending:
+            positions, scores = compare.search_batch(
+                self.df, subjects.iloc[pending], list(features), method, n
+            )
+            for i, pos, score in zip(pending, positions, scores):
+                comparables[i] = self.records(pos[pos >= 0], score)
+                self.cache.put(keys[i], comparables[i])
+
+        results = [
+            {"subject": _plain(subject), "comparables": found}
+            for subject, found in zip(subjects["property_id"], comparables)
+        ]
+        return {"method": method, "n": n, "features": list(features), "results": results}
+
+    def live(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Comparables de una propiedad en el almacén en vivo (distancia Euclidiana con el
+        escalado congelado del almacén).
+
+        Args:
+            payload (Dict[str, Any]): {"property": {...}, "n": 5, "same": ["neighborhood",
+                "property_type"] (opcional)}; si la propiedad trae 'property_id', se omite de
+                sus propios comparables.
+
+        Returns:
+            Dict[str, Any]: {"version", "n", "comparables": [...]}.
+        """
+        store = self._live_store()
+        n = payload.get("n", 5)
+        if not isinstance(n, int) or isinstance(n, bool) or not 1 <= n <= MAX_N:
+            raise ValueError(f"'n' debe ser un entero entre 1 y {MAX_N}")
+        prop = payload.get("property")
+        if not isinstance(prop, dict):
+            raise ValueError("'property' debe ser un objeto")
+        missing = [f for f in store.features if prop.get(f) is None]
+        if missing:
+            raise ValueError(f"Faltan features en 'property': {missing}")
+        same = tuple(payload.get("same") or ())
+        unknown = [c for c in same if c not in STORE_TIERS]
+        if unknown:
+            raise ValueError(f"'same' sólo admite {list(STORE_TIERS)}: {unknown}")
+        input_dict = {k: prop.get(k) for k in [*store.features, *same]}
+        exclude = prop.get("property_id")
+
+        def compute() -> List[Dict[str, Any]]:
+            ids, raw, scores = store.search(input_dict, n, same, exclude)
+            rows = np.column_stack([raw, scores]).tolist()
+            columns = [*store.features, "similarity_score"]
+            return [
+                {"property_id": _plain(pid), **dict(zip(columns, row))}
+                for pid, row in zip(ids, rows)
+            ]
+
+        # La versión se lee antes de buscar: si entra una escritura en medio, el resultado
+        # queda guardado con la versión vieja y no se vuelve a servir
+        version = store.version
+        comparables = self.live_cache.get_or_compute(
+            "live", input_dict, n, compute, version=version, same=same, exclude=exclude
+        )
+        return {"version": version, "n": n, "comparables": comparables}
+
+    def upsert(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Altas y cambios en el almacén en vivo.
+
+        Args:
+            payload (Dict[str, Any]): {"listings": [{"property_id": ..., features,
+                "neighborhood", "property_type"}, ...]}.
+
+        Returns:
+            Dict[str, Any]: {"inserted", "updated", "skipped", "rows", "version"}.
+        """
+        store = self._live_store()
+        listings = payload.get("listings")
+        if not isinstance(listings, list) or not listings:
+            raise ValueError("'listings' debe ser una lista no vacía de objetos")
+        if len(listings) > MAX_BATCH:
+            raise ValueError(f"Máximo {MAX_BATCH} propiedades por petición")
+        df = pd.DataFrame(listings)
+        missing = [c for c in ["property_id", *store.features] if c not in df.columns]
+        if missing:
+            raise ValueError(f"Faltan columnas en 'listings': {missing}")
+        counts = store.upsert(df)
+        return {**counts, "rows": len(store), "version": store.version}
+
+    def delete(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Bajas del almacén en vivo: {"property_ids": [...]} -> {"deleted", "rows", "version"}.
+        """
+        store = self._live_store()
+        ids = payload.get("property_ids")
+        if not isinstance(ids, list):
+            raise ValueError("'property_ids' debe ser una lista")
+        deleted = store.delete(ids)
+        return {"deleted": deleted, "rows": len(store), "version": store.version}
+
+    def snapshot_store(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Guarda el almacén en vivo en store_path para restaurarlo al reiniciar la API.
+        """
+        store = self._live_store()
+        store.snapshot(self.store_path)
+        return {"path": str(self.store_path), "rows": len(store), "version": store.version}
+
+    def refit_store(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Reajusta el escalado del almacén en vivo con sus filas actuales y lo compacta (para
+        correr de forma programada, no con cada cambio).
+        """
+        store = self._live_store()
+        drift = store.drift()
+        store.refit()
+        return {"drift": drift, "rows": len(store), "version": store.version}
+
+    def _live_store(self) -> ComparableStore:
+        if self.store is None:
+            raise ValueError("El almacén en vivo no está habilitado (usa --live-store)")
+        return self.store
+
+    def records(self, positions: np.ndarray, scores: np.ndarray) -> List[Dict[str, Any]]:
+        """
+        Comparables (filas de RESPONSE_COLUMNS más 'similarity_score') como diccionarios
+        serializables: NaN -> null y tipos de NumPy -> Python.
+
+        Args:
+            positions (np.ndarray): Posiciones de las filas en df.
+            scores (np.ndarray): 'similarity_score' de cada fila.
+
+        Returns:
+            List[Dict[str, Any]]: Un diccionario por comparable.
+        """
+        columns = {c: values[positions].tolist() for c, values in self.arrays.items()}
+        columns["similarity_score"] = scores[: len(positions)].tolist()
+        return [
+            {c: _json_value(values[i]) for c, values in columns.items()}
+            for i in range(len(positions))
+        ]
+
+    def health(self) -> Dict[str, Any]:
+        health = {
+            "status": "ok",
+            "rows": len(self.df),
+            "version": self.version,
+            "uptime_s": round(time.time() - self.started, 1),
+        }
+        if self.store is not None:
+            health["live_store"] = {
+                "rows": len(self.store),
+                "version": self.store.version,
+                "drift": self.store.drift(),
+            }
+        return health
+
+    def metrics(self) -> Dict[str, Any]:
+        metrics = {"latency": self.latency.summary(), "query_cache": self.cache.stats()}
+        if self.store is not None:
+            metrics["live_cache"] = self.live_cache.stats()
+        return metrics
+
+
+def method_columns(method: str, features: List[str], radius: bool = False) -> List[str]:
+    """
+    Columnas de la propiedad de entrada que lee un método: sus features numéricas y, según el
+    método, 'neighborhood', 'property_type', 'latitude' y 'longitude'. La llave de la caché de
+    búsquedas se arma sólo con ellas, así /comparables y /comparables/batch comparten entradas
+    aunque la propiedad traiga otras llaves.
+
+    Con radius=True (búsquedas con max_radius_km) se agregan siempre 'neighborhood',
+    'latitude' y 'longitude', que ubican el centro del radio en cualquier método.
+    """
+    columns = list(features)
+    if method in ("hierarchical", "combined_geo"):
+        columns += ["neighborhood", "property_type"]
+    if method == "combined_geo" or radius:
+        columns += ["neighborhood", "latitude", "longitude"]
+    return list(dict.fromkeys(columns))
+
+
+def _method_and_n(payload: Dict[str, Any]) -> Tuple[str, int]:
+    method = payload.get("method", "hierarchical")
+    if method not in METHODS:
+        raise ValueError(f"Método no soportado: {method}. Usa uno de {list(METHODS)}.")
+    n = payload.get("n", 5)
+    if not isinstance(n, int) or isinstance(n, bool) or not 1 <= n <= MAX_N:
+        raise ValueError(f"'n' debe ser un entero entre 1 y {MAX_N}")
+    return method, n
+
+
+def _json_value(value: Any) -> Any:
+    return None if isinstance(value, float) and value != value else value
+
+
+def _plain(value: Any) -> Any:
+    return value.item() if isinstance(value, np.generic) else value
+
+
+class ComparablesHandler(BaseHTTPRequestHandler):
+    """
+    Rutas:
+        GET  /health                 Estado y tamaño del dataset cargado.
+        GET  /metrics                Latencias por ruta (p50 / p95 / p99 / máximo).
+        POST /comparables            Comparables de una propiedad (ComparablesService.single).
+        POST /comparables/batch      Comparables de muchas propiedades (ComparablesService.batch).
+        POST /comparables/live       Comparables en el almacén en vivo (ComparablesService.live).
+        POST /listings               Altas y cambios en el almacén en vivo (upsert).
+        POST /listings/delete        Bajas del almacén en vivo por 'property_id' (delete).
+        POST /listings/snapshot      Guarda el almacén en vivo en disco (snapshot_store).
+        POST /listings/refit         Reajusta el escalado del almacén en vivo (refit_store).
+
+    Cada respuesta incluye su latencia de cómputo en las cabeceras X-Response-Time-Ms y
+    Server-Timing.
+    """
+
+    server: "ComparablesServer"
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self) -> None:
+        routes = {"/health": self.server.service.health, "/metrics": self.server.service.metrics}
+        self._dispatch(routes.get(self.path.split("?")[0]))
+
+    def do_POST(self) -> None:
+        routes = {
+            "/comparables": self.server.service.single,
+            "/comparables/batch": self.server.service.batch,
+            "/comparables/live": self.server.service.live,
+            "/listings": self.server.service.upsert,
+            "/listings/delete": self.server.service.delete,
+            "/listings/snapshot": self.server.service.snapshot_store,
+            "/listings/refit": self.server.service.refit_store,
+        }
+        handler = routes.get(self.path.split("?")[0])
+        if handler is None:
+            self._dispatch(None)
+        else:
+            self._dispatch(lambda: handler(self._read_json()))
+
+    def _read_json(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError as e:
+            raise ValueError(f"JSON inválido: {e}") from None
+        if not isinstance(payload, dict):
+            raise ValueError("El cuerpo debe ser un objeto JSON")
+        return payload
+
+    def _dispatch(self, handler: Optional[Callable[[], Dict[str, Any]]]) -> None:
+        start = time.perf_counter()
+        route = self.path.split("?")[0]
+        if handler is None:
+            status, body = 404, {"error": f"Ruta no encontrada: {self.command} {route}"}
+        else:
+            try:
+                status, body = 200, handler()
+            except ValueError as e:
+                status, body = 400, {"error": str(e)}
+            except Exception as e:  # noqa: BLE001 - la API responde 500 en lugar de caerse
+                self.log_error("Error en %s: %r", route, e)
+                status, body = 500, {"error": "Error interno"}
+
+        latency_ms = (time.perf_counter() - start) * 1000
+        if status != 404:
+            self.server.service.latency.record(f"{self.command} {route}", latency_ms)
+        data = json.dumps(body, ensure_ascii=False).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("X-Response-Time-Ms", f"{latency_ms:.3f}")
+        self.send_header("Server-Timing", f"app;dur={latency_ms:.3f}")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+
+class ComparablesServer(ThreadingHTTPServer):
+    """
+    Servidor HTTP multihilo con un ComparablesService compartido.
+    """
+
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(
+        self, address: Tuple[str, int], service: ComparablesService, quiet: bool = False
+    ) -> None:
+        super().__init__(address, ComparablesHandler)
+        self.service: ComparablesService = service
+        self.quiet: bool = quiet
+
+
+@app.command()
+def main(
+    host: str = "127.0.0.1",
+    port: int = 8000,
+    source: Path = PROCESSED_DATA_DIR / "final_df.parquet",
+    quiet: bool = False,
+    live_store: Optional[Path] = None,
+):
+    """
+    Serve the comparables API (dataset and indexes are loaded once, before listening).
+
+    With --live-store PATH the updatable store behind /listings and /comparables/live is
+    restored from PATH (or built from the dataset if PATH does not exist yet).
+    """
+    service = ComparablesService.from_snapshot(source)
+    if live_store is not None:
+        if live_store.exists():
+            service.store = ComparableStore.restore(live_store)
+        else:
+            service.store = ComparableStore(service.df, APP_FEATURES)
+        service.store_path = live_store
+        typer.echo(f"Live store: {len(service.store)} properties ({service.store.version})")
+    server = ComparablesServer((host, port), service, quiet=quiet)
+    typer.echo(f"Serving {len(service.df)} properties on http://{host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    app()
@@ -1,63 +1,82 @@
 import streamlit as st
-import pandas as pd
 import folium
 from folium.plugins import MarkerCluster
-import requests
-from bs4 import BeautifulSoup
 from streamlit_folium import st_folium
 from dd360.compare import get_similars_hierarchical
-from dd360.extract import extract_data
+from dd360.images import ImageCache, ImageResolver
+from dd360.query_cache import QueryCache
+from dd360.snapshot import Snapshot, load_snapshot
 
-@st.cache_data(show_spinner=False)
-def obtener_imagen_principal(url: str) -> str:
+@st.cache_resource(show_spinner=False)
+def obtener_resolver() -> ImageResolver:
     """
-    Extrae la imagen principal (meta og:image) de un anuncio de propiedad.
+    Servicio de imágenes compartido por todas las sesiones: consulta los anuncios en paralelo
+    y guarda los resultados (también los negativos) en una caché SQLite persistente.
+
+    Returns:
+        ImageResolver: Servicio de imágenes.
+    """
+    return ImageResolver(ImageCache())
+
+@st.cache_resource(show_spinner=False)
+def obtener_cache_busquedas() -> QueryCache:
+    """
+    Caché LRU de búsquedas compartida por todas las sesiones: los formularios repetidos (los
+    sliders son enteros en rangos pequeños) se responden sin volver a calcular. Se vacía sola
+    cuando cambia la versión del snapshot.
+
+    Returns:
+        QueryCache: Caché de búsquedas.
+    """
+    return QueryCache(maxsize=2048)
+
+# Columnas que usan el formulario, la búsqueda jerárquica y las tarjetas de resultados
+COLUMNAS_APP = [
+    "property_id", "neighborhood", "property_type", "price_per_m2", "num_bedrooms",
+    "num_bathrooms", "age", "has_amenities", "url_ad", "price", "total_surface",
+    "latitude", "longitude",
+]
+
+def cargar_datos(path: str) -> Snapshot:
+    """
+    Devuelve el snapshot del dataset procesado (sólo las columnas de COLUMNAS_APP).
+
+    El snapshot se carga una sola vez por proceso desde una copia mapeada en memoria (Arrow IPC
+    más el índice jerárquico en .npy) y se invalida cuando cambia el mtime del parquet; en cada
+    rerun de Streamlit sólo cuesta un os.stat. Incluye los rangos de los sliders precalculados.
 
     Args:
-        url (str): URL del anuncio web.
+        path (str): Ruta al parquet procesado.
 
     Returns:
-        str: URL de la imagen encontrada o una imagen por defecto si no se encuentra o hay un error.
+        Snapshot: Datos (snapshot.df), índice y rangos de la interfaz (snapshot.ranges).
     """
-    try:
-        if not url or not isinstance(url, str):
-            return "https://cdn.prod.website-files.com/61e9b342b016364181c41f50/63e6833197ca517367b6be46_6%20(1).png"
-        headers = {"User-Agent": "Mozilla/5.0"}
-        response = requests.get(url, headers=headers, timeout=5)
-        if response.status_code == 200:
-            soup = BeautifulSoup(response.text, "html.parser")
-            og_image = soup.find("meta", property="og:image")
-            if og_image and og_image.get("content"):
-                img_url = og_image["content"]
-                if img_url and img_url.strip():
-                    return img_url
-    except Exception as e:
-        st.write(f"⚠️ Error obteniendo imagen de {url}: {e}")
-    return "https://cdn.prod.website-files.com/61e9b342b016364181c41f50/63e6833197ca517367b6be46_6%20(1).png"
+    return load_snapshot(path, columns=COLUMNAS_APP)
 
 # --- Carga de datos procesados ---
-df = extract_data("../data/processed/final_df.parquet")
+snapshot = cargar_datos("../data/processed/final_df.parquet")
+df = snapshot.df
 
 # --- Interfaz de usuario ---
 st.title("Encuentra propiedades similares 🏘️")
 st.markdown("Selecciona las características de la propiedad que buscas y te mostraremos las más similares.")
 
 with st.form("comparables_form"):
-    neighborhood = st.selectbox("Colonia", sorted(df["neighborhood"].unique()))
-    property_type = st.selectbox("Tipo", df["property_type"].unique())
+    neighborhood = st.selectbox("Colonia", snapshot.ranges["neighborhoods"])
+    property_type = st.selectbox("Tipo", snapshot.ranges["property_types"])
 
-    # Sliders para filtros numéricos
-    min_price, max_price = int(df["price_per_m2"].min()), int(df["price_per_m2"].max())
-    price_per_m2 = st.slider("Precio por m²", min_price, max_price, int(df["price_per_m2"].min()), format="$%d")
+    # Sliders para filtros numéricos (rangos precalculados en el snapshot)
+    min_price, max_price = map(int, snapshot.column_range("price_per_m2"))
+    price_per_m2 = st.slider("Precio por m²", min_price, max_price, min_price, format="$%d")
 
-    min_beds, max_beds = int(df["num_bedrooms"].min()), int(df["num_bedrooms"].max())
-    num_bedrooms = st.slider("Dormitorios", min_beds, max_beds, int(df["num_bedrooms"].min()))
+    min_beds, max_beds = map(int, snapshot.column_range("num_bedrooms"))
+    num_bedrooms = st.slider("Dormitorios", min_beds, max_beds, min_beds)
 
-    min_baths, max_baths = int(df["num_bathrooms"].min()), int(df["num_bathrooms"].max())
-    num_bathrooms = st.slider("Baños", min_baths, max_baths, int(df["num_bathrooms"].min()))
+    min_baths, max_baths = map(int, snapshot.column_range("num_bathrooms"))
+    num_bathrooms = st.slider("Baños", min_baths, max_baths, min_baths)
 
-    min_age, max_age = int(df["age"].min()), int(df["age"].max())
-    age = st.slider("Antigüedad del inmueble en años", min_age, max_age, int(df["age"].min()))
+    min_age, max_age = map(int, snapshot.column_range("age"))
+    age = st.slider("Antigüedad del inmueble en años", min_age, max_age, min_age)
 
     amenities_option = st.radio("¿Con amenidades? (gym o jardín)", ["Sí", "No"])
     has_amenities = 1 if amenities_option == "Sí" else 0
@@ -77,16 +96,18 @@ if submitted:
     }
 
     # Obtener propiedades similares usando búsqueda jerárquica
-    comparables = get_similars_hierarchical(df, input_data)
-    comparables = comparables.head(5)  # limitar a máximo 5
+    comparables = obtener_cache_busquedas().get_or_compute(
+        "hierarchical",
+        input_data,
+        5,
+        lambda: get_similars_hierarchical(df, input_data).head(5),  # limitar a máximo 5
+        version=snapshot.version,
+    )
 
     # Guardar comparables e imágenes en session_state
     st.session_state["comparables"] = comparables
 
-    imagenes = []
-    for _, row in comparables.iterrows():
-        img_url = obtener_imagen_principal(row["url_ad"])
-        imagenes.append(img_url)
+    imagenes = obtener_resolver().images_for(comparables["url_ad"].tolist())
     st.session_state["imagenes"] = imagenes
 
 # --- Mostrar resultados si existen en session_state ---